@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+bench.build
+~~~~~~~~~~~
+
+Times a full database build with :func:`sanskrit.setup.run`. Run it with
+a config that has ``DATA_PATH``::
+
+    python bench/build.py path/to/config.py
+    python bench/build.py path/to/config.py --scale 10 --scale 100
+
+The data is built twice, once into a SQLite file and once into an
+in-memory SQLite database. Each build runs in its own process, so that
+its peak memory use can be measured on its own. For every stage, this
+prints the wall time, the rows inserted, the rows per second, and the
+peak resident memory so far.
+
+With ``--scale N``, every CSV file is first copied into a temporary
+directory N times over, with a new prefix on each name, so that you can
+see how each loader scales. YAML files are used as-is.
+
+:license: MIT and BSD
+"""
+
+import argparse
+import csv
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sanskrit import Context, setup
+from sanskrit.util.progress import Reporter
+
+#: Syllables for the prefixes of copied names.
+SYLLABLES = [c + v for c in 'kgcjtdpbmnyrlvs' for v in 'aiu']
+
+
+class RSSReporter(Reporter):
+
+    """Records the peak resident memory at the end of each stage."""
+
+    def on_end(self, stage):
+        stage.peak_rss = peak_rss()
+
+
+def peak_rss():
+    """Return the peak resident memory of this process, in megabytes."""
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        kb /= 1024
+    return kb / 1024.0
+
+
+def prefix(n):
+    """Return a unique, pronounceable prefix for copy `n`. Copy 0 has no
+    prefix.
+    """
+    returned = []
+    while n:
+        n, i = divmod(n - 1, len(SYLLABLES))
+        returned.append(SYLLABLES[i])
+    return ''.join(reversed(returned))
+
+
+def scale_csv(src, dest, factor):
+    """Copy the CSV file `src` to `dest` with every row repeated `factor`
+    times. Each copy gets a different prefix on its ``name`` column.
+    """
+    with open(src) as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        rows = list(reader)
+
+    with open(dest, 'w') as f:
+        writer = csv.DictWriter(f, fieldnames, lineterminator='\n')
+        writer.writeheader()
+        for n in xrange(factor):
+            p = prefix(n)
+            for row in rows:
+                writer.writerow(dict(row, name=p + row['name']))
+
+
+def scale_config(config, factor, dest):
+    """Return a copy of `config` whose CSV files are scaled by `factor`.
+
+    :param dest: the directory for the scaled files
+    """
+    config = dict(config)
+    keys = set(key for stage in setup.STAGES for key in stage.files)
+    for key in sorted(keys):
+        src = config[key]
+        if not src.endswith('.csv'):
+            continue
+        path = os.path.join(dest, '%d-%s' % (factor, os.path.basename(src)))
+        scale_csv(src, path, factor)
+        config[key] = path
+    return config
+
+
+def build(config, conn):
+    """Build the database described by `config` and send the summary
+    through the pipe `conn`.
+    """
+    reporter = RSSReporter()
+    config = dict(config, PROGRESS=reporter)
+    started = time.time()
+    setup.run(Context(config), force=True)
+    elapsed = time.time() - started
+
+    summary = reporter.summary()
+    for stage, row in zip(reporter.stages, summary):
+        row['peak_rss'] = getattr(stage, 'peak_rss', 0.0)
+    conn.send((elapsed, peak_rss(), summary))
+    conn.close()
+
+
+def measure(config):
+    """Build in a new process and return ``(seconds, peak_rss, summary)``."""
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=build, args=(config, child))
+    process.start()
+    result = parent.recv()
+    process.join()
+    return result
+
+
+def report(label, seconds, rss, summary):
+    print
+    print label
+    print '=' * len(label)
+    print '%-30s %9s %10s %12s %10s' % ('Stage', 'Seconds', 'Rows',
+                                        'Rows/s', 'Peak MB')
+    for row in summary:
+        name = '  ' * row['level'] + row['stage']
+        print '%-30s %9.2f %10d %12.1f %10.1f' % (
+            name[:30], row['seconds'], row['rows'], row['rows_per_second'],
+            row['peak_rss'])
+    print '%-30s %9.2f %10s %12s %10.1f' % ('Total', seconds, '', '', rss)
+
+
+def main(config_path, scales):
+    config = Context(config_path, connect=False).config
+    tmp = tempfile.mkdtemp()
+    try:
+        for factor in scales:
+            scaled = config
+            if factor != 1:
+                scaled = scale_config(config, factor, tmp)
+            db_path = os.path.join(tmp, 'build-%d.db' % factor)
+            for target, uri in [('file', 'sqlite:///' + db_path),
+                                ('memory', 'sqlite://')]:
+                label = '%s, %dx' % (target, factor)
+                result = measure(dict(scaled, DATABASE_URI=uri))
+                report(label, *result)
+                if target == 'file':
+                    print 'Database size: %.1f MB' % (
+                        os.path.getsize(db_path) / 1048576.0)
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time a database build.')
+    parser.add_argument('config', help='the path to a config file')
+    parser.add_argument('--scale', type=int, action='append',
+                        help='also build with every CSV file repeated this '
+                             'many times. Can be given more than once.')
+    args = parser.parse_args()
+    main(args.config, [1] + (args.scale or []))
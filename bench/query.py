@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+bench.query
+~~~~~~~~~~~
+
+Compares the throughput of full ORM entity loads with the column-level
+selects that :class:`~sanskrit.query.SimpleQuery` and
+:class:`~sanskrit.analyze.SimpleAnalyzer` use. Run it against a fully
+built database::
+
+    python bench/query.py path/to/config.py
+
+For each lookup, this prints the rows read per second with both
+approaches.
+
+:license: MIT and BSD
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import select
+
+from sanskrit import Context
+from sanskrit.analyze import SimpleAnalyzer
+from sanskrit.query import SimpleQuery
+from sanskrit.schema import Form, Nominal, Tag, Verb
+
+
+def measure(fn, args):
+    """Call `fn` once for each item in `args` and return the number of
+    rows it read per second.
+    """
+    rows = 0
+    started = time.time()
+    for arg in args:
+        rows += fn(*arg)
+    elapsed = time.time() - started
+    return rows / elapsed if elapsed else 0.0
+
+
+def report(name, entities, columns):
+    ratio = columns / entities if entities else 0.0
+    print '%-20s %12.0f %12.0f %8.2fx' % (name, entities, columns, ratio)
+
+
+def main(config, limit=2000):
+    ctx = Context(config)
+    session = ctx.session
+    q = SimpleQuery(ctx)
+    a = SimpleAnalyzer(ctx)
+
+    f = Form.__table__
+    n = Nominal.__table__
+    v = Verb.__table__
+
+    paradigms = list(ctx.engine.execute(
+        select([n.c.stem_id, n.c.gender_id]).distinct().limit(limit)))
+    verbs = list(ctx.engine.execute(
+        select([v.c.root_id, v.c.mode_id, v.c.voice_id]).distinct()
+        .limit(limit)))
+    words = list(ctx.engine.execute(
+        select([f.c.name]).where(f.c.pos_id != Tag.VERB).limit(limit)))
+
+    def nominal_entities(stem_id, gender_id):
+        return len(session.query(Nominal)
+                          .filter(Nominal.stem_id == stem_id)
+                          .filter(Nominal.gender_id == gender_id).all())
+
+    def nominal_columns(stem_id, gender_id):
+        return len(q._fetch_nominal_paradigm(stem_id, gender_id))
+
+    def verb_entities(root_id, mode_id, voice_id):
+        return len(session.query(Verb)
+                          .filter(Verb.root_id == root_id)
+                          .filter(Verb.mode_id == mode_id)
+                          .filter(Verb.voice_id == voice_id).all())
+
+    def verb_columns(root_id, mode_id, voice_id):
+        stmt = select([v.c.person_id, v.c.number_id, f.c.name])\
+            .select_from(f.join(v))\
+            .where(v.c.root_id == root_id)\
+            .where(v.c.mode_id == mode_id)\
+            .where(v.c.voice_id == voice_id)
+        return len(session.execute(stmt).fetchall())
+
+    def word_entities(name):
+        return len(session.query(Form).filter(Form.name == name).all())
+
+    def word_columns(name):
+        return len(a.analyze_word(name))
+
+    print '%-20s %12s %12s %9s' % ('Lookup', 'Entities/s', 'Columns/s',
+                                   'Speedup')
+    for name, entities, columns, args in [
+            ('nominal paradigm', nominal_entities, nominal_columns,
+             paradigms),
+            ('verb paradigm', verb_entities, verb_columns, verbs),
+            ('form by name', word_entities, word_columns, words)]:
+        # Warm up the statement cache and the database's page cache.
+        measure(entities, args[:10])
+        measure(columns, args[:10])
+        report(name, measure(entities, args), measure(columns, args))
+        session.remove()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print 'Usage: python bench/query.py CONFIG'
+        sys.exit(1)
+    main(sys.argv[1])
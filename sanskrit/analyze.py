@@ -10,6 +10,8 @@
 
 from collections import defaultdict, namedtuple
 
+from sqlalchemy import bindparam, or_, select
+
 from . import sounds, util
 from .schema import *
 
@@ -21,6 +23,20 @@ Ending = namedtuple('Ending', ['name', 'length', 'stem_type', 'gender_id',
 Nominal = namedtuple('Nominal', ['name', 'pos_id', 'stem', 'gender_id',
                                  'case_id', 'number_id', 'compounded'])
 
+Word = namedtuple('Word', FormIndex.COLUMNS)
+
+# Statements for all forms with some name. These are built once so that
+# their compiled SQL can be cached.
+
+#: Reads the flat form index with a single index lookup.
+_FORMS_BY_NAME = select([FormIndex.__table__.c[c]
+                         for c in FormIndex.COLUMNS])\
+    .where(FormIndex.__table__.c.name == bindparam('name'))
+
+#: Joins the form tables, for databases without a form index.
+_JOINED_FORMS_BY_NAME = form_index_select()\
+    .where(Form.__table__.c.name == bindparam('name'))
+
 
 class SimpleAnalyzer(object):
 
@@ -28,7 +44,7 @@ class SimpleAnalyzer(object):
     for a few reasons:
 
     - It doesn't do any caching.
-    - It uses an ORM instead of raw SQL queries.
+    - It uses SQLAlchemy queries instead of hand-written SQL.
     - Its output is always "well-formed." For example, neuter nouns can
       take only neuter endings.
 
@@ -38,55 +54,89 @@ class SimpleAnalyzer(object):
 
     def __init__(self, ctx):
         self.ctx = ctx
-        self.session = ctx.session
 
-        self.nominal_endings = util.HashTrie()
-        for e in self.session.query(NominalEnding):
-            stem_type = e.stem_type
+        self.nominal_endings = util.Trie()
+        for row in ctx.nominal_endings:
+            name, stem_type, gender_id, case_id, number_id, compounded = row
             is_cons = (stem_type == NominalEnding.CONSONANT_STEM_TYPE)
 
             data = {
-                'name': e.name,
-                'stem_type': e.stem_type,
-                'length': len(e.name),
-                'gender_id': e.gender_id,
-                'case_id': e.case_id,
-                'number_id': e.number_id,
-                'compounded': e.compounded,
+                'name': name,
+                'stem_type': stem_type,
+                'length': len(name),
+                'gender_id': gender_id,
+                'case_id': case_id,
+                'number_id': number_id,
+                'compounded': compounded,
                 'is_consonant_stem': is_cons,
                 }
-            self.nominal_endings[e.name[::-1]] = Ending(**data)
+            self.nominal_endings[name[::-1]] = Ending(**data)
 
-        self.session.remove()
+    @property
+    def session(self):
+        return self.ctx.session
 
+    @util.timed('analyze.analyze')
+    @util.releases_session
     def analyze(self, word):
         """Return all possible solutions for the given word. Any ORM
-        objects used in these solutions will be in a detached state.
+        objects used in these solutions will be in a detached state, and
+        the session's connection is returned to the pool.
+        Complete forms found in the database are returned as
+        :class:`Word` tuples.
+
+        If the database was built with generated forms, every regular
+        nominal form is already in the form index, so only compounded
+        endings are reconstructed. Either way, regular nominal forms are
+        returned as :class:`Nominal` tuples.
 
         :param word: the word to analyze. This should be a completeh
                      word, or what Panini would call a *pada*.
         """
         returned = []
-        returned.extend(self.analyze_word(word))
-        returned.extend(self.analyze_nominal(word))
+        words = self.analyze_word(word)
+        start = self.ctx.generated_forms_start
+        if start is None:
+            returned.extend(words)
+            returned.extend(self.analyze_nominal(word))
+        else:
+            returned.extend(w for w in words if w.id < start)
+            generated = [w for w in words if w.id >= start]
+            returned.extend(self.analyze_nominal(word, generated))
         returned.extend(self.analyze_verb(word))
         return returned
 
+    @util.releases_session
     def analyze_word(self, word):
         """
-        Analyze an arbitrary word.
+        Analyze an arbitrary word. If the context has a
+        :class:`~sanskrit.lexicon.Lexicon`, the word is looked up there
+        without any queries.
 
         :param word: the word to analyze
+        :returns: a list of :class:`Word`
         """
-        session = self.session
-        results = session.query(Form).filter(Form.name == word).all()
-        return results
-
-    def analyze_nominal(self, word):
+        lexicon = self.ctx.lexicon
+        if lexicon is not None:
+            return [Word(*row) for row in lexicon.forms(word)]
+
+        if self.ctx.has_form_index:
+            stmt = _FORMS_BY_NAME
+        else:
+            stmt = _JOINED_FORMS_BY_NAME
+        results = self.session.execute(stmt, {'name': word})
+        return [Word(*row) for row in results]
+
+    @util.releases_session
+    def analyze_nominal(self, word, generated=None):
         """
         Analyze a nominal word.
 
         :param word: the word to analyze
+        :param generated: the generated :class:`Word` rows for `word`, if
+                          the form index has generated forms. Then only
+                          compounded endings are reconstructed, and these
+                          rows give the rest.
         """
         session = self.session
         gender_set = self.ctx.gender_set
@@ -97,6 +147,8 @@ class SimpleAnalyzer(object):
         stem_endings_map = defaultdict(set)
         endings = self.nominal_endings[word[::-1]]
         for e in endings:
+            if generated is not None and not e.compounded:
+                continue
             truncated_stem = word[:-e.length] or word
             if e.is_consonant_stem:
                 # Use some basic
@@ -112,9 +164,16 @@ class SimpleAnalyzer(object):
 
             stem_endings_map[stem].add(e)
 
+        # Generated forms, by stem ID
+        generated_map = defaultdict(list)
+        for w in generated or ():
+            generated_map[w.stem_id].append(w)
+
         # Check which of these stems are viable
-        stems = session.query(Stem) \
-                       .filter(Stem.name.in_(stem_endings_map.keys()))
+        criterion = Stem.name.in_(stem_endings_map.keys())
+        if generated_map:
+            criterion = or_(criterion, Stem.id.in_(generated_map.keys()))
+        stems = session.query(Stem).filter(criterion)
 
         # Reattach endings to viable stems
         for stem in stems:
@@ -141,6 +200,10 @@ class SimpleAnalyzer(object):
                     }
                 returned.append(Nominal(**datum))
 
+            for w in generated_map.get(stem.id, ()):
+                returned.append(Nominal(word, w.pos_id, stem, w.gender_id,
+                                        w.case_id, w.number_id, False))
+
         return returned
 
     def analyze_verb(self, word):
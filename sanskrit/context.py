@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 import imp
 import os
+import threading
 
-from sqlalchemy import create_engine
+from sqlalchemy import exc, select
 from sqlalchemy.orm import scoped_session, sessionmaker
 
-from .schema import Base, EnumBase, GenderGroup
+from . import database, util
+from .enums import Enums
+from .lexicon import Lexicon
+from .schema import (Base, BuildInfo, FormIndex, NominalEnding, SandhiRule,
+                     StemIrregularity)
 
 
 class Context(object):
@@ -28,6 +33,31 @@ class Context(object):
 
         context.config['FOO'] = 'baz'
 
+    Engine and connection pool settings, such as ``POOL_SIZE`` and
+    ``SQLITE_JOURNAL_MODE``, are described in :mod:`sanskrit.database`.
+
+    Enumerated data is loaded once and cached in :attr:`enums`. If
+    ``ENUM_SNAPSHOT`` is set, :func:`sanskrit.setup.run` writes the data to
+    that path, and later contexts read it from there instead of querying
+    the database. A snapshot is used only if it came from the current
+    build of the database.
+
+    If ``LEXICON`` names an existing file written by
+    :func:`sanskrit.lexicon.write`, enums and other lookup data are read
+    from that file instead of the database. Such a context doesn't need
+    ``DATABASE_URI`` at all. If it has one, the lexicon is ignored unless
+    it came from the current build of the database. See
+    :mod:`sanskrit.lexicon`.
+
+    If ``READ_ONLY`` is set, the context loads all lookup data (see
+    :meth:`preload`) as soon as it's created and connects to the database
+    only when needed. SQLite databases are opened in read-only mode. This
+    is useful for prefork servers: create the context in the parent, and
+    each worker will open its own connections after the fork.
+
+    If ``PROFILE`` is set, calls to the package's main entry points are timed
+    and their database queries are counted. See :mod:`sanskrit.util.timing`.
+
     :param config: an object to read from. If this is a string, treat
                    `config` as a module path and load values from that
                    module. Otherwise, treat `config` as a dictionary.
@@ -39,12 +69,19 @@ class Context(object):
         #: :attr:`session`.
         self.config = {}
 
-        #: The :class:`~sqlalchemy.engine.base.Engine` that underlies
-        #: the :attr:`session`.
-        self.engine = None
+        #: A :class:`~sanskrit.database.PoolStats` for :attr:`engine`.
+        self.pool_stats = None
+
+        self._engine = None
+        self._session = None
+        self._pid = os.getpid()
+        self._lazy = False
+        self._stale_engines = []
 
-        #: A :class:`~sqlalchemy.orm.session.Session` class.
-        self.session = None
+        self._enums = None
+        self._enums_lock = threading.Lock()
+        self._lookups = {}
+        self._lookups_lock = threading.RLock()
 
         if isinstance(config, basestring):
             filepath = config
@@ -91,20 +128,94 @@ class Context(object):
         default('VERB_STEMS', 'verb-stems.yml')
         default('VERBS', 'verbs.csv')
 
+        # Cache compiled SQL for the statements that queries reuse.
+        self.config.setdefault('STATEMENT_CACHE_SIZE', 500)
+
+        if self.config.get('PROFILE'):
+            util.profiler.enable()
+
         if connect and 'DATABASE_URI' in self.config:
-            self.connect()
+            if self.config.get('READ_ONLY'):
+                self._lazy = True
+                self.preload()
+            else:
+                self.connect()
 
-    def build(self):
-        """Build all data."""
+    def build(self, force=False):
+        """Build all data. Only data whose source files changed since the
+        last build is rebuilt, unless `force` is ``True``. See
+        :func:`sanskrit.setup.run`.
+        """
         from sanskrit import setup
-        setup.run(self)
+        setup.run(self, force=force)
 
     def connect(self):
         """Connect to the database."""
-        self.engine = create_engine(self.config['DATABASE_URI'])
-        self.session = scoped_session(sessionmaker(autocommit=False,
-                                                   autoflush=False,
-                                                   bind=self.engine))
+        engine = database.create_engine(self.config)
+        self.pool_stats = database.PoolStats()
+        self.pool_stats.watch(engine)
+        self._engine = engine
+        self._session = scoped_session(sessionmaker(autocommit=False,
+                                                    autoflush=False,
+                                                    bind=engine))
+        self._pid = os.getpid()
+        if self.config.get('PROFILE'):
+            util.profiler.watch(engine)
+
+    def _forget_connection(self):
+        """Drop the engine inherited from a parent process. Its connections
+        belong to the parent, so they're kept open but never used.
+        """
+        engine = self._engine
+        if engine is not None:
+            try:
+                engine.dispose(close=False)
+            except TypeError:
+                pass
+            self._stale_engines.append(engine)
+            self._lazy = True
+        self._engine = self._session = None
+        self._pid = os.getpid()
+
+    @property
+    def engine(self):
+        """The :class:`~sqlalchemy.engine.base.Engine` that underlies the
+        :attr:`session`. In a forked child process, a new engine is created
+        on first use.
+        """
+        if self._pid != os.getpid():
+            self._forget_connection()
+        if self._engine is None and self._lazy:
+            self.connect()
+        return self._engine
+
+    @property
+    def session(self):
+        """A :class:`~sqlalchemy.orm.session.Session` class."""
+        if self.engine is None:
+            return None
+        return self._session
+
+    def preload(self):
+        """Load all lookup data: the lexicon, enums, nominal endings, sandhi
+        rules, irregular stems, and whether there's a form index with
+        generated forms. Then close all connections.
+
+        Call this in a parent process before forking workers. The workers
+        share the loaded data through copy-on-write memory and create their
+        own database connections.
+        """
+        self.lexicon
+        self.enums
+        self.nominal_endings
+        self.sandhi_rules
+        self.irregular_stems
+        self.has_form_index
+        self.has_generated_forms
+        self.generated_forms_start
+        if self._engine is not None:
+            self._session.remove()
+            self._engine.dispose()
 
     def create_all(self):
         """Create tables for every model in `sanskrit.schema`."""
@@ -113,55 +224,210 @@ class Context(object):
         metadata.create_all(self.engine)
         for name in metadata.sorted_tables:
             if name not in extant:
-                print '  [ c ] {0}'.format(name)
+                util.tick('[ c ] {0}'.format(name))
+
+    def create_indexes(self):
+        """Create any indexes in `sanskrit.schema` that are missing from an
+        existing database. Call this after upgrading the package instead
+        of rebuilding the database.
+        """
+        for name in database.create_indexes(self.engine, Base.metadata):
+            util.tick('[ i ] {0}'.format(name))
 
     def drop_all(self):
         """Drop all tables defined in `sanskrit.schema`."""
         Base.metadata.drop_all(self.engine)
 
-    def _build_enums(self):
-        """Fetch and store enumerated data."""
-        self._enum_id = {}
-        self._enum_abbr = {}
-        self._gender_set = {}
+    @property
+    def enums(self):
+        """All enumerated data, as an :class:`~sanskrit.enums.Enums`. If
+        ``ENUM_SNAPSHOT`` names a snapshot of the current build, the data is
+        read from that file. Otherwise, it's read from the database.
+        """
+        enums = self._enums
+        if enums is None:
+            with self._enums_lock:
+                enums = self._enums
+                if enums is None:
+                    enums = self._enums = self._load_enums()
+        return enums
 
-        session = self.session
-        for cls in EnumBase.__subclasses__():
-            key = cls.__tablename__
-            self._enum_id[key] = enum_id = {}
-            self._enum_abbr[key] = enum_abbr = {}
-            for item in session.query(cls).all():
-                enum_id[item.name] = enum_id[item.abbr] = item.id
-                enum_abbr[item.id] = enum_abbr[item.name] = item.abbr
+    @enums.setter
+    def enums(self, value):
+        self._enums = value
 
-        for group in session.query(GenderGroup):
-            member_ids = set([x.id for x in group.members])
-            self._gender_set[group.id] = member_ids
+    def _load_enums(self):
+        """Fetch enumerated data."""
+        if self.lexicon is not None:
+            return self.lexicon.enums
+        path = self.config.get('ENUM_SNAPSHOT')
+        if path and os.path.exists(path):
+            enums = Enums.from_snapshot(path)
+            # A snapshot of some other build would give the wrong IDs.
+            version = enums.data_version
+            if self.engine is None or (version is not None and
+                                       version == self.data_version):
+                return enums
+        return Enums.from_database(self.engine)
 
-        session.remove()
+    def clear_cache(self):
+        """Forget all loaded enums and lookup data. Call this after
+        changing the database."""
+        with self._enums_lock:
+            self._enums = None
+        with self._lookups_lock:
+            self._lookups = {}
+
+    def _lookup(self, key, loader):
+        """Return the lookup data for `key`, loading it if necessary."""
+        try:
+            return self._lookups[key]
+        except KeyError:
+            with self._lookups_lock:
+                if key not in self._lookups:
+                    self._lookups[key] = loader()
+                return self._lookups[key]
+
+    @property
+    def lexicon(self):
+        """The :class:`~sanskrit.lexicon.Lexicon` named by ``LEXICON``, or
+        ``None`` if there is none. If there's also a database, the lexicon
+        is used only if it was written from the current build of the
+        database.
+        """
+        def load():
+            path = self.config.get('LEXICON')
+            if not path or not os.path.exists(path):
+                return None
+            lexicon = Lexicon(path)
+            # A lexicon of some other build would give the wrong IDs.
+            if self.engine is not None and (
+                    lexicon.data_version is None or
+                    lexicon.data_version != self.data_version):
+                return None
+            return lexicon
+        return self._lookup('lexicon', load)
+
+    @property
+    def nominal_endings(self):
+        """A :class:`tuple` of all nominal endings. Each ending is a tuple
+        ``(name, stem_type, gender_id, case_id, number_id, compounded)``.
+        """
+        def load():
+            if self.lexicon is not None:
+                return tuple(self.lexicon.tables['nominal_ending'])
+            t = NominalEnding.__table__
+            q = select([t.c.name, t.c.stem_type, t.c.gender_id, t.c.case_id,
+                        t.c.number_id, t.c.compounded]).order_by(t.c.id)
+            return tuple(tuple(row) for row in self.engine.execute(q))
+        return self._lookup('nominal_endings', load)
+
+    @property
+    def sandhi_rules(self):
+        """A :class:`tuple` of all sandhi rules. Each rule is a tuple
+        ``(first, second, result)``.
+        """
+        def load():
+            if self.lexicon is not None:
+                return tuple(row[:3] for row in self.lexicon.tables['sandhi'])
+            t = SandhiRule.__table__
+            q = select([t.c.first, t.c.second, t.c.result]).order_by(t.c.id)
+            return tuple(tuple(row) for row in self.engine.execute(q))
+        return self._lookup('sandhi_rules', load)
+
+    @property
+    def irregular_stems(self):
+        """A :class:`frozenset` of the IDs of all fully described
+        irregular stems.
+        """
+        def load():
+            if self.lexicon is not None:
+                stems = self.lexicon.tables['stem']
+                return frozenset(row[0] for row in stems if row[-1])
+            t = StemIrregularity.__table__
+            q = select([t.c.id]).where(t.c.fully_described == True)
+            return frozenset(row[0] for row in self.engine.execute(q))
+        return self._lookup('irregular_stems', load)
+
+    @property
+    def has_form_index(self):
+        """``True`` iff the database has a populated
+        :class:`~sanskrit.schema.FormIndex` table. A lexicon always has an
+        index of its forms, so this is ``True`` if there is one.
+        """
+        def load():
+            if self.lexicon is not None:
+                return True
+            t = FormIndex.__table__
+            try:
+                row = self.engine.execute(select([t.c.id]).limit(1)).first()
+            except exc.DBAPIError:
+                return False
+            return row is not None
+        return self._lookup('has_form_index', load)
+
+    @property
+    def has_generated_forms(self):
+        """``True`` iff the form index also holds the regular forms of all
+        nominal stems. See ``GENERATED_FORMS`` in
+        :func:`sanskrit.setup.run`.
+        """
+        def load():
+            if self.lexicon is not None:
+                return self.lexicon.generated_forms
+            t = BuildInfo.__table__
+            q = select([t.c.value]).where(t.c.key == 'generated_forms')
+            try:
+                return self.engine.execute(q).scalar() is not None
+            except exc.DBAPIError:
+                return False
+        return self._lookup('has_generated_forms', load)
+
+    @property
+    def generated_forms_start(self):
+        """The ID of the first generated row in the form index, or ``None``
+        if there are no generated forms. Rows with smaller IDs are stored
+        forms.
+        """
+        def load():
+            if self.lexicon is not None:
+                return self.lexicon.generated_forms_start
+            t = BuildInfo.__table__
+            q = select([t.c.value]).where(t.c.key == 'generated_forms_start')
+            try:
+                value = self.engine.execute(q).scalar()
+            except exc.DBAPIError:
+                return None
+            return int(value) if value is not None else None
+        return self._lookup('generated_forms_start', load)
+
+    @property
+    def data_version(self):
+        """The version stamp written by the last database build, or
+        ``None`` if there is none. This is read from the database every
+        time. Without a database, this is the version of the lexicon.
+        """
+        if self.engine is None:
+            lexicon = self.lexicon
+            return lexicon.data_version if lexicon is not None else None
+        t = BuildInfo.__table__
+        q = select([t.c.value]).where(t.c.key == 'data_version')
+        try:
+            return self.engine.execute(q).scalar()
+        except exc.DBAPIError:
+            return None
 
     @property
     def enum_id(self):
         """Maps a name or abbreviation to an ID."""
-        try:
-            return self._enum_id
-        except AttributeError:
-            self._build_enums()
-            return self._enum_id
+        return self.enums.enum_id
 
     @property
     def enum_abbr(self):
         """Maps an ID or name to an abbreviation."""
-        try:
-            return self._enum_abbr
-        except AttributeError:
-            self._build_enums()
-            return self._enum_abbr
+        return self.enums.enum_abbr
 
     @property
     def gender_set(self):
-        try:
-            return self._gender_set
-        except AttributeError:
-            self._build_enums()
-            return self._gender_set
+        """Maps a gender group ID to a set of gender IDs."""
+        return self.enums.gender_set
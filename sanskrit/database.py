@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+sanskrit.database
+~~~~~~~~~~~~~~~~~
+
+Helpers for creating and tuning database engines.
+
+A :class:`~sanskrit.Context` creates its engine with :func:`create_engine`,
+which reads the following optional config keys:
+
+- ``POOL_SIZE``, ``POOL_MAX_OVERFLOW``, ``POOL_RECYCLE``, ``POOL_TIMEOUT``:
+  passed to SQLAlchemy's connection pool
+- ``POOL_PRE_PING``: if ``True``, test each connection before using it
+- ``STATEMENT_CACHE_SIZE``: the number of compiled statements to cache.
+  A :class:`~sanskrit.Context` uses 500 by default.
+- ``SQLITE_JOURNAL_MODE``, ``SQLITE_SYNCHRONOUS``, ``SQLITE_CACHE_SIZE``,
+  ``SQLITE_MMAP_SIZE``: SQLite pragmas, set on each new connection
+- ``READ_ONLY``: if ``True``, open SQLite database files as read-only and
+  immutable, so that many processes can read them without locking
+
+Keys that are not set are left to SQLAlchemy's defaults.
+
+:license: MIT and BSD
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import urllib
+
+import sqlalchemy
+from sqlalchemy import event, exc, inspect
+from sqlalchemy.engine.url import make_url
+
+#: Maps a config key to a keyword argument for
+#: :func:`sqlalchemy.create_engine`.
+ENGINE_OPTIONS = [
+    ('POOL_SIZE', 'pool_size'),
+    ('POOL_MAX_OVERFLOW', 'max_overflow'),
+    ('POOL_RECYCLE', 'pool_recycle'),
+    ('POOL_TIMEOUT', 'pool_timeout'),
+    ]
+
+#: Maps a config key to a SQLite pragma.
+SQLITE_PRAGMAS = [
+    ('SQLITE_JOURNAL_MODE', 'journal_mode'),
+    ('SQLITE_SYNCHRONOUS', 'synchronous'),
+    ('SQLITE_CACHE_SIZE', 'cache_size'),
+    ('SQLITE_MMAP_SIZE', 'mmap_size'),
+    ]
+
+
+def sqlalchemy_version():
+    """Return the SQLAlchemy version as a tuple of ints."""
+    parts = []
+    for part in sqlalchemy.__version__.split('.'):
+        digits = ''.join(c for c in part if c.isdigit())
+        parts.append(int(digits or 0))
+    return tuple(parts)
+
+
+def create_engine(config, uri=None, **kw):
+    """Create an engine from the values in `config`.
+
+    :param config: a config :class:`dict`
+    :param uri: the database URI. By default, this is
+                ``config['DATABASE_URI']``.
+    :param kw: extra keyword arguments for :func:`sqlalchemy.create_engine`
+    """
+    version = sqlalchemy_version()
+    for key, arg in ENGINE_OPTIONS:
+        if config.get(key) is not None:
+            kw.setdefault(arg, config[key])
+
+    pre_ping = config.get('POOL_PRE_PING')
+    if pre_ping and version >= (1, 2):
+        kw.setdefault('pool_pre_ping', True)
+
+    cache_size = config.get('STATEMENT_CACHE_SIZE')
+    if cache_size is not None and version >= (1, 4):
+        kw.setdefault('query_cache_size', cache_size)
+
+    uri = uri or config['DATABASE_URI']
+    if config.get('READ_ONLY'):
+        url = make_url(uri)
+        is_file = url.database not in (None, '', ':memory:')
+        if url.drivername.startswith('sqlite') and is_file:
+            kw.setdefault('creator', _read_only_sqlite(url.database))
+
+    engine = sqlalchemy.create_engine(uri, **kw)
+
+    if pre_ping and version < (1, 2):
+        event.listen(engine, 'checkout', _ping)
+
+    pragmas = [(p, config[key]) for key, p in SQLITE_PRAGMAS
+               if config.get(key) is not None]
+    if pragmas and engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', _pragma_setter(pragmas))
+
+    if cache_size is not None and version < (1, 4):
+        from sqlalchemy.util import LRUCache
+        engine = engine.execution_options(compiled_cache=LRUCache(cache_size))
+
+    return engine
+
+
+def create_indexes(bind, metadata):
+    """Create every index in `metadata` that doesn't exist yet. Tables that
+    don't exist are skipped, since creating them creates their indexes too.
+
+    This is the upgrade path for databases built before an index was added
+    to the schema.
+
+    :param bind: an engine or connection
+    :param metadata: a :class:`~sqlalchemy.schema.MetaData`
+    :returns: a list of the names of the new indexes
+    """
+    inspector = inspect(bind)
+    tables = set(inspector.get_table_names())
+    created = []
+    for table in metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        extant = set(i['name'] for i in inspector.get_indexes(table.name))
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            if index.name not in extant:
+                index.create(bind)
+                created.append(index.name)
+
+    # Let SQLite's query planner see the new indexes' statistics.
+    if created and bind.dialect.name == 'sqlite':
+        bind.execute('ANALYZE')
+    return created
+
+
+def _ping(dbapi_conn, conn_record, conn_proxy):
+    """Test a connection on checkout. This is SQLAlchemy's standard
+    "pessimistic disconnect" recipe for versions without `pool_pre_ping`.
+    """
+    cursor = dbapi_conn.cursor()
+    try:
+        cursor.execute('SELECT 1')
+    except Exception:
+        raise exc.DisconnectionError()
+    finally:
+        cursor.close()
+
+
+def _read_only_sqlite(path):
+    """Return a function that opens the SQLite database at `path` as
+    read-only and immutable.
+    """
+    path = os.path.abspath(path)
+    uri = 'file:%s?mode=ro&immutable=1' % urllib.quote(path)
+
+    def connect():
+        try:
+            return sqlite3.connect(uri, uri=True, check_same_thread=False)
+        except TypeError:
+            # Python 2's `sqlite3` doesn't accept URIs, so fall back to a
+            # plain connection that refuses writes.
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute('PRAGMA query_only = ON')
+            return conn
+    return connect
+
+
+def _pragma_setter(pragmas):
+    def set_pragmas(dbapi_conn, conn_record):
+        cursor = dbapi_conn.cursor()
+        for name, value in pragmas:
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+        cursor.close()
+    return set_pragmas
+
+
+class PoolStats(object):
+
+    """Counts connection pool activity for some engine::
+
+        stats = PoolStats()
+        stats.watch(engine)
+        print stats.as_dict()
+
+    Wait times measure how long it took the pool to hand out a connection,
+    including time spent blocked on a full pool. Use them to size
+    ``POOL_SIZE`` and ``POOL_MAX_OVERFLOW``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        #: The number of new DBAPI connections.
+        self.connects = 0
+        #: The number of connections handed out by the pool.
+        self.checkouts = 0
+        #: The number of connections returned to the pool.
+        self.checkins = 0
+        #: The number of connections currently checked out.
+        self.checked_out = 0
+        #: The largest value of :attr:`checked_out` so far.
+        self.peak_checked_out = 0
+        #: The total time spent waiting for connections, in seconds.
+        self.wait_seconds = 0.0
+        #: The longest single wait, in seconds.
+        self.max_wait = 0.0
+
+    def watch(self, engine):
+        """Record pool activity for `engine`.
+
+        :param engine: a :class:`~sqlalchemy.engine.base.Engine`
+        """
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'checkout', self._on_checkout)
+        event.listen(engine, 'checkin', self._on_checkin)
+
+        # Event listeners carry over to the new pool that `dispose` makes,
+        # but the wait timer below doesn't, so add it again each time.
+        self._time_waits(engine.pool)
+        dispose = engine.dispose
+
+        def watched_dispose(*args, **kw):
+            dispose(*args, **kw)
+            self._time_waits(engine.pool)
+        engine.dispose = watched_dispose
+
+    def _time_waits(self, pool):
+        """Pools have no event for the time spent before a checkout, so
+        time the internal method that waits for a free connection.
+        """
+        do_get = getattr(pool, '_do_get', None)
+        if do_get is None or getattr(do_get, 'pool_stats', None) is self:
+            return
+
+        def timed_get():
+            started = time.time()
+            try:
+                return do_get()
+            finally:
+                self._on_wait(time.time() - started)
+        timed_get.pool_stats = self
+        pool._do_get = timed_get
+
+    def _on_connect(self, *args):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, *args):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out,
+                                        self.checked_out)
+
+    def _on_checkin(self, *args):
+        with self._lock:
+            self.checkins += 1
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def _on_wait(self, seconds):
+        with self._lock:
+            self.wait_seconds += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def as_dict(self):
+        with self._lock:
+            checkouts = self.checkouts
+            return {
+                'connects': self.connects,
+                'checkouts': checkouts,
+                'checkins': self.checkins,
+                'checked_out': self.checked_out,
+                'peak_checked_out': self.peak_checked_out,
+                'wait_seconds': self.wait_seconds,
+                'mean_wait': self.wait_seconds / checkouts if checkouts else 0.0,
+                'max_wait': self.max_wait,
+                }
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+sanskrit.enums
+~~~~~~~~~~~~~~
+
+Immutable lookup tables for enumerated data, such as persons, cases, and
+genders.
+
+Enumerated data is small and read constantly, so it's loaded once into
+plain tuples and frozen dicts. An :class:`Enums` object never changes
+after it's built, so it can be shared freely between threads and between
+forked worker processes.
+
+:license: MIT and BSD
+"""
+
+import json
+
+from sqlalchemy import select
+
+from .schema import EnumBase, GenderGroup, GenderGroupAssociation
+
+
+class FrozenDict(dict):
+
+    """A :class:`dict` that can't be modified after it's created."""
+
+    def _immutable(self, *args, **kw):
+        raise TypeError('%s is immutable' % self.__class__.__name__)
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+
+class EnumTable(object):
+
+    """The rows of a single enumeration, indexed by ID.
+
+    :param name: the table name, e.g. ``'case'``
+    :param rows: an iterable of ``(id, name, abbr)`` tuples
+    """
+
+    __slots__ = ('name', 'names', 'abbrs', 'ids', 'abbr_map')
+
+    def __init__(self, name, rows):
+        rows = list(rows)
+        size = max([r[0] for r in rows] or [0]) + 1
+        names = [None] * size
+        abbrs = [None] * size
+        ids = {}
+        abbr_map = {}
+        for id, item_name, abbr in rows:
+            names[id] = item_name
+            abbrs[id] = abbr
+            ids[item_name] = ids[abbr] = id
+            abbr_map[id] = abbr_map[item_name] = abbr
+
+        self.name = name
+        #: Item names, indexed by ID.
+        self.names = tuple(names)
+        #: Item abbreviations, indexed by ID.
+        self.abbrs = tuple(abbrs)
+        #: Maps a name or abbreviation to an ID.
+        self.ids = FrozenDict(ids)
+        #: Maps an ID or name to an abbreviation.
+        self.abbr_map = FrozenDict(abbr_map)
+
+    def rows(self):
+        """Return the table's ``(id, name, abbr)`` tuples."""
+        return [(i, self.names[i], self.abbrs[i])
+                for i in xrange(len(self.names)) if self.names[i] is not None]
+
+
+class Enums(object):
+
+    """All enumerated data.
+
+    :param tables: a :class:`dict` that maps a table name to an
+                   :class:`EnumTable`
+    :param gender_groups: a :class:`dict` that maps a gender group ID to
+                          the IDs of its genders
+    """
+
+    def __init__(self, tables, gender_groups):
+        #: Maps a table name to an :class:`EnumTable`.
+        self.tables = FrozenDict(tables)
+        #: Maps a table name to a map from a name or abbreviation to an ID.
+        self.enum_id = FrozenDict((k, t.ids) for k, t in tables.iteritems())
+        #: Maps a table name to a map from an ID or name to an abbreviation.
+        self.enum_abbr = FrozenDict((k, t.abbr_map)
+                                    for k, t in tables.iteritems())
+        #: Maps a gender group ID to a :class:`frozenset` of gender IDs.
+        self.gender_set = FrozenDict((k, frozenset(v))
+                                     for k, v in gender_groups.iteritems())
+        #: The version stamp of the database the data came from, if known.
+        self.data_version = None
+
+    @classmethod
+    def from_database(cls, bind):
+        """Load all enumerated data with one query per table.
+
+        :param bind: an engine or connection
+        """
+        tables = {}
+        for enum_cls in EnumBase.__subclasses__():
+            t = enum_cls.__table__
+            rows = bind.execute(select([t.c.id, t.c.name, t.c.abbr]))
+            tables[t.name] = EnumTable(t.name, rows)
+
+        # Every group gets an entry, even if it has no members.
+        t = GenderGroup.__table__
+        gender_groups = dict((id, set()) for id, in
+                             bind.execute(select([t.c.id])))
+        t = GenderGroupAssociation.__table__
+        for group_id, gender_id in bind.execute(select([t.c.group_id,
+                                                        t.c.gender_id])):
+            gender_groups.setdefault(group_id, set()).add(gender_id)
+
+        return cls(tables, gender_groups)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Load all enumerated data from a :class:`dict` made by
+        :meth:`as_dict`.
+        """
+        tables = {}
+        for name, rows in data['tables'].iteritems():
+            tables[name] = EnumTable(name, rows)
+        gender_groups = {int(k): v for k, v in data['gender_groups'].iteritems()}
+        return cls(tables, gender_groups)
+
+    @classmethod
+    def from_snapshot(cls, path):
+        """Load all enumerated data from a snapshot made by :meth:`dump`.
+        The version stamp of the snapshot, if any, is stored in
+        :attr:`data_version`.
+
+        :param path: the snapshot path
+        """
+        with open(path) as f:
+            data = json.load(f)
+        returned = cls.from_dict(data)
+        returned.data_version = data.get('data_version')
+        return returned
+
+    def as_dict(self):
+        """Return all enumerated data as a JSON-compatible :class:`dict`."""
+        return {
+            'tables': {k: t.rows() for k, t in self.tables.iteritems()},
+            'gender_groups': {k: sorted(v)
+                              for k, v in self.gender_set.iteritems()},
+            }
+
+    def dump(self, path, data_version=None):
+        """Write all enumerated data to a JSON snapshot.
+
+        :param path: the snapshot path
+        :param data_version: the version stamp of the database that the
+                             data came from
+        """
+        data = self.as_dict()
+        data['data_version'] = data_version
+        with open(path, 'w') as f:
+            json.dump(data, f, sort_keys=True)
@@ -17,7 +17,6 @@
 """
 
 from . import util
-from .schema import NominalEnding
 
 
 class Generator(object):
@@ -32,6 +31,11 @@ class Generator(object):
         raise NotImplementedError
 
 
+#: The cells of a nominal paradigm, as ``(case, number)`` pairs. Rows
+#: returned by :meth:`NominalGenerator.paradigms` follow this order.
+CELLS = tuple((case, number) for case in '12345678' for number in 'sdp')
+
+
 class NominalGenerator(Generator):
 
     """
@@ -42,40 +46,96 @@ class NominalGenerator(Generator):
 
     def __init__(self, ctx):
         self.ctx = ctx
-        session = ctx.session
 
-        self.nominal_stem_trie = util.HashTrie()
+        self.nominal_stem_trie = util.Trie()
         self.nominal_endings = {}
         seen = set()
-        for e in session.query(NominalEnding):
-            stem_type = e.stem_type
+        for row in ctx.nominal_endings:
+            name, stem_type, gender_id, case_id, number_id, _ = row
             if stem_type not in seen:
                 seen.add(stem_type)
                 self.nominal_stem_trie[stem_type[::-1]] = stem_type
                 self.nominal_endings[stem_type] = {}
 
-            key = (e.gender_id, e.case_id, e.number_id)
-            self.nominal_endings[stem_type][key] = e.name
-        session.remove()
+            key = (gender_id, case_id, number_id)
+            self.nominal_endings[stem_type][key] = name
 
-    def paradigm(self, stem_name, gender):
-        """Generate a full paradigm using normal Sanskrit rules. The
-        function treats irregular stems as regular.
+        # Maps ``(stem_type, gender_id)`` to a tuple of endings in the
+        # order of `CELLS`. Built as needed.
+        self._tables = {}
+
+    def stem_type(self, stem_name):
+        """Return the stem type of `stem_name`, or ``None`` if it has no
+        known stem type.
+        """
+        match = self.nominal_stem_trie.longest_match(stem_name[::-1])
+        if match is None:
+            return None
+        return next(iter(match[1]))
+
+    def ending_table(self, stem_type, gender_id):
+        """Return the endings of `stem_type` for some gender, as a tuple in
+        the order of :data:`CELLS`. Return ``None`` if any are missing.
         """
+        key = (stem_type, gender_id)
+        try:
+            return self._tables[key]
+        except KeyError:
+            pass
 
-        stem_types = self.nominal_stem_trie[stem_name[::-1]]
-        stem_type = max(stem_types, key=len)
-        truncated = stem_name[:-len(stem_type)]
+        enum = self.ctx.enum_id
         endings = self.nominal_endings[stem_type]
+        try:
+            table = tuple(endings[(gender_id, enum['case'][case],
+                                   enum['number'][number])]
+                          for case, number in CELLS)
+        except KeyError:
+            table = None
+        self._tables[key] = table
+        return table
 
-        returned = {}
-        enum = self.ctx.enum_id
-        gender_id = enum['gender'][gender]
-        for case in '12345678':
-            case_id = enum['case'][case]
-            for number in 'sdp':
-                number_id = enum['number'][number]
-                key = (gender_id, case_id, number_id)
-                returned[(case, number)] = truncated + endings[key]
+    def paradigm(self, stem_name, gender):
+        """Generate a full paradigm using normal Sanskrit rules. The
+        function treats irregular stems as regular.
 
+        :returns: a :class:`dict` that maps ``(case, number)`` to a form
+        :raises ValueError: if the stem has no known stem type
+        :raises KeyError: if its stem type has no endings for `gender`
+        """
+        stem_type = self.stem_type(stem_name)
+        if stem_type is None:
+            raise ValueError('No stem type for %r' % stem_name)
+        gender_id = self.ctx.enum_id['gender'][gender]
+        if self.ending_table(stem_type, gender_id) is None:
+            raise KeyError((stem_type, gender))
+        return dict(zip(CELLS, self.paradigms([stem_name], gender)[0]))
+
+    def paradigms(self, stem_names, gender):
+        """Generate the paradigms of many stems with the same gender.
+
+        Stems are grouped by stem type, and each group is inflected with a
+        single ending table. The result is a list with one row per stem, in
+        the order of `stem_names`. Each row is a tuple of forms in the
+        order of :data:`CELLS`, or ``None`` if the stem has no known stem
+        type or its stem type has no endings for `gender`.
+
+        :param stem_names: a list of stem names
+        :param gender: the gender name or abbreviation
+        """
+        gender_id = self.ctx.enum_id['gender'][gender]
+        groups = {}
+        for i, stem_name in enumerate(stem_names):
+            groups.setdefault(self.stem_type(stem_name), []).append(i)
+
+        returned = [None] * len(stem_names)
+        for stem_type, indices in groups.iteritems():
+            if stem_type is None:
+                continue
+            table = self.ending_table(stem_type, gender_id)
+            if table is None:
+                continue
+            cut = -len(stem_type)
+            for i in indices:
+                truncated = stem_names[i][:cut]
+                returned[i] = tuple([truncated + e for e in table])
         return returned
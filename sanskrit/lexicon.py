@@ -0,0 +1,446 @@
+# -*- coding: utf-8 -*-
+"""
+sanskrit.lexicon
+~~~~~~~~~~~~~~~~
+
+A compact, read-only copy of the database in a single file.
+
+A lexicon holds enums, nominal endings, sandhi rules, roots, stems, and
+forms. Each table is stored as columns of fixed-width integers. Every
+string is stored once, in a sorted string table, and columns refer to it
+by index. The file is opened with :mod:`mmap`, so opening it is almost
+free and every process that opens it shares the same pages.
+
+Forms are also indexed by name. Since strings are sorted, a word is found
+by binary search in the string table, and its index there leads straight
+to its forms. See :meth:`Lexicon.forms`.
+
+Write a lexicon with :func:`write`, or set ``LEXICON`` to a path before
+calling :func:`sanskrit.setup.run`. A :class:`~sanskrit.Context` with
+``LEXICON`` set reads its lookup data from that file, and it can do so
+without a database.
+
+The file starts with a short prefix and a JSON header that describes
+where each column starts. All integers are in the byte order of the
+machine that wrote the file.
+
+:license: MIT and BSD
+"""
+
+import array
+import ctypes
+import json
+import mmap
+import os
+import struct
+import sys
+
+from sqlalchemy import Boolean, String, select
+
+from .enums import Enums
+from .schema import (BuildInfo, Form, FormIndex, NominalEnding,
+                     ParticipleStem, Root, SandhiRule, Stem, StemIrregularity,
+                     form_index_select)
+
+#: The first bytes of every lexicon.
+MAGIC = b'SKTLEX\x00\x00'
+
+#: The file format. Files in another format can't be opened.
+FORMAT = 2
+
+#: Stands for ``None`` in integer and boolean columns.
+NULL = -1
+
+#: Maps a column kind to its :mod:`array` typecode and :mod:`ctypes` type.
+#: String columns hold indices into the string table.
+KINDS = {
+    'int': ('i', ctypes.c_int32),
+    'bool': ('b', ctypes.c_int8),
+    'str': ('i', ctypes.c_int32),
+    }
+
+# Magic, format, and header size.
+_PREFIX = struct.Struct('<8sII')
+
+# Every section starts on a multiple of this many bytes.
+_ALIGN = 8
+
+
+def table_selects(form_index=False):
+    """Return a list of ``(name, statement)`` pairs, one for each table in
+    a lexicon. Each statement returns the table's rows in ID order.
+
+    :param form_index: if ``True``, read forms from the
+                       :class:`~sanskrit.schema.FormIndex` table, which
+                       might also have generated forms. Otherwise, read
+                       them from the form tables.
+    """
+    e = NominalEnding.__table__
+    sr = SandhiRule.__table__
+    r = Root.__table__
+    s = Stem.__table__
+    ps = ParticipleStem.__table__
+    irr = StemIrregularity.__table__
+
+    stems = s.outerjoin(ps, ps.c.id == s.c.id)\
+             .outerjoin(irr, irr.c.id == s.c.id)
+
+    if form_index:
+        t = FormIndex.__table__
+        forms = select([t.c[c] for c in FormIndex.COLUMNS]).order_by(t.c.id)
+    else:
+        forms = form_index_select().order_by(Form.__table__.c.id)
+
+    return [
+        ('nominal_ending',
+         select([e.c.name, e.c.stem_type, e.c.gender_id, e.c.case_id,
+                 e.c.number_id, e.c.compounded]).order_by(e.c.id)),
+        ('sandhi',
+         select([sr.c.first, sr.c.second, sr.c.result, sr.c.rule_type])
+         .order_by(sr.c.id)),
+        ('root',
+         select([r.c.id, r.c.name, r.c.basis_id]).order_by(r.c.id)),
+        ('stem',
+         select([s.c.id, s.c.name, s.c.pos_id, s.c.genders_id,
+                 s.c.dependent, ps.c.root_id, irr.c.fully_described])
+         .select_from(stems).order_by(s.c.id)),
+        ('form', forms),
+        ]
+
+
+def _int_or_none(value):
+    """Convert a :class:`~sanskrit.schema.BuildInfo` value to an int."""
+    return int(value) if value is not None else None
+
+
+def _kind(type_):
+    """Return the column kind for a SQLAlchemy type."""
+    if isinstance(type_, String):
+        return 'str'
+    if isinstance(type_, Boolean):
+        return 'bool'
+    return 'int'
+
+
+def name_index(name_ids, size):
+    """Group the rows of a table by name.
+
+    :param name_ids: the table's name column, as string table indices
+    :param size: the number of strings in the string table
+    :returns: a pair ``(order, starts)`` of :class:`array.array`. `order`
+              lists row numbers sorted by name, and the rows for string
+              `i` are ``order[starts[i]:starts[i + 1]]``.
+    """
+    counts = [0] * (size + 1)
+    for i in name_ids:
+        counts[i + 1] += 1
+    starts = array.array('i', counts)
+    for i in xrange(1, len(starts)):
+        starts[i] += starts[i - 1]
+
+    order = array.array('i', [0] * len(name_ids))
+    positions = array.array('i', starts)
+    for row, i in enumerate(name_ids):
+        order[positions[i]] = row
+        positions[i] += 1
+    return order, starts
+
+
+def _pad(size):
+    """Return the padding that aligns a section of `size` bytes."""
+    return b'\x00' * (-size % _ALIGN)
+
+
+def write(bind, path):
+    """Write a lexicon of the database at `bind`.
+
+    The lexicon is written to a temporary file that then replaces `path`,
+    so processes that have the old file open can keep using it.
+
+    :param bind: an engine or connection
+    :param path: the lexicon path
+    """
+    t = BuildInfo.__table__
+    q = select([t.c.key, t.c.value])\
+        .where(t.c.key.in_(['data_version', 'generated_forms',
+                            'generated_forms_start']))
+    info = dict(tuple(row) for row in bind.execute(q))
+    has_form_index = bind.execute(
+        select([FormIndex.__table__.c.id]).limit(1)).first() is not None
+
+    tables = []
+    strings = set()
+    for name, stmt in table_selects(form_index=has_form_index):
+        columns = [(c.name, _kind(c.type)) for c in stmt.c]
+        rows = bind.execute(stmt).fetchall()
+        values = zip(*rows) if rows else [()] * len(columns)
+        for (_, kind), column in zip(columns, values):
+            if kind == 'str':
+                strings.update(v for v in column if v is not None)
+        tables.append((name, columns, values, len(rows)))
+
+    # Strings are sorted so that they can be found by binary search.
+    strings = sorted(strings)
+    string_ids = dict((s, i) for i, s in enumerate(strings))
+
+    sections = []
+    offset = [0]
+
+    def add(data):
+        start = offset[0]
+        data += _pad(len(data))
+        sections.append(data)
+        offset[0] += len(data)
+        return start
+
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = array.array('I', [0])
+    for s in encoded:
+        offsets.append(offsets[-1] + len(s))
+    header_strings = {
+        'count': len(strings),
+        'offsets': add(offsets.tostring()),
+        'blob': add(b''.join(encoded)),
+        }
+
+    header_tables = {}
+    for name, columns, values, size in tables:
+        column_info = []
+        for (column_name, kind), column in zip(columns, values):
+            if kind == 'str':
+                data = [NULL if v is None else string_ids[v] for v in column]
+            else:
+                data = [NULL if v is None else int(v) for v in column]
+            typecode = KINDS[kind][0]
+            start = add(array.array(typecode, data).tostring())
+            column_info.append([column_name, kind, start])
+
+            if name == 'form' and column_name == 'name':
+                order, starts = name_index(data, len(strings))
+                form_index = {'order': add(order.tostring()),
+                              'starts': add(starts.tostring())}
+        header_tables[name] = {'rows': size, 'columns': column_info}
+
+    header = {
+        'byteorder': sys.byteorder,
+        'data_version': info.get('data_version'),
+        'enums': Enums.from_database(bind).as_dict(),
+        'form_index': form_index,
+        'generated_forms': 'generated_forms' in info,
+        'generated_forms_start': _int_or_none(info.get(
+            'generated_forms_start')),
+        'strings': header_strings,
+        'tables': header_tables,
+        }
+    header = json.dumps(header, sort_keys=True).encode('utf-8')
+    prefix = _PREFIX.pack(MAGIC, FORMAT, len(header))
+    head = prefix + header + _pad(len(prefix) + len(header))
+
+    tmp_path = '%s.%d' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(head)
+        for data in sections:
+            f.write(data)
+    os.rename(tmp_path, path)
+
+
+class Strings(object):
+
+    """The string table of a lexicon.
+
+    :param buf: the lexicon's buffer
+    :param count: the number of strings
+    :param offsets: the position of the offsets array in `buf`
+    :param blob: the position of the string data in `buf`
+    """
+
+    def __init__(self, buf, count, offsets, blob):
+        self.buf = buf
+        self.count = count
+        self.offsets = (ctypes.c_uint32 * (count + 1)).from_buffer(buf,
+                                                                   offsets)
+        self.blob = blob
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return self._bytes(i).decode('utf-8')
+
+    def _bytes(self, i):
+        start = self.blob + self.offsets[i]
+        end = self.blob + self.offsets[i + 1]
+        return self.buf[start:end]
+
+    def index(self, s):
+        """Return the index of `s`, or ``None`` if `s` isn't in the table."""
+        if isinstance(s, unicode):
+            s = s.encode('utf-8')
+
+        # UTF-8 preserves code point order, so the encoded strings are
+        # sorted too.
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(mid) < s:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self._bytes(lo) == s:
+            return lo
+        return None
+
+
+class Table(object):
+
+    """A table in a lexicon. Iterating over a table yields its rows as
+    tuples, in ID order.
+
+    :param name: the table name
+    :param size: the number of rows
+    :param columns: the column names
+    :param arrays: a :mod:`ctypes` array for each column
+    :param kinds: the kind of each column. See :data:`KINDS`.
+    :param strings: the lexicon's :class:`Strings`
+    """
+
+    def __init__(self, name, size, columns, arrays, kinds, strings):
+        self.name = name
+        self.size = size
+        #: The column names, in order.
+        self.columns = tuple(columns)
+        self.arrays = dict(zip(columns, arrays))
+
+        self._arrays = tuple(arrays)
+        self._strings = strings
+        # Only string and boolean columns need decoding.
+        self._decoded = [(j, kind == 'str') for j, kind in enumerate(kinds)
+                         if kind != 'int']
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for i in xrange(self.size):
+            yield self.row(i)
+
+    def row(self, i):
+        """Return row `i` as a tuple."""
+        return self.rows([i])[0]
+
+    def rows(self, indices):
+        """Return the rows at `indices` as a list of tuples. Strings that
+        these rows share are decoded only once.
+        """
+        arrays = self._arrays
+        strings = {}
+        returned = []
+        for i in indices:
+            row = [None if v == NULL else v for v in [a[i] for a in arrays]]
+            for j, is_str in self._decoded:
+                value = row[j]
+                if value is None:
+                    continue
+                if is_str:
+                    try:
+                        row[j] = strings[value]
+                    except KeyError:
+                        row[j] = strings[value] = self._strings[value]
+                else:
+                    row[j] = bool(value)
+            returned.append(tuple(row))
+        return returned
+
+    def column(self, name):
+        """Return the raw values in a column. String columns hold indices
+        into the string table, and ``None`` is stored as :data:`NULL`.
+        """
+        return self.arrays[name]
+
+
+class Lexicon(object):
+
+    """A lexicon file, opened read-only.
+
+    :param path: the lexicon path
+    :raises ValueError: if the file isn't a lexicon that this version of
+                        the package can read
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            # Copy-on-write mappings are writable from Python's point of
+            # view, which `ctypes` needs, but nothing here writes to them.
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        if len(self.buf) < _PREFIX.size:
+            raise ValueError('%s is not a lexicon' % path)
+        magic, format, header_size = _PREFIX.unpack_from(self.buf)
+        if magic != MAGIC:
+            raise ValueError('%s is not a lexicon' % path)
+        if format != FORMAT:
+            raise ValueError('%s has format %d, not %d'
+                             % (path, format, FORMAT))
+
+        start = _PREFIX.size
+        header = json.loads(self.buf[start:start + header_size])
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError('%s has %s-endian data'
+                             % (path, header['byteorder']))
+        base = start + header_size
+        base += -base % _ALIGN
+
+        #: The data version of the database the lexicon was written from.
+        self.data_version = header['data_version']
+        #: All enumerated data, as an :class:`~sanskrit.enums.Enums`.
+        self.enums = Enums.from_dict(header['enums'])
+        #: ``True`` iff the forms include generated regular forms.
+        self.generated_forms = header.get('generated_forms', False)
+        #: The ID of the first generated form, or ``None``.
+        self.generated_forms_start = header.get('generated_forms_start')
+
+        info = header['strings']
+        #: The string table, as a :class:`Strings`.
+        self.strings = Strings(self.buf, info['count'],
+                               base + info['offsets'], base + info['blob'])
+
+        #: Maps a table name to a :class:`Table`.
+        self.tables = {}
+        for name, info in header['tables'].iteritems():
+            size = info['rows']
+            columns, arrays, kinds = [], [], []
+            for column, kind, offset in info['columns']:
+                ctype = KINDS[kind][1]
+                arrays.append((ctype * size).from_buffer(self.buf,
+                                                         base + offset))
+                columns.append(column)
+                kinds.append(kind)
+            self.tables[name] = Table(name, size, columns, arrays, kinds,
+                                      self.strings)
+
+        info = header['form_index']
+        count = self.tables['form'].size
+        self._form_order = (ctypes.c_int32 * count).from_buffer(
+            self.buf, base + info['order'])
+        self._form_starts = (ctypes.c_int32 * (self.strings.count + 1))\
+            .from_buffer(self.buf, base + info['starts'])
+
+    def forms(self, name):
+        """Return all forms called `name`, as tuples in the layout of
+        :attr:`~sanskrit.schema.FormIndex.COLUMNS`.
+
+        :param name: the form's name
+        """
+        i = self.strings.index(name)
+        if i is None:
+            return []
+        order = self._form_order
+        return self.tables['form'].rows(
+            order[j] for j in xrange(self._form_starts[i],
+                                     self._form_starts[i + 1]))
+
+    def __repr__(self):
+        return 'Lexicon(%r)' % self.path
@@ -10,94 +10,265 @@
 
 from collections import defaultdict
 
+from sqlalchemy import bindparam, literal, null, select, union_all
+
 from . import sounds
-from .generate import NominalGenerator
+from .util import Cache, LRUCache, releases_session, timed
+from .generate import CELLS, NominalGenerator
 from .schema import *
 
 
+def _chunks(items, size=500):
+    """Split `items` into lists of at most `size` items. This keeps each
+    ``IN`` clause under the database's limit on bound parameters.
+    """
+    for i in xrange(0, len(items), size):
+        yield items[i:i + size]
+
+
+# Statements that are run once per call are built once here, so that the
+# engine's statement cache (see ``STATEMENT_CACHE_SIZE``) can reuse their
+# compiled SQL.
+
+#: The ID of the first stem with some name and part of speech.
+_STEM_ID = select([Stem.__table__.c.id])\
+    .where(Stem.__table__.c.name == bindparam('name'))\
+    .where(Stem.__table__.c.pos_id == bindparam('pos_id'))\
+    .limit(1)
+
+#: The ``(case_id, number_id, name)`` of each form of some stem and gender.
+_NOMINAL_PARADIGM = select([Nominal.__table__.c.case_id,
+                            Nominal.__table__.c.number_id,
+                            Form.__table__.c.name])\
+    .select_from(Form.__table__.join(Nominal.__table__))\
+    .where(Nominal.__table__.c.stem_id == bindparam('stem_id'))\
+    .where(Nominal.__table__.c.gender_id == bindparam('gender_id'))
+
+
 class SimpleQuery(object):
 
-    """A simple API for database access."""
+    """A simple API for database access.
+
+    A single :class:`SimpleQuery` can be shared by many threads. Each
+    thread uses its own session, and every public method returns its
+    connection to the pool before it returns. So an application that runs
+    queries on a pool of worker threads needs only as many connections as
+    it has busy workers.
+
+    Paradigms can be cached with a :class:`~sanskrit.util.cache.Cache`.
+    If no cache is given and ``QUERY_CACHE_SIZE`` is set, a local cache of
+    that size is used, and its entries expire after ``QUERY_CACHE_TTL``
+    seconds if that is set. Cached results are dropped when the database
+    is rebuilt. The data version is checked at most every
+    ``QUERY_CACHE_CHECK_INTERVAL`` seconds, 30 by default.
 
-    def __init__(self, ctx):
+    :param ctx: the current :class:`~sanskrit.context.Context`
+    :param cache: an optional :class:`~sanskrit.util.cache.Cache`
+    """
+
+    def __init__(self, ctx, cache=None):
         self.ctx = ctx
-        self.session = ctx.session
         self.nominal = NominalGenerator(ctx)
 
-        # Store IDs of irregular stems
-        irreg = self.session.query(StemIrregularity) \
-                    .filter(StemIrregularity.fully_described == True)
+        size = ctx.config.get('QUERY_CACHE_SIZE')
+        if cache is None and size:
+            local = LRUCache(size, ctx.config.get('QUERY_CACHE_TTL'))
+            interval = ctx.config.get('QUERY_CACHE_CHECK_INTERVAL', 30)
+            cache = Cache(local, version=lambda: ctx.data_version,
+                          check_interval=interval)
+
+        #: The :class:`~sanskrit.util.cache.Cache` for paradigms, if any.
+        self.cache = cache
 
-        self.irregular_stems = set([x.id for x in irreg])
-        self.session.remove()
+        # IDs of irregular stems
+        self.irregular_stems = ctx.irregular_stems
+
+    @property
+    def session(self):
+        return self.ctx.session
 
     def _fetch_nominal_paradigm(self, stem_id, gender_id):
         """Fetch a nominal paradigm from the database."""
-        enum_abbr = self.ctx.enum_abbr
+        ea_case = self.ctx.enum_abbr['case']
+        ea_number = self.ctx.enum_abbr['number']
 
-        results = self.session.query(Nominal)\
-                              .filter(Nominal.stem_id == stem_id)\
-                              .filter(Nominal.gender_id == gender_id)
+        results = self.session.execute(_NOMINAL_PARADIGM,
+                                       {'stem_id': stem_id,
+                                        'gender_id': gender_id})
 
         returned = {}
-        for nominal in results:
-            case = enum_abbr['case'][nominal.case_id]
-            number = enum_abbr['number'][nominal.number_id]
-            returned[(case, number)] = nominal.name
+        for case_id, number_id, name in results:
+            returned[(ea_case[case_id], ea_number[number_id])] = name
 
         return returned
 
-    def _nominal_stem(self, stem_name, stem_cls=None):
-        """Fetch a nominal stem from the database."""
-        stem_cls = stem_cls or Stem
-        stem = self.session.query(stem_cls)\
-                           .filter(stem_cls.name == stem_name)\
-                           .first()
-        return stem
+    def _stem_id(self, stem_name, pos_id):
+        """Fetch the ID of a nominal stem, or ``None`` if there is none."""
+        return self.session.execute(_STEM_ID, {'name': stem_name,
+                                               'pos_id': pos_id}).scalar()
+
+    def _cache_key(self, kind, name, *enums):
+        """Return a cache key. Enum values are normalized to their
+        abbreviations, so that e.g. ``'m'`` and ``'masculine'`` share an
+        entry.
+
+        :param kind: the kind of result
+        :param name: the stem or root name
+        :param enums: ``(table, value)`` pairs
+        :returns: the key, or ``None`` if some enum value is unknown. Such
+                  results are not cached, and the caller reports the
+                  unknown value as it would without a cache.
+        """
+        enum_id = self.ctx.enum_id
+        enum_abbr = self.ctx.enum_abbr
+        try:
+            return (kind, name) + tuple(enum_abbr[t][enum_id[t][v]]
+                                        for t, v in enums)
+        except KeyError:
+            return None
+
+    def _cache_get(self, key):
+        """Return a copy of the cached result for `key`, or ``None``."""
+        if self.cache is None or key is None:
+            return None
+        value = self.cache.get(key)
+        return dict(value) if value is not None else None
+
+    def _cache_set(self, key, value):
+        if self.cache is not None and key is not None:
+            self.cache.set(key, dict(value))
 
     def _simplify(self, forms):
         """Simplify the given forms by applying consonant reduction."""
         for parse, name in forms.iteritems():
             forms[parse] = sounds.Term(name).simplify()
 
+    @timed('query.noun')
+    @releases_session
     def noun(self, stem_name, gender):
         """Query for nouns.
 
         :param stem_name: the stem name
         :param gender: the noun gender
         """
-        stem = self._nominal_stem(stem_name, NounStem)
-        if stem is None:
-            return {}
+        return self.nouns([(stem_name, gender)])[(stem_name, gender)]
 
-        print self.session.query(NounStem)\
-                          .filter(NounStem.name == stem_name).all()
+    @timed('query.nouns')
+    @releases_session
+    def nouns(self, items):
+        """Query for the nouns of many stems at once::
 
-        if stem.id in self.irregular_stems:
-            gender_id = self.ctx.enum_id['gender'][gender]
-            returned = self._fetch_nominal_paradigm(stem.id, gender_id)
-        elif stem:
-            returned = self.nominal.paradigm(stem_name, gender)
+            results = q.nouns([('deva', 'm'), ('vana', 'n')])
+            deva = results[('deva', 'm')]
 
-        self._simplify(returned)
+        This uses one query to find all of the stems and one query to find
+        the forms of all irregular stems. Regular stems are inflected in
+        memory.
+
+        :param items: a list of ``(stem_name, gender)`` tuples
+        :returns: a :class:`dict` that maps each tuple in `items` to the
+                  result that :meth:`noun` would return for it
+        """
+        enum_id = self.ctx.enum_id
+        enum_abbr = self.ctx.enum_abbr
+        session = self.session
+
+        returned = {}
+        keys = {}
+        items = list(items)
+        for item in items:
+            keys[item] = key = self._cache_key('noun', item[0],
+                                               ('gender', item[1]))
+            cached = self._cache_get(key)
+            if cached is not None:
+                returned[item] = cached
+        items = [item for item in items if item not in returned]
+
+        s = Stem.__table__
+        f = Form.__table__
+        n = Nominal.__table__
+
+        # Stems
+        stem_ids = {}
+        names = list(set(name for name, gender in items))
+        for chunk in _chunks(names):
+            q = select([s.c.id, s.c.name])\
+                .where(s.c.pos_id == Tag.NOUN)\
+                .where(s.c.name.in_(chunk))
+            for id, name in session.execute(q):
+                stem_ids.setdefault(name, id)
+
+        # Irregular paradigms, grouped by stem and gender
+        irregular = defaultdict(dict)
+        irregular_ids = [id for id in stem_ids.itervalues()
+                         if id in self.irregular_stems]
+        for chunk in _chunks(irregular_ids):
+            q = select([n.c.stem_id, n.c.gender_id, n.c.case_id,
+                        n.c.number_id, f.c.name])\
+                .select_from(f.join(n))\
+                .where(n.c.stem_id.in_(chunk))
+            for stem_id, gender_id, case_id, number_id, name \
+                    in session.execute(q):
+                case = enum_abbr['case'][case_id]
+                number = enum_abbr['number'][number_id]
+                irregular[(stem_id, gender_id)][(case, number)] = name
+
+        paradigms = {}
+        regular = defaultdict(list)
+        for item in items:
+            stem_name, gender = item
+            stem_id = stem_ids.get(stem_name)
+            if stem_id is None:
+                returned[item] = {}
+            elif stem_id in self.irregular_stems:
+                gender_id = enum_id['gender'][gender]
+                paradigms[item] = dict(irregular[(stem_id, gender_id)])
+            else:
+                regular[gender].append(item)
+
+        # Regular paradigms, inflected in one batch per gender
+        for gender, group in regular.iteritems():
+            rows = self.nominal.paradigms([name for name, _ in group], gender)
+            for item, row in zip(group, rows):
+                if row is None:
+                    # No endings for this stem and gender, so there's
+                    # nothing to inflect.
+                    returned[item] = {}
+                else:
+                    paradigms[item] = dict(zip(CELLS, row))
+
+        for item, paradigm in paradigms.iteritems():
+            self._simplify(paradigm)
+            self._cache_set(keys[item], paradigm)
+            returned[item] = paradigm
         return returned
 
+    @timed('query.pronoun')
+    @releases_session
     def pronoun(self, stem_name, gender):
         """Query for pronouns.
 
         :param stem_name: the stem name
         :param gender: the pronoun gender
         """
-        stem = self._nominal_stem(stem_name, PronounStem)
-        if stem is None:
+        key = self._cache_key('pronoun', stem_name, ('gender', gender))
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        stem_id = self._stem_id(stem_name, Tag.PRONOUN)
+        if stem_id is None:
             return {}
 
         gender_id = self.ctx.enum_id['gender'][gender]
-        returned = self._fetch_nominal_paradigm(stem.id, gender_id)
+        returned = self._fetch_nominal_paradigm(stem_id, gender_id)
 
         self._simplify(returned)
+        self._cache_set(key, returned)
         return returned
 
+    @timed('query.verb')
+    @releases_session
     def verb(self, root_name, mode, voice, vclass=None, **kw):
         """Query for inflected verbs.
 
@@ -108,29 +279,87 @@ class SimpleQuery(object):
                        distinguish between homophonous roots, such as
                        'kR' ("do") and 'kR' ("praise").
         """
+        item = (root_name, mode, voice)
+        return self.verbs([item])[item]
+
+    @timed('query.verbs')
+    @releases_session
+    def verbs(self, items):
+        """Query for the inflected verbs of many roots at once::
+
+            results = q.verbs([('gam', 'pres', 'P'), ('BU', 'pres', 'P')])
+            gam = results[('gam', 'pres', 'P')]
+
+        This uses one query to find all of the roots and one query to find
+        all of their verbs.
+
+        :param items: a list of ``(root_name, mode, voice)`` tuples
+        :returns: a :class:`dict` that maps each tuple in `items` to the
+                  result that :meth:`verb` would return for it
+        """
         enum_id = self.ctx.enum_id
         enum_abbr = self.ctx.enum_abbr
         session = self.session
 
-        roots = session.query(Root).filter(Root.name == root_name)
-        roots_id = [r.id for r in roots]
-        mode_id = enum_id['mode'][mode]
-        voice_id = enum_id['voice'][voice]
-
         returned = {}
-        results = session.query(Verb)\
-                         .filter(Verb.root_id.in_(roots_id))\
-                         .filter(Verb.mode_id == mode_id)\
-                         .filter(Verb.voice_id == voice_id)
-        for verb in results:
-            person = enum_abbr['person'][verb.person_id]
-            number = enum_abbr['number'][verb.number_id]
-            returned[(person, number)] = verb.name
-
-        session.close()
-        self._simplify(returned)
+        keys = {}
+        items = list(items)
+        for item in items:
+            root_name, mode, voice = item
+            keys[item] = key = self._cache_key('verb', root_name,
+                                               ('mode', mode),
+                                               ('voice', voice))
+            cached = self._cache_get(key)
+            if cached is not None:
+                returned[item] = cached
+        items = [item for item in items if item not in returned]
+
+        r = Root.__table__
+        f = Form.__table__
+        v = Verb.__table__
+
+        # Roots. Homophonous roots share a name, so a name can have
+        # several IDs.
+        root_ids = defaultdict(list)
+        names = list(set(item[0] for item in items))
+        for chunk in _chunks(names):
+            q = select([r.c.id, r.c.name]).where(r.c.name.in_(chunk))
+            for id, name in session.execute(q):
+                root_ids[name].append(id)
+
+        # Verbs, grouped by root, mode, and voice
+        forms = defaultdict(dict)
+        mode_ids = list(set(enum_id['mode'][item[1]] for item in items))
+        voice_ids = list(set(enum_id['voice'][item[2]] for item in items))
+        all_root_ids = [id for ids in root_ids.itervalues() for id in ids]
+        for chunk in _chunks(all_root_ids):
+            q = select([v.c.root_id, v.c.mode_id, v.c.voice_id,
+                        v.c.person_id, v.c.number_id, f.c.name])\
+                .select_from(f.join(v))\
+                .where(v.c.root_id.in_(chunk))\
+                .where(v.c.mode_id.in_(mode_ids))\
+                .where(v.c.voice_id.in_(voice_ids))
+            for root_id, mode_id, voice_id, person_id, number_id, name \
+                    in session.execute(q):
+                person = enum_abbr['person'][person_id]
+                number = enum_abbr['number'][number_id]
+                forms[(root_id, mode_id, voice_id)][(person, number)] = name
+
+        for item in items:
+            root_name, mode, voice = item
+            mode_id = enum_id['mode'][mode]
+            voice_id = enum_id['voice'][voice]
+            paradigm = {}
+            for root_id in root_ids.get(root_name, []):
+                paradigm.update(forms[(root_id, mode_id, voice_id)])
+
+            self._simplify(paradigm)
+            self._cache_set(keys[item], paradigm)
+            returned[item] = paradigm
         return returned
 
+    @timed('query.verb_summary')
+    @releases_session
     def verb_summary(self, root_name, vclass=None):
         """Query for a summary of a verb's behavior.
 
@@ -145,48 +374,95 @@ class SimpleQuery(object):
                        distinguish between homophonous roots, such as
                        'kR' ("do") and 'kR' ("praise").
         """
-        verbs = defaultdict(list)
-        participles = defaultdict(list)
+        return self.verb_summaries([root_name])[root_name]
 
+    @timed('query.verb_summaries')
+    @releases_session
+    def verb_summaries(self, root_names):
+        """Query for summaries of many roots at once. Each summary is
+        the same as the one returned by :meth:`verb_summary`.
+
+        The roots, verbs, and participles are fetched together in a single
+        ``UNION ALL`` statement that selects only the columns it needs.
+
+        :param root_names: a list of root names
+        :returns: a :class:`dict` that maps each root name to its summary
+        """
         ctx = self.ctx
-        session = self.session
 
         # abbr -> ID
-        ei_person = ctx.enum_id['person']
-        ei_number = ctx.enum_id['number']
+        person_id = ctx.enum_id['person']['3']
+        number_id = ctx.enum_id['number']['s']
 
         # ID -> abbr
         ea_mode = ctx.enum_abbr['mode']
         ea_voice = ctx.enum_abbr['voice']
 
-        # Root
-        root = session.query(Root).filter(Root.name == root_name).first()
-        if root is None:
-            return {}
-        root_id = root.id
-
-        # Verbs
-        results = session.query(Verb).filter(Verb.root_id == root_id) \
-                         .filter(Verb.person_id == ei_person['3']) \
-                         .filter(Verb.number_id == ei_number['s'])\
-
-        for r in results:
-            mode = ea_mode[r.mode_id]
-            voice = ea_voice[r.voice_id]
-            verbs[(mode, voice)].append(r.name)
-
-        # Participles
-        results = session.query(ParticipleStem) \
-                         .filter(ParticipleStem.root_id == root_id)
-
-        for r in results:
-            mode = ea_mode[r.mode_id]
-            voice = ea_voice[r.voice_id]
-            participles[(mode, voice)].append(r.name)
-
-        session.close()
-        return {
-            'root_id': root_id,
-            'verbs': verbs,
-            'participles': participles,
-            }
+        root_names = list(set(root_names))
+        rows = []
+        for chunk in _chunks(root_names, 300):
+            q = _verb_summary_query(chunk, person_id, number_id)
+            rows.extend(self.session.execute(q))
+
+        # Use the first root with each name, as `Query.first` would.
+        root_ids = {}
+        for kind, root_id, mode_id, voice_id, name, item_id in rows:
+            if kind == 'r' and (name not in root_ids or
+                                root_id < root_ids[name]):
+                root_ids[name] = root_id
+
+        summaries = {}
+        for root_id in root_ids.itervalues():
+            summaries[root_id] = {
+                'root_id': root_id,
+                'verbs': defaultdict(list),
+                'participles': defaultdict(list),
+                }
+
+        for kind, root_id, mode_id, voice_id, name, item_id in rows:
+            summary = summaries.get(root_id)
+            if kind == 'r' or summary is None:
+                continue
+            key = (ea_mode[mode_id], ea_voice[voice_id])
+            group = 'verbs' if kind == 'v' else 'participles'
+            summary[group][key].append(name)
+
+        returned = {}
+        for name in root_names:
+            root_id = root_ids.get(name)
+            returned[name] = summaries[root_id] if root_id is not None else {}
+        return returned
+
+
+def _verb_summary_query(root_names, person_id, number_id):
+    """Build the statement for :meth:`SimpleQuery.verb_summaries`. Each
+    row is ``(kind, root_id, mode_id, voice_id, name, item_id)``, where
+    `kind` is ``'r'`` for roots, ``'v'`` for verbs, and ``'p'`` for
+    participle stems.
+    """
+    r = Root.__table__
+    f = Form.__table__
+    v = Verb.__table__
+    s = Stem.__table__
+    ps = ParticipleStem.__table__
+
+    roots = select([literal('r').label('kind'), r.c.id.label('root_id'),
+                    null().label('mode_id'), null().label('voice_id'),
+                    r.c.name.label('name'), r.c.id.label('item_id')])\
+        .where(r.c.name.in_(root_names))
+
+    verbs = select([literal('v'), v.c.root_id, v.c.mode_id, v.c.voice_id,
+                    f.c.name, f.c.id])\
+        .select_from(v.join(f, v.c.id == f.c.id)
+                      .join(r, v.c.root_id == r.c.id))\
+        .where(r.c.name.in_(root_names))\
+        .where(v.c.person_id == person_id)\
+        .where(v.c.number_id == number_id)
+
+    participles = select([literal('p'), ps.c.root_id, ps.c.mode_id,
+                          ps.c.voice_id, s.c.name, s.c.id])\
+        .select_from(ps.join(s, ps.c.id == s.c.id)
+                       .join(r, ps.c.root_id == r.c.id))\
+        .where(r.c.name.in_(root_names))
+
+    return union_all(roots, verbs, participles).order_by('item_id')
@@ -9,8 +9,7 @@ Sandhi operations.
 """
 
 from . import sounds
-from .schema import SandhiRule
-from .util import HashTrie
+from .util import Trie, timed
 
 
 class Exempt(unicode):
@@ -35,7 +34,7 @@ class Sandhi(object):
 
     def __init__(self, rules=None):
         """"""
-        self.splitter = HashTrie()
+        self.splitter = Trie()
         self.joiner = {}
         if rules:
             self.add_rules(rules)
@@ -48,10 +47,8 @@ class Sandhi(object):
         self.add_rules(*self._query(ctx))
 
     def _query(self, ctx):
-        """Query for :class:`SandhiRule`s and yield each as a
-        :class:`dict`."""
-        for rule in ctx.session.query(SandhiRule):
-            yield (rule.first, rule.second, rule.result)
+        """Return all sandhi rules as ``(first, second, result)`` tuples."""
+        return ctx.sandhi_rules
 
     def add_rules(self, *rules):
         """Add rules for splitting and joining words. Rules should be ordered
@@ -123,6 +120,7 @@ class Sandhi(object):
 
         return ''.join(letters)
 
+    @timed('sandhi.join')
     def join(self, *chunks, **kw):
         """Join the given chunks according to the object's rules::
 
@@ -184,6 +182,7 @@ class Sandhi(object):
         else:
             return returned
 
+    @timed('sandhi.splits')
     def splits(self, chunk):
         """Return a generator for all splits in `chunk`. Results are yielded
         as 2-tuples containing the term before the split and the term after::
@@ -214,11 +213,11 @@ class Sandhi(object):
                 yield (chunk1, chunk2)
 
             # Rule-based splits: undo a sandhi change
-            rules = splitter[chunk2]
-            for first, second, result, _, _, len_result in rules:
-                before = chunk1 + first
-                after = second + chunk2[len_result:]
-                yield (before, after)
+            for _, rules in splitter.iter_prefixes(chunk2):
+                for first, second, result, _, _, len_result in rules:
+                    before = chunk1 + first
+                    after = second + chunk2[len_result:]
+                    yield (before, after)
 
         # Non-split: yield the chunk as-is.
         yield (chunk, '')
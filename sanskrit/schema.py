@@ -4,11 +4,18 @@ sanskrit.schema
 ~~~~~~~~~~~~~~~
 
 Schema for Sanskrit data.
+
+Indexes follow the lookups in :mod:`sanskrit.query` and
+:mod:`sanskrit.analyze`. Composite indexes list their columns in the order
+the queries filter on them, so a query that uses only the leading columns
+can still use the index. To add new indexes to an existing database, use
+:meth:`~sanskrit.context.Context.create_indexes`.
 """
 
 import re
 
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String
+from sqlalchemy import (Boolean, Column, ForeignKey, Index, Integer, String,
+                        func, select)
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.ext.declarative import declarative_base, declared_attr
 from sqlalchemy.ext.orderinglist import ordering_list
@@ -377,6 +384,9 @@ class PrefixedModifiedRoot(PrefixedRoot, ModifiedRoot):
     modifications = association_proxy('mod_assocs', 'modification')
 
 
+Index('ix_root_name', Root.name)
+
+
 class Stem(SimpleBase):
 
     """A nominal stem. This corresponds to Panini's **aṅga**:
@@ -401,6 +411,9 @@ class Stem(SimpleBase):
     __mapper_args__ = {'polymorphic_on': pos_id}
 
 
+Index('ix_stem_name_pos_id', Stem.name, Stem.pos_id)
+
+
 class NounStem(Stem):
 
     """Stem of a :class:`Noun`."""
@@ -434,7 +447,7 @@ class ParticipleStem(Stem):
 
     id = Column(ForeignKey(Stem.id), primary_key=True)
 
-    root_id = Column(ForeignKey(Root.id))
+    root_id = Column(ForeignKey(Root.id), index=True)
     mode_id = Column(ForeignKey(Mode.id))
     voice_id = Column(ForeignKey(Voice.id))
 
@@ -486,6 +499,9 @@ class Form(SimpleBase):
     __mapper_args__ = {'polymorphic_on': pos_id}
 
 
+Index('ix_form_name', Form.name)
+
+
 class Indeclinable(Form):
 
     """A complete form. This corresponds to Panini's **avyaya**."""
@@ -517,6 +533,10 @@ class Verb(Form):
     voice = relationship(Voice)
 
 
+Index('ix_verb_root_id_mode_id_voice_id',
+      Verb.root_id, Verb.mode_id, Verb.voice_id)
+
+
 class VerbalIndeclinable(Form):
 
     """A complete form. :class:`VerbalIndeclinable` is a superclass for
@@ -578,6 +598,9 @@ class Nominal(Form):
     number = relationship(Number)
 
 
+Index('ix_nominal_stem_id_gender_id', Nominal.stem_id, Nominal.gender_id)
+
+
 class Noun(Nominal):
 
     """A complete form."""
@@ -618,6 +641,74 @@ class Participle(Nominal):
     root = association_proxy('stem', 'root')
 
 
+# Form index
+# ----------
+# A flat copy of all forms, for fast lookup by name.
+
+class FormIndex(Base):
+
+    """A denormalized copy of :class:`Form` and its subclasses. Each row
+    holds a form's name and all of its grammatical data, and the name index
+    covers every column, so a form can be analyzed with a single index
+    lookup and no joins.
+
+    This table is optional. It's filled at the end of
+    :func:`sanskrit.setup.run` unless ``FORM_INDEX`` is ``False``. Columns
+    that don't apply to a form, such as `person_id` for a noun, are
+    ``NULL``.
+    """
+
+    __tablename__ = 'form_index'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    pos_id = Column(Integer)
+    stem_id = Column(Integer)
+    root_id = Column(Integer)
+    gender_id = Column(Integer)
+    case_id = Column(Integer)
+    number_id = Column(Integer)
+    person_id = Column(Integer)
+    mode_id = Column(Integer)
+    voice_id = Column(Integer)
+    compounded = Column(Boolean)
+
+    #: The columns of a :class:`FormIndex` row, in order.
+    COLUMNS = ('id', 'name', 'pos_id', 'stem_id', 'root_id', 'gender_id',
+               'case_id', 'number_id', 'person_id', 'mode_id', 'voice_id',
+               'compounded')
+
+
+Index('ix_form_index_name', *[FormIndex.__table__.c[c]
+                              for c in FormIndex.COLUMNS[1:]])
+
+
+def form_index_select():
+    """Return a statement that selects the :class:`FormIndex` rows for all
+    forms, by joining :class:`Form` with its subclass tables.
+    """
+    f = Form.__table__
+    v = Verb.__table__
+    n = Nominal.__table__
+    vi = VerbalIndeclinable.__table__
+    ps = ParticipleStem.__table__
+
+    joined = f.outerjoin(v, v.c.id == f.c.id)\
+              .outerjoin(n, n.c.id == f.c.id)\
+              .outerjoin(vi, vi.c.id == f.c.id)\
+              .outerjoin(ps, ps.c.id == n.c.stem_id)
+
+    def either(name, *tables):
+        return func.coalesce(*[t.c[name] for t in tables]).label(name)
+
+    return select([f.c.id, f.c.name, f.c.pos_id, n.c.stem_id,
+                   either('root_id', v, vi, ps), n.c.gender_id, n.c.case_id,
+                   either('number_id', v, n), v.c.person_id,
+                   either('mode_id', v, ps), either('voice_id', v, ps),
+                   n.c.compounded])\
+        .select_from(joined)
+
+
 # Associations
 # ------------
 # Code for building various many-to-many relationships
@@ -681,6 +772,32 @@ class RootModAssociation(SimpleBase):
         self.modification = modification
 
 
+# Build information
+# =================
+
+class BuildInfo(Base):
+
+    """Key-value data about the database build itself. All values are
+    strings. The keys are:
+
+    - ``'data_version'``, a new random value for every build
+    - ``'checksum:<KEY>'``, the checksum of the data file named by the
+      config key ``KEY`` when it was last built
+    - ``'stages'``, a JSON list of the names of the stages that were built
+    - ``'root_map'``, a JSON list of ``[name, hom, id]`` lists for every
+      root, so that later stages can run without rebuilding the roots
+    - ``'generated_forms'``, the number of generated forms in the
+      :class:`FormIndex` table. This is set only if there are any.
+    - ``'generated_forms_start'``, the ID of the first generated
+      :class:`FormIndex` row. Every stored form has a smaller ID.
+    """
+
+    __tablename__ = 'build_info'
+
+    key = Column(String, primary_key=True)
+    value = Column(String)
+
+
 # Sandhi rules
 # ============
 
@@ -5,26 +5,198 @@ sanskrit.setup
 Setup code for various Sanskrit data.
 """
 
+import functools
+import hashlib
+import itertools
+import json
+import marshal
+import multiprocessing
+import multiprocessing.pool
+import os
 import sys
+import uuid
 
 import yaml
+from sqlalchemy import exc, func, select
 
-from sanskrit import util
+from sanskrit import lexicon, util
+from sanskrit.context import Context
+from sanskrit.enums import Enums
+from sanskrit.generate import CELLS, NominalGenerator
 from sanskrit.schema import *
 
 # Populated in `add_enums`
 ENUM = {}
 
+#: The number of rows in each batch of inserts.
+BATCH_SIZE = 5000
+
 
 # Miscellaneous
 # -------------
 
+def next_id(conn, table):
+    """Return the first unused primary key in `table`.
+
+    Loaders assign primary keys themselves instead of flushing each new
+    object to learn its ID. Parent and child rows (e.g. :class:`Form` and
+    :class:`Verb`) can then be inserted in batches, and the session can
+    insert all new objects of a class with a single ``executemany``.
+
+    :param conn: a connection or session
+    :param table: a :class:`~sqlalchemy.schema.Table`
+    """
+    return (conn.execute(select([func.max(table.c.id)])).scalar() or 0) + 1
+
+
+def id_counter(conn, cls):
+    """Return an iterator over the unused primary keys of `cls`.
+
+    :param conn: a connection or session
+    :param cls: a mapped class
+    """
+    return itertools.count(next_id(conn, cls.__table__))
+
+
+def insert_many(conn, batches):
+    """Insert rows with one ``executemany`` per table.
+
+    :param conn: a connection
+    :param batches: a list of ``(table, rows)`` pairs, in insert order.
+                    Each row is a :class:`dict`.
+    """
+    for table, rows in batches:
+        if rows:
+            conn.execute(table.insert(), rows)
+
+
+# Parsed YAML files, by path. During :func:`run_stages`, a value might be a
+# pending result from a worker process.
+_documents = {}
+
+
+#: The loader for all data files. libyaml's loader is several times faster
+#: than the pure-Python one, so it's used whenever PyYAML was built with it.
+YAMLLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+#: The format of cached YAML documents. Caches with another format are
+#: ignored.
+YAML_CACHE_FORMAT = 1
+
+
+def yaml_cache_path(path, cache_dir):
+    """Return the path of the cached documents for `path`."""
+    path = os.path.abspath(path)
+    digest = hashlib.sha1(path).hexdigest()[:12]
+    name = '%s-%s.marshal' % (os.path.basename(path), digest)
+    return os.path.join(cache_dir, name)
+
+
+def read_yaml_cache(path, cache_dir):
+    """Return the cached documents for `path`, or ``None`` if there are none
+    or if `path` changed after they were cached.
+    """
+    stat = os.stat(path)
+    try:
+        with open(yaml_cache_path(path, cache_dir), 'rb') as f:
+            format, mtime, size, documents = marshal.load(f)
+    except (IOError, EOFError, ValueError, TypeError):
+        return None
+    if (format, mtime, size) != (YAML_CACHE_FORMAT, stat.st_mtime,
+                                 stat.st_size):
+        return None
+    return documents
+
+
+def write_yaml_cache(path, cache_dir, stat, documents):
+    """Cache the documents parsed from `path`.
+
+    :param stat: the result of :func:`os.stat` on `path`, taken before it
+                 was parsed
+    """
+    data = (YAML_CACHE_FORMAT, stat.st_mtime, stat.st_size, documents)
+    try:
+        blob = marshal.dumps(data)
+    except ValueError:
+        # Some YAML types, such as dates, can't be marshaled.
+        return
+    try:
+        os.makedirs(cache_dir)
+    except OSError:
+        if not os.path.isdir(cache_dir):
+            raise
+
+    # Write to a temporary file first, so that readers never see a partial
+    # cache.
+    cache_path = yaml_cache_path(path, cache_dir)
+    tmp_path = '%s.%d' % (cache_path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(blob)
+    os.rename(tmp_path, cache_path)
+
+
+def iter_yaml(path):
+    """Yield the YAML documents in the file at `path` one at a time."""
+    with open(path) as f:
+        for document in yaml.load_all(f, Loader=YAMLLoader):
+            yield document
+
+
+def parse_yaml(path, cache_dir=None):
+    """Return a list of all YAML documents in the file at `path`.
+
+    :param cache_dir: if set, the directory for cached documents. Fresh
+                      documents there are used instead of parsing `path`,
+                      and new ones are written there.
+    """
+    if cache_dir is None:
+        return list(iter_yaml(path))
+
+    documents = read_yaml_cache(path, cache_dir)
+    if documents is None:
+        stat = os.stat(path)
+        documents = list(iter_yaml(path))
+        write_yaml_cache(path, cache_dir, stat, documents)
+    return documents
+
+
+def load_yaml_all(ctx, key):
+    """Return the YAML documents in the file named by ``ctx.config[key]``.
+
+    If the file was scheduled for parsing by :func:`run_stages`, this waits
+    for and returns that result. If ``YAML_CACHE_DIR`` is set, documents are
+    cached there and reused until the file changes. Otherwise, documents are
+    parsed one at a time as the caller iterates over them.
+
+    Callers must not modify the returned documents.
+    """
+    path = ctx.config[key]
+    documents = _documents.get(path)
+    if documents is None:
+        cache_dir = ctx.config.get('YAML_CACHE_DIR')
+        if cache_dir:
+            return parse_yaml(path, cache_dir)
+        return iter_yaml(path)
+    if isinstance(documents, multiprocessing.pool.ApplyResult):
+        documents = _documents[path] = documents.get()
+    return documents
+
+
+def load_yaml(ctx, key):
+    """Return the first YAML document in the file named by
+    ``ctx.config[key]``. See :func:`load_yaml_all`.
+    """
+    for document in load_yaml_all(ctx, key):
+        return document
+
+
 def add_tags(ctx):
     session = ctx.session
     for key in dir(Tag):
         if key.isupper():
             id = getattr(Tag, key)
             session.add(Tag(id=id, name=key.lower()))
+            util.advance()
 
     session.commit()
     session.close()
@@ -48,71 +220,78 @@ def add_enums(ctx):
                Gender, Case, SandhiType]
     names = [c.__name__ for c in classes]
     mapper = dict(zip(names, classes))
+    enums = load_yaml(ctx, 'ENUMS')
 
     # First pass: ordinary enums
-    with open(ctx.config['ENUMS']) as f:
-        for enum in yaml.load(f):
-            enum_name = enum['name']
-            cls = mapper.get(enum_name, None)
-            if cls is None:
-                continue
+    for enum in enums:
+        enum_name = enum['name']
+        cls = mapper.get(enum_name, None)
+        if cls is None:
+            continue
 
-            enum_abbr = cls.__tablename__
-            ENUM[enum_abbr] = {}
+        enum_abbr = cls.__tablename__
+        ENUM[enum_abbr] = {}
+        ids = id_counter(session, cls)
 
-            for item in enum['items']:
-                item_name = item['name']
-                abbr = item['abbr']
-                e = cls(name=item_name, abbr=abbr)
+        for item in enum['items']:
+            item_name = item['name']
+            abbr = item['abbr']
+            e = cls(id=next(ids), name=item_name, abbr=abbr)
 
-                session.add(e)
-                session.flush()
-                ENUM[enum_abbr][abbr] = e.id
+            session.add(e)
+            ENUM[enum_abbr][abbr] = e.id
+            util.advance()
 
-            util.tick(cls.__name__)
+        util.tick(cls.__name__)
 
     session.commit()
 
     # Second pass: gender groups
-    with open(ctx.config['ENUMS']) as f:
-        for enum in yaml.load(f):
-            enum_name = enum['name']
-            cls = GenderGroup
-            if enum_name != cls.__name__:
-                continue
+    for enum in enums:
+        enum_name = enum['name']
+        cls = GenderGroup
+        if enum_name != cls.__name__:
+            continue
 
-            enum_abbr = cls.__tablename__
-            ENUM[enum_abbr] = {}
+        enum_abbr = cls.__tablename__
+        ENUM[enum_abbr] = {}
+        ids = id_counter(session, cls)
 
-            for item in enum['items']:
-                e = cls(name=item['name'], abbr=item['abbr'])
-                session.add(e)
-                session.flush()
+        for item in enum['items']:
+            e = cls(id=next(ids), name=item['name'], abbr=item['abbr'])
+            session.add(e)
 
-                e.members = [ENUM['gender'][x] for x in item['members']]
+            e.members = [ENUM['gender'][x] for x in item['members']]
 
-                abbr = item['abbr']
-                ENUM[enum_abbr][abbr] = e.id
+            abbr = item['abbr']
+            ENUM[enum_abbr][abbr] = e.id
+            util.advance()
 
-            util.tick(cls.__name__)
+        util.tick(cls.__name__)
 
     session.commit()
     session.close()
 
 
+def restore_enums(ctx):
+    """Fill :data:`ENUM` from the database, as :func:`add_enums` would."""
+    ENUM.clear()
+    for name, table in Enums.from_database(ctx.engine).tables.iteritems():
+        ENUM[name] = dict(table.ids)
+
+
 def add_sandhi(ctx):
     """Add sandhi rules to the database."""
     session = ctx.session
     stype = ENUM['sandhi_type']
 
-    with open(ctx.config['SANDHI']) as f:
-        for ruleset in yaml.load_all(f):
-            rule_type = ruleset['type']
-            util.tick(rule_type)
-            for rule in ruleset['rules']:
-                rule['rule_type'] = stype[rule_type]
-                s = SandhiRule(**rule)
-                session.add(s)
+    for ruleset in load_yaml_all(ctx, 'SANDHI'):
+        rule_type = ruleset['type']
+        util.tick(rule_type)
+        for rule in ruleset['rules']:
+            rule = dict(rule, rule_type=stype[rule_type])
+            session.add(SandhiRule(**rule))
+        util.advance(len(ruleset['rules']))
 
     session.commit()
     session.close()
@@ -122,12 +301,13 @@ def add_indeclinables(ctx):
     """Add indeclinables to the database."""
     session = ctx.session
 
-    with open(ctx.config['INDECLINABLES']) as f:
-        for i, name in enumerate(yaml.load(f)):
-            ind = Indeclinable(name=name)
-            session.add(ind)
-            if i % 200 == 0:
-                util.tick(name)
+    names = load_yaml(ctx, 'INDECLINABLES')
+    for i, name in enumerate(names):
+        ind = Indeclinable(name=name)
+        session.add(ind)
+        if i % 200 == 0:
+            util.tick(name)
+    util.advance(len(names))
 
     session.commit()
     session.close()
@@ -140,15 +320,15 @@ def add_verb_prefixes(ctx):
     """Add verb prefixes to the database."""
     session = ctx.session
     prefix_map = {}
+    ids = id_counter(session, VerbPrefix)
 
-    with open(ctx.config['VERB_PREFIXES']) as f:
-        for group in yaml.load_all(f):
-            util.tick(group['name'])
-            for name in group['items']:
-                prefix = VerbPrefix(name=name)
-                session.add(prefix)
-                session.flush()
-                prefix_map[name] = prefix.id
+    for group in load_yaml_all(ctx, 'VERB_PREFIXES'):
+        util.tick(group['name'])
+        for name in group['items']:
+            prefix = VerbPrefix(id=next(ids), name=name)
+            session.add(prefix)
+            prefix_map[name] = prefix.id
+        util.advance(len(group['items']))
 
     session.commit()
     session.close()
@@ -159,30 +339,28 @@ def add_verb_endings(ctx):
     """Add verb endings to the database."""
     session = ctx.session
 
-    with open(ctx.config['VERB_ENDINGS']) as f:
-        person = ENUM['person']
-        number = ENUM['number']
-        mode = ENUM['mode']
-        voice = ENUM['voice']
-
-        for group in yaml.load_all(f):
-            mode_id = mode[group['mode']]
-            voice_id = voice[group['voice']]
-            category = group['category']
-
-            for row in group['endings']:
-                kw = {
-                    'name': row['name'],
-                    'category': category,
-                    'person_id': person[row['person']],
-                    'number_id': number[row['number']],
-                    'mode_id': mode_id,
-                    'voice_id': voice_id,
-                    }
-                ending = VerbEnding(**kw)
-                session.add(ending)
-                session.flush()
-            util.tick((group['mode'], group['voice'], category))
+    person = ENUM['person']
+    number = ENUM['number']
+    mode = ENUM['mode']
+    voice = ENUM['voice']
+
+    for group in load_yaml_all(ctx, 'VERB_ENDINGS'):
+        mode_id = mode[group['mode']]
+        voice_id = voice[group['voice']]
+        category = group['category']
+
+        for row in group['endings']:
+            kw = {
+                'name': row['name'],
+                'category': category,
+                'person_id': person[row['person']],
+                'number_id': number[row['number']],
+                'mode_id': mode_id,
+                'voice_id': voice_id,
+                }
+            session.add(VerbEnding(**kw))
+        util.tick((group['mode'], group['voice'], category))
+        util.advance(len(group['endings']))
 
     session.commit()
     session.close()
@@ -196,76 +374,90 @@ def add_roots(ctx):
     voice = ENUM['voice']
 
     root_map = {}  # (name, hom) -> id
-    with open(ctx.config['ROOTS']) as f:
-        for i, item in enumerate(yaml.load_all(f)):
-            name = item['name']
-            paradigms = item['paradigms']
+    ids = id_counter(session, Root)
+    for i, item in enumerate(load_yaml_all(ctx, 'ROOTS')):
+        name = item['name']
+        paradigms = item['paradigms']
 
-            root = Root(name=name)
-            session.add(root)
-            session.flush()
+        root = Root(id=next(ids), name=name)
+        session.add(root)
 
-            for row in paradigms:
-                paradigm = Paradigm(root_id=root.id,
-                                    vclass_id=vclass[row[0]],
-                                    voice_id=voice[row[1]])
-                session.add(paradigm)
+        for row in paradigms:
+            paradigm = Paradigm(root_id=root.id,
+                                vclass_id=vclass[row[0]],
+                                voice_id=voice[row[1]])
+            session.add(paradigm)
 
-            hom = item.get('hom', None)
-            root_map[(name, hom)] = root.id
+        hom = item.get('hom', None)
+        root_map[(name, hom)] = root.id
+        util.advance(1 + len(paradigms))
 
-            if i % 100 == 0:
-                util.tick(name)
+        if i % 100 == 0:
+            util.tick(name)
+
+    # Saved for incremental builds. See `restore_root_map`.
+    items = sorted([name, hom, id] for (name, hom), id in root_map.items())
+    session.merge(BuildInfo(key='root_map', value=json.dumps(items)))
 
     session.commit()
     session.close()
     return root_map
 
 
+def restore_root_map(ctx):
+    """Return the root map saved by the last call to :func:`add_roots`."""
+    t = BuildInfo.__table__
+    q = select([t.c.value]).where(t.c.key == 'root_map')
+    items = json.loads(ctx.engine.execute(q).scalar() or '[]')
+    return dict(((name, hom), id) for name, hom, id in items)
+
+
 def add_prefixed_roots(ctx, root_map=None, prefix_map=None):
     """Add prefixed roots to the database."""
 
     homs = [None] + [str(i) for i in range(1, 10)]
 
+    session = ctx.session
+    ids = id_counter(session, Root)
+
     # Contains roots that weren't added by `add_roots`.
     missed = set()
 
-    with open(ctx.config['PREFIXED_ROOTS']) as f:
-        for i, item in enumerate(yaml.load_all(f)):
-            name = item['name']
-            basis = item['basis']
-            hom = item.get('hom', None)
-            prefixes = item['prefixes']
+    for i, item in enumerate(load_yaml_all(ctx, 'PREFIXED_ROOTS')):
+        name = item['name']
+        basis = item['basis']
+        hom = item.get('hom', None)
+        prefixes = item['prefixes']
 
-            basis_id = None
-            try:
-                basis_id = root_map[(basis, hom)]
-            except KeyError:
-                for hom in homs:
-                    try:
-                        basis_id = root_map[(basis, hom)]
-                    except KeyError:
-                        pass
-
-            if basis_id is None:
-                candidates = [k for k in root_map.keys() if k[0] == basis]
-                print 'SKIPPED:', name, basis, candidates
-                missed.add(basis)
-                continue
+        basis_id = None
+        try:
+            basis_id = root_map[(basis, hom)]
+        except KeyError:
+            for hom in homs:
+                try:
+                    basis_id = root_map[(basis, hom)]
+                except KeyError:
+                    pass
+
+        if basis_id is None:
+            candidates = [k for k in root_map.keys() if k[0] == basis]
+            util.tick('Skipped %s (%s, %s)' % (name, basis, candidates))
+            missed.add(basis)
+            continue
 
-            prefixed_root = PrefixedRoot(name=name, basis_id=basis_id)
-            session.add(prefixed_root)
-            session.flush()
+        prefixed_root = PrefixedRoot(id=next(ids), name=name,
+                                     basis_id=basis_id)
+        session.add(prefixed_root)
 
-            for prefix in prefixes:
-                pass
+        for prefix in prefixes:
+            pass
 
-            if i % 100 == 0:
-                util.tick(name)
+        if i % 100 == 0:
+            util.tick(name)
 
     session.commit()
     session.close()
-    print missed
+    util.tick('Missed %s' % sorted(missed))
 
 
 def add_modified_roots(ctx):
@@ -273,46 +465,55 @@ def add_modified_roots(ctx):
 
 
 def add_verbs(ctx, root_map=None):
-    """Add inflected verbs to the database."""
+    """Add inflected verbs to the database. The `form` and `verb` rows
+    are written in batches with preassigned IDs.
+    """
 
-    session = ctx.session
     vclass = ENUM['vclass']
     person = ENUM['person']
     number = ENUM['number']
     mode = ENUM['mode']
     voice = ENUM['voice']
     skipped = set()
-    i = 0
 
-    for row in util.read_csv(ctx.config['VERBS']):
-        root = row['root']
-        hom = row['hom']
+    form_table = Form.__table__
+    verb_table = Verb.__table__
 
-        try:
-            root_id = root_map[(root, hom)]
-        except KeyError:
-            skipped.add((root, hom))
-            continue
+    columns = ['name', 'root', 'hom', 'vclass', 'person', 'number', 'mode',
+               'voice']
+    rows = util.read_csv_rows(ctx.config['VERBS'], columns)
+    with ctx.engine.begin() as conn:
+        id = next_id(conn, form_table)
+        forms, verbs = [], []
+        for name, root, hom, vc, p, n, m, v in rows:
+            try:
+                root_id = root_map[(root, hom)]
+            except KeyError:
+                skipped.add((root, hom))
+                continue
 
-        data = {
-            'name': row['name'],
-            'root_id': root_id,
-            'vclass_id': vclass[row['vclass']] if row['vclass'] else None,
-            'person_id': person[row['person']],
-            'number_id': number[row['number']],
-            'mode_id': mode[row['mode']],
-            'voice_id': voice[row['voice']]
-        }
-        session.add(Verb(**data))
-
-        i += 1
-        if i % 1000 == 0:
-            util.tick(row['name'])
-            session.commit()
+            forms.append({'id': id, 'name': name, 'pos_id': Tag.VERB})
+            verbs.append({
+                'id': id,
+                'root_id': root_id,
+                'vclass_id': vclass[vc] if vc else None,
+                'person_id': person[p],
+                'number_id': number[n],
+                'mode_id': mode[m],
+                'voice_id': voice[v]
+                })
+            id += 1
+
+            if len(verbs) == BATCH_SIZE:
+                insert_many(conn, [(form_table, forms), (verb_table, verbs)])
+                util.tick(name)
+                util.advance(len(verbs))
+                forms, verbs = [], []
 
-    session.commit()
-    session.close()
-    print 'Skipped', len(skipped), 'roots.'
+        insert_many(conn, [(form_table, forms), (verb_table, verbs)])
+        util.advance(len(verbs))
+
+    util.tick('Skipped %d roots.' % len(skipped))
 
 
 def add_verbal_indeclinables(ctx, root_map=None):
@@ -325,11 +526,10 @@ def add_verbal_indeclinables(ctx, root_map=None):
         ('INFINITIVES', Infinitive),
         ]
 
+    columns = ['name', 'root', 'hom']
     for file_key, cls in items:
-        for row in util.read_csv(ctx.config[file_key]):
-            root = row['root']
-            hom = row['hom']
-
+        for name, root, hom in util.read_csv_rows(ctx.config[file_key],
+                                                  columns):
             try:
                 root_id = root_map[(root, hom)]
             except KeyError:
@@ -337,133 +537,113 @@ def add_verbal_indeclinables(ctx, root_map=None):
                 continue
 
             datum = {
-                'name': row['name'],
+                'name': name,
                 'root_id': root_id
                 }
             session.add(cls(**datum))
+            util.advance()
     session.commit()
 
 
 def add_participle_stems(ctx, root_map=None):
-    """"""
+    """Add participle stems to the database. The `stem` and
+    `participlestem` rows are written in batches with preassigned IDs.
+    """
 
-    session = ctx.session
     root_map = root_map or {}
     mode = ENUM['mode']
     voice = ENUM['voice']
     skipped = set()
-    i = 0
-
-    for row in util.read_csv(ctx.config['PARTICIPLE_STEMS']):
-        root = row['root']
-        hom = row['hom']
 
-        try:
-            root_id = root_map[(root, hom)]
-        except KeyError:
-            skipped.add((root, hom))
-            continue
+    stem_table = Stem.__table__
+    participle_table = ParticipleStem.__table__
 
-        data = {
-            'name': row['name'],
-            'root_id': root_id,
-            'mode_id': mode[row['mode']],
-            'voice_id': voice[row['voice']]
-            }
+    columns = ['name', 'root', 'hom', 'mode', 'voice']
+    rows = util.read_csv_rows(ctx.config['PARTICIPLE_STEMS'], columns)
+    with ctx.engine.begin() as conn:
+        id = next_id(conn, stem_table)
+        stems, participles = [], []
+        for name, root, hom, m, v in rows:
+            try:
+                root_id = root_map[(root, hom)]
+            except KeyError:
+                skipped.add((root, hom))
+                continue
 
-        session.add(ParticipleStem(**data))
+            stems.append({
+                'id': id,
+                'name': name,
+                'pos_id': Tag.PARTICIPLE,
+                'genders_id': None,
+                'dependent': False,
+                })
+            participles.append({
+                'id': id,
+                'root_id': root_id,
+                'mode_id': mode[m],
+                'voice_id': voice[v]
+                })
+            id += 1
+
+            if len(stems) == BATCH_SIZE:
+                insert_many(conn, [(stem_table, stems),
+                                   (participle_table, participles)])
+                util.tick(name)
+                util.advance(len(stems))
+                stems, participles = [], []
 
-        i += 1
-        if i % 100 == 0:
-            util.tick(row['name'])
-            session.commit()
+        insert_many(conn, [(stem_table, stems),
+                           (participle_table, participles)])
+        util.advance(len(stems))
 
-    session.commit()
-    session.close()
-    print 'Skipped', len(skipped), 'roots.'
+    util.tick('Skipped %d roots.' % len(skipped))
 
 
 def add_verbal(ctx):
     """Add all verb data to the database, including:
 
     - roots
-    - prefixed roots
-    - modified roots
-    - prefixed modified roots
     - inflected verbs
     - participles
     - gerunds
     - infinitives
-    """
-
-    util.heading('Verb prefixes')
-    prefixes = add_verb_prefixes(ctx)
-
-    util.heading('Verb endings')
-    add_verb_endings(ctx)
-
-    util.heading('Roots and paradigms')
-    roots = add_roots(ctx)
-
-    util.heading('Verbs')
-    add_verbs(ctx, roots)
 
-    util.heading('Participle stems')
-    add_participle_stems(ctx, roots)
-
-    util.heading('Verbal indeclinables')
-    add_verbal_indeclinables(ctx, roots)
-
-    return
-
-    util.heading('Prefixed roots')
-    add_prefixed_roots(ctx, root_map=roots, prefix_map=prefixes)
+    Prefixed and modified roots are not added yet.
+    """
+    run_stages(ctx, [s for s in STAGES if s.group == 'Verbal data'])
 
 
 # Nominal data
 # ------------
 
 def add_nominals(ctx):
-    util.heading('Nominal endings')
-    add_nominal_endings(ctx)
-
-    util.heading('Noun stems')
-    add_noun_stems(ctx)
-    util.heading('Irregular nouns')
-    add_irregular_nouns(ctx)
-
-    util.heading('Adjective stems')
-    add_adjective_stems(ctx)
-    util.heading('Irregular adjectives')
-    add_irregular_adjectives(ctx)
-
-    util.heading('Pronouns')
-    add_pronouns(ctx)
+    """Add all nominal data to the database, including endings, stems,
+    irregular forms, and pronouns.
+    """
+    run_stages(ctx, [s for s in STAGES if s.group == 'Nominal data'])
 
 
 def add_nominal_endings(ctx):
     """Add nominal endings to the database."""
     session = ctx.session
-    with open(ctx.config['NOMINAL_ENDINGS']) as f:
-        gender = ENUM['gender']
-        case = ENUM['case']
-        number = ENUM['number']
-
-        for group in yaml.load_all(f):
-            stem_type = group['stem']
-            for row in group['endings']:
-                kw = {
-                    'name': row['name'],
-                    'stem_type': stem_type,
-                    'gender_id': gender[row['gender']],
-                    'case_id': case.get(row.get('case')),
-                    'number_id': number.get(row.get('number')),
-                    'compounded': row.get('compounded', False)
-                    }
-                ending = NominalEnding(**kw)
-                session.add(ending)
-                session.flush()
-            util.tick(stem_type)
+    gender = ENUM['gender']
+    case = ENUM['case']
+    number = ENUM['number']
+
+    for group in load_yaml_all(ctx, 'NOMINAL_ENDINGS'):
+        stem_type = group['stem']
+        for row in group['endings']:
+            kw = {
+                'name': row['name'],
+                'stem_type': stem_type,
+                'gender_id': gender[row['gender']],
+                'case_id': case.get(row.get('case')),
+                'number_id': number.get(row.get('number')),
+                'compounded': row.get('compounded', False)
+                }
+            session.add(NominalEnding(**kw))
+        util.tick(stem_type)
+        util.advance(len(group['endings']))
 
     session.commit()
     session.close()
@@ -477,25 +657,16 @@ def add_noun_stems(ctx):
     gender_group = ENUM['gender_group']
     pos_id = Tag.NOUN
 
-    buf = []
-    i = 0
-    for noun in util.read_csv(ctx.config['NOUN_STEMS']):
-        name = noun['name']
-        genders_id = gender_group[noun['genders']]
-        buf.append({
+    batches = util.read_csv_batches(ctx.config['NOUN_STEMS'],
+                                    ['name', 'genders'], 500)
+    for batch in batches:
+        conn.execute(ins, [{
             'name': name,
             'pos_id': pos_id,
-            'genders_id': genders_id,
-            })
-
-        i += 1
-        if i % 500 == 0:
-            util.tick(name)
-            conn.execute(ins, buf)
-            buf = []
-
-    if buf:
-        conn.execute(ins, buf)
+            'genders_id': gender_group[genders],
+            } for name, genders in batch])
+        util.tick(batch[-1][0])
+        util.advance(len(batch))
 
 
 def add_irregular_nouns(ctx):
@@ -507,31 +678,33 @@ def add_irregular_nouns(ctx):
     case = ENUM['case']
     number = ENUM['number']
 
-    with open(ctx.config['IRREGULAR_NOUNS']) as f:
-        for noun in yaml.load_all(f):
-            genders_id = gender_group[noun['genders']]
-            stem = NounStem(name=noun['name'], genders_id=genders_id)
-            session.add(stem)
-            session.flush()
+    stem_ids = id_counter(session, Stem)
+    form_ids = id_counter(session, Form)
+
+    for noun in load_yaml_all(ctx, 'IRREGULAR_NOUNS'):
+        genders_id = gender_group[noun['genders']]
+        stem = NounStem(id=next(stem_ids), name=noun['name'],
+                        genders_id=genders_id)
+        session.add(stem)
 
-            # Mark the stem as irregular
-            complete = noun['complete']
-            irreg = StemIrregularity(stem=stem, fully_described=complete)
-            session.add(irreg)
-            session.flush()
+        # Mark the stem as irregular
+        complete = noun['complete']
+        irreg = StemIrregularity(id=stem.id, fully_described=complete)
+        session.add(irreg)
 
-            util.tick(stem.name)
+        util.tick(stem.name)
 
-            for form in noun['forms']:
-                name = form['name']
-                gender_id = gender[form['gender']]
-                case_id = case[form['case']]
-                number_id = number[form['number']]
+        util.advance(1 + len(noun['forms']))
+        for form in noun['forms']:
+            name = form['name']
+            gender_id = gender[form['gender']]
+            case_id = case[form['case']]
+            number_id = number[form['number']]
 
-                result = Noun(stem=stem, name=name, gender_id=gender_id,
-                              case_id=case_id, number_id=number_id)
-                session.add(result)
-                session.flush()
+            result = Noun(id=next(form_ids), stem_id=stem.id, name=name,
+                          gender_id=gender_id, case_id=case_id,
+                          number_id=number_id)
+            session.add(result)
 
     session.commit()
     session.close()
@@ -544,23 +717,15 @@ def add_adjective_stems(ctx):
     ins = AdjectiveStem.__table__.insert()
     pos_id = Tag.ADJECTIVE
 
-    buf = []
-    i = 0
-    for adj in util.read_csv(ctx.config['ADJECTIVE_STEMS']):
-        name = adj['name']
-        buf.append({
+    batches = util.read_csv_batches(ctx.config['ADJECTIVE_STEMS'],
+                                    ['name'], 500)
+    for batch in batches:
+        conn.execute(ins, [{
             'name': name,
             'pos_id': pos_id,
-            })
-
-        i += 1
-        if i % 500 == 0:
-            util.tick(name)
-            conn.execute(ins, buf)
-            buf = []
-
-    if buf:
-        conn.execute(ins, buf)
+            } for name, in batch])
+        util.tick(batch[-1][0])
+        util.advance(len(batch))
 
 
 def add_irregular_adjectives(ctx):
@@ -571,29 +736,31 @@ def add_irregular_adjectives(ctx):
     case = ENUM['case']
     number = ENUM['number']
 
-    with open(ctx.config['IRREGULAR_ADJECTIVES']) as f:
-        for adj in yaml.load_all(f):
-            stem = AdjectiveStem(name=adj['name'])
-            session.add(stem)
-            session.flush()
+    stem_ids = id_counter(session, Stem)
+    form_ids = id_counter(session, Form)
+
+    for adj in load_yaml_all(ctx, 'IRREGULAR_ADJECTIVES'):
+        stem = AdjectiveStem(id=next(stem_ids), name=adj['name'])
+        session.add(stem)
 
-            # Mark the stem as irregular
-            complete = adj['complete']
-            irreg = StemIrregularity(stem=stem, fully_described=complete)
-            session.add(irreg)
-            session.flush()
+        # Mark the stem as irregular
+        complete = adj['complete']
+        irreg = StemIrregularity(id=stem.id, fully_described=complete)
+        session.add(irreg)
 
-            util.tick(stem.name)
+        util.tick(stem.name)
 
-            for form in adj['forms']:
-                name = form['name']
-                gender_id = gender[form['gender']]
-                case_id = case[form['case']]
-                number_id = number[form['number']]
+        util.advance(1 + len(adj['forms']))
+        for form in adj['forms']:
+            name = form['name']
+            gender_id = gender[form['gender']]
+            case_id = case[form['case']]
+            number_id = number[form['number']]
 
-                result = Adjective(stem=stem, name=name, gender_id=gender_id,
-                                   case_id=case_id, number_id=number_id)
-                session.add(result)
+            result = Adjective(id=next(form_ids), stem_id=stem.id,
+                               name=name, gender_id=gender_id,
+                               case_id=case_id, number_id=number_id)
+            session.add(result)
 
     session.commit()
     session.close()
@@ -608,51 +775,674 @@ def add_pronouns(ctx):
     case = ENUM['case']
     number = ENUM['number']
 
-    with open(ctx.config['PRONOUNS']) as f:
-        for pronoun in yaml.load_all(f):
-            genders_id = gender_group[pronoun['genders']]
-            stem = PronounStem(name=pronoun['name'], genders_id=genders_id)
-            session.add(stem)
-            session.flush()
-            util.tick(stem.name)
-
-            for item in pronoun['forms']:
-                name = item['name']
-                gender_id = gender[item['gender']]
-                case_id = case[item['case']]
-                number_id = number[item['number']]
-
-                result = Pronoun(stem=stem, name=name, gender_id=gender_id,
-                                 case_id=case_id, number_id=number_id)
-                session.add(result)
-                session.flush()
+    stem_ids = id_counter(session, Stem)
+    form_ids = id_counter(session, Form)
+
+    for pronoun in load_yaml_all(ctx, 'PRONOUNS'):
+        genders_id = gender_group[pronoun['genders']]
+        stem = PronounStem(id=next(stem_ids), name=pronoun['name'],
+                           genders_id=genders_id)
+        session.add(stem)
+        util.tick(stem.name)
+
+        util.advance(1 + len(pronoun['forms']))
+        for item in pronoun['forms']:
+            name = item['name']
+            gender_id = gender[item['gender']]
+            case_id = case[item['case']]
+            number_id = number[item['number']]
+
+            result = Pronoun(id=next(form_ids), stem_id=stem.id,
+                             name=name, gender_id=gender_id,
+                             case_id=case_id, number_id=number_id)
+            session.add(result)
 
     session.commit()
     session.close()
 
 
+# Incremental builds
+# ------------------
+# Each stage can remove the rows it added, so that it can run again
+# without rebuilding the whole database.
+
+def delete_rows(conn, tables):
+    """Delete all rows from some tables, in order.
+
+    :param tables: :class:`~sqlalchemy.schema.Table` objects or mapped
+                   classes
+    """
+    for table in tables:
+        table = getattr(table, '__table__', table)
+        conn.execute(table.delete())
+
+
+def delete_forms(conn, pos_ids, child=None):
+    """Delete all forms with the given parts of speech.
+
+    :param pos_ids: a list of :class:`Tag` IDs
+    :param child: the subclass that holds the forms' other columns, if any
+    """
+    f = Form.__table__
+    if child is not None:
+        c = child.__table__
+        form_ids = select([f.c.id]).where(f.c.pos_id.in_(pos_ids))
+        conn.execute(c.delete().where(c.c.id.in_(form_ids)))
+    conn.execute(f.delete().where(f.c.pos_id.in_(pos_ids)))
+
+
+def delete_stems(conn, pos_id, irregular=None, child=None):
+    """Delete some stems along with their irregularities and forms.
+
+    :param pos_id: the stems' :class:`Tag` ID
+    :param irregular: if ``True``, delete only irregular stems. If
+                      ``False``, delete only regular stems.
+    :param child: the subclass that holds the stems' other columns, if any
+    """
+    s = Stem.__table__
+    f = Form.__table__
+    n = Nominal.__table__
+    irr = StemIrregularity.__table__
+
+    q = select([s.c.id]).where(s.c.pos_id == pos_id)
+    if irregular is not None:
+        irregular_ids = select([irr.c.id])
+        if irregular:
+            q = q.where(s.c.id.in_(irregular_ids))
+        else:
+            q = q.where(~s.c.id.in_(irregular_ids))
+
+    ids = [row[0] for row in conn.execute(q)]
+    for i in xrange(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        form_ids = select([n.c.id]).where(n.c.stem_id.in_(chunk))
+        conn.execute(f.delete().where(f.c.id.in_(form_ids)))
+        conn.execute(n.delete().where(n.c.stem_id.in_(chunk)))
+        conn.execute(irr.delete().where(irr.c.id.in_(chunk)))
+        if child is not None:
+            c = child.__table__
+            conn.execute(c.delete().where(c.c.id.in_(chunk)))
+        conn.execute(s.delete().where(s.c.id.in_(chunk)))
+
+
+def delete_generated_forms(conn):
+    """Delete the rows added by :func:`add_generated_forms`."""
+    t = FormIndex.__table__
+    conn.execute(t.delete().where(~t.c.id.in_(select([Form.__table__.c.id]))))
+    t = BuildInfo.__table__
+    conn.execute(t.delete().where(t.c.key.in_(['generated_forms',
+                                               'generated_forms_start'])))
+
+
+def delete_prefixes(conn, pos_id):
+    """Delete all prefixes with the given :class:`Tag` ID."""
+    t = Prefix.__table__
+    conn.execute(t.delete().where(t.c.pos_id == pos_id))
+
+
+def stored_checksums(ctx):
+    """Return the source checksums recorded by the last build, as a
+    :class:`dict` that maps a config key to a checksum. Return ``None`` if
+    no build has recorded any.
+    """
+    t = BuildInfo.__table__
+    q = select([t.c.key, t.c.value]).where(t.c.key.like('checksum:%'))
+    try:
+        rows = ctx.engine.execute(q).fetchall()
+    except exc.DBAPIError:
+        return None
+    if not rows:
+        return None
+    return dict((key.split(':', 1)[1], value) for key, value in rows)
+
+
+def stored_stages(ctx):
+    """Return the names of the stages run by the last build."""
+    t = BuildInfo.__table__
+    q = select([t.c.value]).where(t.c.key == 'stages')
+    return set(json.loads(ctx.engine.execute(q).scalar() or '[]'))
+
+
+def source_checksums(ctx, stages):
+    """Return the current checksum of every file read by `stages`."""
+    keys = set(key for stage in stages for key in stage.files)
+    return dict((key, util.checksum(ctx.config[key])) for key in keys)
+
+
+def stale_stages(stages, checksums, stored, built=()):
+    """Return the stages that must run again, in order: stages that weren't
+    built before, stages with changed source files, and every stage that
+    requires one of these.
+
+    :param stages: a list of :class:`Stage`
+    :param checksums: the current source checksums
+    :param stored: the source checksums from the last build
+    :param built: the names of the stages in the last build
+    """
+    stale = []
+    stale_names = set()
+    for stage in order_stages(stages):
+        changed = (stage.name not in built or
+                   any(checksums[k] != stored.get(k) for k in stage.files) or
+                   stage.requires & stale_names)
+        if changed:
+            stale.append(stage)
+            stale_names.add(stage.name)
+    return stale
+
+
+# Generated forms
+# ---------------
+
+class BuildLookups(object):
+
+    """The lookup data that a :class:`~sanskrit.generate.NominalGenerator`
+    reads, loaded from the database that's being built. Unlike a
+    :class:`~sanskrit.Context`, this never reads a lexicon, which is out of
+    date until the build ends. It can also be sent to worker processes.
+
+    :param bind: an engine or connection
+    """
+
+    def __init__(self, bind):
+        enums = Enums.from_database(bind)
+        self.enum_id = enums.enum_id
+        self.enum_abbr = enums.enum_abbr
+        self.gender_set = enums.gender_set
+
+        t = NominalEnding.__table__
+        q = select([t.c.name, t.c.stem_type, t.c.gender_id, t.c.case_id,
+                    t.c.number_id, t.c.compounded]).order_by(t.c.id)
+        self.nominal_endings = tuple(tuple(row) for row in bind.execute(q))
+
+
+# The generator used by :func:`generate_forms` in this process.
+_generator = None
+
+
+def _init_generator(lookups):
+    global _generator
+    _generator = NominalGenerator(lookups)
+
+
+def generate_forms(stems):
+    """Return the regular forms of some stems. Call this only after
+    :func:`_init_generator`, which worker processes do on startup.
+
+    :param stems: a list of ``(stem_id, name, gender_ids, stored)``
+                  tuples. `stored` is a set of ``(gender_id, case_id,
+                  number_id)`` cells that the database already has.
+    :returns: a pair ``(forms, skipped)``. `forms` is a list of
+              ``(stem_id, name, gender_id, case_id, number_id)`` tuples,
+              and `skipped` is the number of paradigms with no endings.
+    """
+    enum_id = _generator.ctx.enum_id
+    enum_abbr = _generator.ctx.enum_abbr
+    cells = [(enum_id['case'][case], enum_id['number'][number])
+             for case, number in CELLS]
+
+    by_gender = {}
+    for stem_id, stem_name, gender_ids, stored in stems:
+        for gender_id in gender_ids:
+            by_gender.setdefault(gender_id, []).append((stem_id, stem_name,
+                                                        stored))
+
+    forms = []
+    skipped = 0
+    for gender_id, group in sorted(by_gender.iteritems()):
+        gender = enum_abbr['gender'][gender_id]
+        rows = _generator.paradigms([name for _, name, _ in group], gender)
+        for (stem_id, _, stored), row in zip(group, rows):
+            if row is None:
+                # The stem has no known stem type, or its stem type has
+                # no endings for this gender.
+                skipped += 1
+                continue
+            for (case_id, number_id), name in zip(cells, row):
+                cell = (gender_id, case_id, number_id)
+                if cell not in stored:
+                    forms.append((stem_id, name) + cell)
+    return forms, skipped
+
+
+def add_generated_forms(ctx):
+    """Add the regular forms of all noun, adjective, and participle stems
+    to the :class:`~sanskrit.schema.FormIndex` table. Fully described
+    irregular stems are skipped, and forms that the database already has
+    are not generated again. The generated rows have no
+    :class:`~sanskrit.schema.Form` row of their own.
+
+    Paradigms are generated in ``BUILD_PROCESSES`` worker processes.
+    """
+    s = Stem.__table__
+    n = Nominal.__table__
+    ps = ParticipleStem.__table__
+    irr = StemIrregularity.__table__
+    t = FormIndex.__table__
+
+    lookups = BuildLookups(ctx.engine)
+    all_genders = sorted(set(lookups.enum_id['gender'].values()))
+
+    # Cells already stored for partly described irregular stems
+    stored = {}
+    q = select([n.c.stem_id, n.c.gender_id, n.c.case_id, n.c.number_id])\
+        .select_from(n.join(irr, irr.c.id == n.c.stem_id))\
+        .where(irr.c.fully_described != True)
+    for stem_id, gender_id, case_id, number_id in ctx.engine.execute(q):
+        stored.setdefault(stem_id, set()).add((gender_id, case_id,
+                                               number_id))
+
+    pos_ids = [Tag.NOUN, Tag.ADJECTIVE, Tag.PARTICIPLE]
+    q = select([s.c.id, s.c.name, s.c.pos_id, s.c.genders_id, ps.c.root_id,
+                ps.c.mode_id, ps.c.voice_id])\
+        .select_from(s.outerjoin(ps, ps.c.id == s.c.id)
+                      .outerjoin(irr, irr.c.id == s.c.id))\
+        .where(s.c.pos_id.in_(pos_ids))\
+        .where(func.coalesce(irr.c.fully_described, False) != True)\
+        .order_by(s.c.id)
+
+    stems = {}
+    items = []
+    for id, name, pos_id, genders_id, root_id, mode_id, voice_id \
+            in ctx.engine.execute(q):
+        if pos_id == Tag.NOUN:
+            gender_ids = sorted(lookups.gender_set.get(genders_id, ()))
+        else:
+            gender_ids = all_genders
+        stems[id] = (pos_id, root_id, mode_id, voice_id)
+        items.append((id, name, gender_ids, stored.get(id, set())))
+    chunks = [items[i:i + 500] for i in xrange(0, len(items), 500)]
+
+    processes = ctx.config.get('BUILD_PROCESSES') or \
+        multiprocessing.cpu_count()
+    pool = None
+    if processes > 1 and len(chunks) > 1:
+        pool = multiprocessing.Pool(min(processes, len(chunks)),
+                                    _init_generator, (lookups,))
+        results = pool.imap(generate_forms, chunks)
+    else:
+        _init_generator(lookups)
+        results = itertools.imap(generate_forms, chunks)
+
+    count = skipped = 0
+    try:
+        with ctx.engine.begin() as conn:
+            id = start = max(next_id(conn, Form.__table__), next_id(conn, t))
+            rows = []
+            for forms, chunk_skipped in results:
+                skipped += chunk_skipped
+                for stem_id, name, gender_id, case_id, number_id in forms:
+                    pos_id, root_id, mode_id, voice_id = stems[stem_id]
+                    rows.append({
+                        'id': id,
+                        'name': name,
+                        'pos_id': pos_id,
+                        'stem_id': stem_id,
+                        'root_id': root_id,
+                        'gender_id': gender_id,
+                        'case_id': case_id,
+                        'number_id': number_id,
+                        'person_id': None,
+                        'mode_id': mode_id,
+                        'voice_id': voice_id,
+                        'compounded': None,
+                        })
+                    id += 1
+                if len(rows) >= BATCH_SIZE:
+                    insert_many(conn, [(t, rows)])
+                    util.tick(rows[-1]['name'])
+                    util.advance(len(rows))
+                    count += len(rows)
+                    rows = []
+            insert_many(conn, [(t, rows)])
+            util.advance(len(rows))
+            count += len(rows)
+
+            # Every stored form has a smaller ID than `start`, so the
+            # analyzer can tell generated rows apart.
+            conn.execute(BuildInfo.__table__.insert(), [
+                {'key': 'generated_forms', 'value': str(count)},
+                {'key': 'generated_forms_start', 'value': str(start)},
+                ])
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    util.tick('Skipped %d paradigms.' % skipped)
+
+
 # Main
 # ----
 
-def run(ctx):
-    """Create and populate tables in the database."""
-    ctx.drop_all()
-    ctx.create_all()
-
-    functions = [
-        ('Tags', add_tags),
-        ('Enumerated data', add_enums),
-        ('Sandhi', add_sandhi),
-        ('Indeclinables', add_indeclinables),
-        ('Verbal data', add_verbal),
-        ('Nominal data', add_nominals),
-        ]
+def add_form_index(ctx):
+    """Copy all forms into the flat :class:`~sanskrit.schema.FormIndex`
+    table with a single ``INSERT ... SELECT``.
+    """
+    t = FormIndex.__table__
+    ins = t.insert().from_select(list(FormIndex.COLUMNS), form_index_select())
+    result = ctx.engine.execute(ins)
+    util.advance(max(result.rowcount, 0))
+    util.tick(t.name)
+
+
+class Stage(object):
+
+    """A step in the database build.
+
+    :param name: the stage name
+    :param function: the function to call. It's called as
+                     ``function(ctx, **inputs)``.
+    :param requires: the names of stages that must finish first
+    :param inputs: maps a keyword argument of `function` to the name of
+                   the stage whose return value it receives. These stages
+                   must finish first too.
+    :param files: the config keys of the data files that `function`
+                  reads. If one of these files changes, the stage runs
+                  again. YAML files are parsed ahead of time in worker
+                  processes.
+    :param group: the name of the top-level stage this belongs to, if any
+    :param clear: a function that takes a connection and deletes the rows
+                  this stage adds. This is needed for incremental builds.
+    :param restore: a function that takes a context and returns what
+                    `function` would return, for use when the stage is
+                    skipped in an incremental build
+    """
 
-    for name, f in functions:
-        util.heading(name, '~')
-        f(ctx)
+    def __init__(self, name, function, requires=(), inputs=None, files=(),
+                 group=None, clear=None, restore=None):
+        self.name = name
+        self.function = function
+        self.inputs = inputs or {}
+        self.requires = set(requires) | set(self.inputs.values())
+        self.files = tuple(files)
+        self.group = group
+        self.clear = clear
+        self.restore = restore
+
+    def __repr__(self):
+        return 'Stage(%r)' % self.name
+
+
+#: All build stages, in their default order.
+STAGES = [
+    Stage('Tags', add_tags,
+          clear=functools.partial(delete_rows, tables=[Tag])),
+    Stage('Enumerated data', add_enums, files=['ENUMS'],
+          clear=functools.partial(delete_rows,
+                                  tables=[GenderGroupAssociation] +
+                                  EnumBase.__subclasses__()),
+          restore=restore_enums),
+    Stage('Sandhi', add_sandhi, ['Enumerated data'], files=['SANDHI'],
+          clear=functools.partial(delete_rows, tables=[SandhiRule])),
+    Stage('Indeclinables', add_indeclinables, ['Tags'],
+          files=['INDECLINABLES'],
+          clear=functools.partial(delete_forms,
+                                  pos_ids=[Tag.INDECLINABLE])),
+
+    Stage('Verb prefixes', add_verb_prefixes, ['Tags'],
+          files=['VERB_PREFIXES'], group='Verbal data',
+          clear=functools.partial(delete_prefixes,
+                                  pos_id=Tag.VERB_PREFIX)),
+    Stage('Verb endings', add_verb_endings, ['Enumerated data'],
+          files=['VERB_ENDINGS'], group='Verbal data',
+          clear=functools.partial(delete_rows, tables=[VerbEnding])),
+    Stage('Roots and paradigms', add_roots, ['Enumerated data'],
+          files=['ROOTS'], group='Verbal data',
+          clear=functools.partial(delete_rows, tables=[Paradigm, Root]),
+          restore=restore_root_map),
+    Stage('Verbs', add_verbs, ['Tags'],
+          inputs={'root_map': 'Roots and paradigms'}, files=['VERBS'],
+          group='Verbal data',
+          clear=functools.partial(delete_forms, pos_ids=[Tag.VERB],
+                                  child=Verb)),
+    Stage('Participle stems', add_participle_stems, ['Tags'],
+          inputs={'root_map': 'Roots and paradigms'},
+          files=['PARTICIPLE_STEMS'], group='Verbal data',
+          clear=functools.partial(delete_stems, pos_id=Tag.PARTICIPLE,
+                                  child=ParticipleStem)),
+    Stage('Verbal indeclinables', add_verbal_indeclinables, ['Tags'],
+          inputs={'root_map': 'Roots and paradigms'},
+          files=['GERUNDS', 'INFINITIVES'], group='Verbal data',
+          clear=functools.partial(delete_forms, child=VerbalIndeclinable,
+                                  pos_ids=[Tag.VERBAL_INDECLINABLE,
+                                           Tag.GERUND, Tag.INFINITIVE,
+                                           Tag.PERFECT_INDECLINABLE])),
+
+    Stage('Nominal endings', add_nominal_endings, ['Enumerated data'],
+          files=['NOMINAL_ENDINGS'], group='Nominal data',
+          clear=functools.partial(delete_rows, tables=[NominalEnding])),
+    Stage('Noun stems', add_noun_stems, ['Tags', 'Enumerated data'],
+          files=['NOUN_STEMS'], group='Nominal data',
+          clear=functools.partial(delete_stems, pos_id=Tag.NOUN,
+                                  irregular=False)),
+    Stage('Irregular nouns', add_irregular_nouns, ['Noun stems'],
+          files=['IRREGULAR_NOUNS'], group='Nominal data',
+          clear=functools.partial(delete_stems, pos_id=Tag.NOUN,
+                                  irregular=True)),
+    Stage('Adjective stems', add_adjective_stems, ['Tags'],
+          files=['ADJECTIVE_STEMS'], group='Nominal data',
+          clear=functools.partial(delete_stems, pos_id=Tag.ADJECTIVE,
+                                  irregular=False)),
+    Stage('Irregular adjectives', add_irregular_adjectives,
+          ['Adjective stems', 'Enumerated data'],
+          files=['IRREGULAR_ADJECTIVES'], group='Nominal data',
+          clear=functools.partial(delete_stems, pos_id=Tag.ADJECTIVE,
+                                  irregular=True)),
+    Stage('Pronouns', add_pronouns, ['Tags', 'Enumerated data'],
+          files=['PRONOUNS'], group='Nominal data',
+          clear=functools.partial(delete_stems, pos_id=Tag.PRONOUN)),
+
+    Stage('Form index', add_form_index,
+          ['Indeclinables', 'Verbs', 'Verbal indeclinables',
+           'Irregular nouns', 'Irregular adjectives', 'Pronouns'],
+          clear=functools.partial(delete_rows, tables=[FormIndex])),
+    Stage('Generated forms', add_generated_forms,
+          ['Form index', 'Nominal endings', 'Noun stems', 'Irregular nouns',
+           'Adjective stems', 'Irregular adjectives', 'Participle stems'],
+          clear=delete_generated_forms),
+    ]
+
+
+def order_stages(stages):
+    """Return `stages` in an order that satisfies their requirements.
+    Stages keep their given order wherever they can. Requirements on
+    stages that aren't in `stages` are assumed to be met already.
+
+    :raises ValueError: if the stages have a cycle
+    """
+    names = set(s.name for s in stages)
+    done = set()
+    ordered = []
+    pending = list(stages)
+    while pending:
+        for stage in pending:
+            if all(r in done or r not in names for r in stage.requires):
+                break
+        else:
+            raise ValueError('Cyclic stage requirements: %r' % pending)
+        pending.remove(stage)
+        ordered.append(stage)
+        done.add(stage.name)
+    return ordered
+
+
+def run_stages(ctx, stages, processes=None, results=None):
+    """Run some build stages and return a :class:`dict` that maps each
+    stage name to its function's return value.
+
+    All YAML files that the stages read are first handed to a pool of
+    `processes` worker processes for parsing. All database writes still
+    happen in the calling process, one stage at a time, so a stage
+    usually finds its files already parsed by the time it starts.
+
+    :param stages: a list of :class:`Stage`
+    :param processes: the number of parsing processes. By default, this is
+                      ``BUILD_PROCESSES`` from the config, or the number of
+                      CPUs. If this is 1, files are parsed as they're read.
+    :param results: the return values of stages that ran earlier, for
+                    stages that need them as inputs
+    """
+    stages = order_stages(stages)
+    if processes is None:
+        processes = ctx.config.get('BUILD_PROCESSES') or \
+            multiprocessing.cpu_count()
+
+    paths = []
+    for stage in stages:
+        for key in stage.files:
+            path = ctx.config[key]
+            is_yaml = path.endswith(('.yml', '.yaml'))
+            if is_yaml and path not in paths and path not in _documents:
+                paths.append(path)
+
+    pool = None
+    if processes > 1 and len(paths) > 1:
+        cache_dir = ctx.config.get('YAML_CACHE_DIR')
+        pool = multiprocessing.Pool(min(processes, len(paths)))
+        for path in paths:
+            _documents[path] = pool.apply_async(parse_yaml,
+                                                (path, cache_dir))
+
+    results = dict(results or {})
+    group = None
+    try:
+        for stage in stages:
+            if stage.group is None:
+                util.heading(stage.name, '~')
+            else:
+                if stage.group != group:
+                    util.heading(stage.group, '~')
+                util.heading(stage.name)
+            group = stage.group
+
+            kw = dict((arg, results[name])
+                      for arg, name in stage.inputs.iteritems())
+            results[stage.name] = stage.function(ctx, **kw)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        for path in paths:
+            _documents.pop(path, None)
+    return results
+
+
+def write_lexicon(ctx, path):
+    """Write a :class:`~sanskrit.lexicon.Lexicon` of the database."""
+    util.heading('Lexicon', '~')
+    lexicon.write(ctx.engine, path)
+    util.tick(path)
+
+
+def run(ctx, force=False):
+    """Create and populate tables in the database. The build runs the
+    stages in :data:`STAGES`. See :func:`run_stages` for details.
+
+    Each build records a checksum of every data file it reads. If the
+    database already has these checksums, only the stages whose files
+    changed are run again, along with every stage that depends on them.
+    Other data is left as-is.
+
+    Progress is reported through the reporter named by ``PROGRESS`` in the
+    context's config (see :mod:`sanskrit.util.progress`). By default,
+    progress is printed to stdout.
+
+    Unless ``FORM_INDEX`` is ``False``, all forms are also copied to the
+    :class:`~sanskrit.schema.FormIndex` table. If ``GENERATED_FORMS`` is
+    also ``True``, the regular forms of all nominal stems are generated and
+    added to that table too (see :func:`add_generated_forms`). This makes
+    the database much larger, but words can then be analyzed with a single
+    lookup. If ``LEXICON`` is set, a :mod:`~sanskrit.lexicon` of the
+    database is written to that path.
+
+    Stages that were built before but are now turned off have their rows
+    removed.
+
+    :param force: if ``True``, drop all tables and rebuild everything
+    :returns: the reporter. The reporter that was current before the
+              build is restored afterward.
+    """
+    previous = util.get_reporter()
+    reporter = util.set_reporter(ctx.config.get('PROGRESS', 'print'))
+    try:
+        _run(ctx, reporter, force)
+    finally:
+        util.set_reporter(previous)
+    return reporter
+
+
+def _run(ctx, reporter, force):
+    """Run the build described in :func:`run`."""
+    ctx.clear_cache()
+
+    stages = STAGES
+    if not ctx.config.get('FORM_INDEX', True):
+        stages = [s for s in stages if s.name != 'Form index']
+    if not ctx.config.get('GENERATED_FORMS') or 'Form index' not in \
+            set(s.name for s in stages):
+        stages = [s for s in stages if s.name != 'Generated forms']
+
+    checksums = source_checksums(ctx, stages)
+    stored = None if force else stored_checksums(ctx)
+    results = {}
+    if stored is None:
+        ctx.drop_all()
+        ctx.create_all()
+        stale = stages
+    else:
+        built = stored_stages(ctx)
+        stale = stale_stages(stages, checksums, stored, built)
+        removed = [s for s in STAGES if s.name in built and s not in stages]
+        if not stale and not removed:
+            util.heading('Up to date', '~')
+            path = ctx.config.get('LEXICON')
+            if path and not os.path.exists(path):
+                write_lexicon(ctx, path)
+            reporter.finish()
+            return
+
+        ctx.create_all()
+        with ctx.engine.begin() as conn:
+            for stage in reversed(order_stages(stale + removed)):
+                if stage.clear is not None:
+                    stage.clear(conn)
+
+        stale_names = set(s.name for s in stale)
+        for stage in stages:
+            if stage.name not in stale_names and stage.restore is not None:
+                results[stage.name] = stage.restore(ctx)
+
+    run_stages(ctx, stale, results=results)
+
+    # Record what was built, and mark the data as new so that caches drop
+    # their old results.
+    info = [('checksum:%s' % k, v) for k, v in checksums.iteritems()]
+    info.append(('stages', json.dumps(sorted(s.name for s in stages))))
+    info.append(('data_version', uuid.uuid4().hex))
+    for key, value in info:
+        ctx.session.merge(BuildInfo(key=key, value=value))
+    ctx.session.commit()
+    ctx.session.close()
+
+    path = ctx.config.get('LEXICON')
+    if path:
+        write_lexicon(ctx, path)
+
+    ctx.clear_cache()
+    ctx.enums = enums = Enums.from_database(ctx.engine)
+    path = ctx.config.get('ENUM_SNAPSHOT')
+    if path:
+        enums.dump(path, ctx.data_version)
+
+    reporter.finish()
 
 
 if __name__ == '__main__':
-    ctx = Context(sys.argv[1])
-    run(ctx)
+    args = sys.argv[1:]
+    force = '--force' in args
+    args = [a for a in args if a != '--force']
+    if len(args) != 1:
+        print 'Usage: python -m sanskrit.setup CONFIG [--force]'
+        sys.exit(1)
+    run(Context(args[0]), force=force)
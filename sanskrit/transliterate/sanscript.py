@@ -49,6 +49,8 @@ These variables are documented below.
 
 from __future__ import unicode_literals
 
+from ..util import timed
+
 # Brahmic schemes
 # ---------------
 #: Internal name of Bengali. Bengali ``ba`` and ``va`` are both rendered
@@ -302,6 +304,7 @@ def _brahmic(data, scheme_map, **kw):
     return ''.join(buf)
 
 
+@timed('sanscript.transliterate')
 def transliterate(data, _from=None, _to=None, scheme_map=None, **kw):
     """Transliterate `data` with the given parameters::
 
@@ -1,3 +1,6 @@
-from trie import HashTrie
+from trie import HashTrie, Trie
 from queue import PriorityQueue
+from timing import profiler, timed
+from progress import advance, get_reporter, set_reporter
+from cache import Cache, DictBackend, LRUCache
 from functions import *
@@ -0,0 +1,207 @@
+"""
+sanskrit.util.cache
+~~~~~~~~~~~~~~~~~~~
+
+Caches for expensive results, such as full paradigms.
+
+A :class:`Cache` has two layers: a small :class:`LRUCache` in the current
+process, and an optional shared backend that many processes can use. Any
+object with the methods of :class:`DictBackend` can be a shared backend,
+so a memcached or Redis client needs only a thin wrapper.
+
+Every key is prefixed with a data version. When the data changes, the
+version changes too, and old entries are never read again.
+
+:license: MIT and BSD
+"""
+
+import collections
+import threading
+import time
+
+
+class LRUCache(object):
+
+    """A thread-safe least-recently-used cache.
+
+    :param maxsize: the maximum number of entries
+    :param ttl: if set, the number of seconds an entry stays valid
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self.data.pop(key)
+            except KeyError:
+                return default
+            if expires is not None and expires < time.time():
+                return default
+            self.data[key] = (value, expires)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl or self.ttl
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self.data.pop(key, None)
+            self.data[key] = (value, expires)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.data.clear()
+
+
+class DictBackend(object):
+
+    """A shared backend that lives in the current process. This is mainly
+    useful for tests and as a template for real backends, which should
+    provide the same three methods. Keys are strings.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        """Return the value for `key`, or ``None`` if there is none."""
+        value = self.data.get(key)
+        if value is None:
+            return None
+        value, expires = value
+        if expires is not None and expires < time.time():
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Store `value` for `key`, optionally for only `ttl` seconds."""
+        expires = time.time() + ttl if ttl else None
+        self.data[key] = (value, expires)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class Cache(object):
+
+    """A two-layer cache with versioned keys.
+
+    :param local: the in-process :class:`LRUCache`. By default, this
+                  holds 1024 entries with no expiry.
+    :param shared: an optional shared backend, such as a
+                   :class:`DictBackend`
+    :param version: a function that returns the current data version
+    :param check_interval: the number of seconds between calls to
+                           `version`. Results from before a rebuild can be
+                           served for up to this long. Use 0 to check on
+                           every lookup.
+    :param ttl: the number of seconds an entry stays valid in the shared
+                backend
+    """
+
+    def __init__(self, local=None, shared=None, version=None,
+                 check_interval=30, ttl=None):
+        self.local = local if local is not None else LRUCache()
+        self.shared = shared
+        self.version_func = version
+        self.check_interval = check_interval
+        self.ttl = ttl
+
+        self._version = None
+        self._checked = 0
+        # Guards the version check and the counters below, since a cache
+        # can be shared by many threads.
+        self._lock = threading.Lock()
+        self.hits = self.local_hits = self.shared_hits = self.misses = 0
+
+    @property
+    def version(self):
+        """The current data version. If it has changed since the last
+        check, the local layer is cleared.
+        """
+        if self.version_func is None:
+            return None
+        # The version is read without holding the lock, since it might
+        # take a database query.
+        now = time.time()
+        with self._lock:
+            due = now - self._checked >= self.check_interval
+            if due:
+                self._checked = now
+        if due:
+            version = self.version_func()
+            with self._lock:
+                if version != self._version:
+                    self.local.clear()
+                    self._version = version
+        return self._version
+
+    def _shared_key(self, key):
+        return 'sanskrit:%s:%s' % (self.version, ':'.join(map(unicode, key)))
+
+    def get(self, key):
+        """Return the value for `key`, or ``None`` on a miss.
+
+        :param key: a tuple of strings
+        """
+        full_key = (self.version,) + tuple(key)
+        value = self.local.get(full_key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+                self.local_hits += 1
+            return value
+
+        if self.shared is not None:
+            value = self.shared.get(self._shared_key(key))
+            if value is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.shared_hits += 1
+                self.local.set(full_key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        """Store `value` for `key` in both layers.
+
+        :param key: a tuple of strings
+        """
+        self.local.set((self.version,) + tuple(key), value)
+        if self.shared is not None:
+            self.shared.set(self._shared_key(key), value, self.ttl)
+
+    def clear(self):
+        """Clear the local layer and check the version on the next lookup.
+        Shared entries expire on their own once the version changes.
+        """
+        with self._lock:
+            self._checked = 0
+        self.local.clear()
+
+    def stats(self):
+        """Return hit and miss counts as a :class:`dict`."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            local_hits, shared_hits = self.local_hits, self.shared_hits
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'local_hits': local_hits,
+            'shared_hits': shared_hits,
+            'misses': misses,
+            'hit_rate': float(hits) / lookups if lookups else 0.0,
+            'size': len(self.local),
+            }
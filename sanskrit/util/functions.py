@@ -8,6 +8,42 @@ Various helper functions.
 """
 
 import csv
+import functools
+import hashlib
+import itertools
+import operator
+
+from . import progress
+
+
+def releases_session(f):
+    """Decorator for methods of objects with a `session` attribute. It
+    closes the current thread's session after `f` returns, so that its
+    connection goes back to the pool. Objects without a database have no
+    session to close.
+    """
+    @functools.wraps(f)
+    def wrapper(self, *args, **kw):
+        try:
+            return f(self, *args, **kw)
+        finally:
+            session = self.session
+            if session is not None:
+                session.close()
+    return wrapper
+
+
+def checksum(filename, size=1 << 16):
+    """Return the SHA-1 digest of a file's contents as a hex string.
+
+    :param filename: the name of the file
+    :param size: the number of bytes to read at a time
+    """
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(size), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
 
 def read_csv(filename):
@@ -21,16 +57,76 @@ def read_csv(filename):
             yield row
 
 
+def read_csv_rows(filename, columns):
+    """Read the given columns from a CSV file and yield each row as a
+    :class:`tuple`, in the same order as `columns`::
+
+        for name, root in read_csv_rows('verbs.csv', ['name', 'root']):
+            pass
+
+    This is much cheaper than :func:`read_csv` for large files, since it
+    creates no :class:`dict` per row. As with :func:`read_csv`, blank
+    lines are skipped and missing fields are ``None``.
+
+    :param filename: the name of the file
+    :param columns: the names of the columns to read
+    """
+    with open(filename, 'r') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        try:
+            indices = [header.index(c) for c in columns]
+        except ValueError:
+            missing = [c for c in columns if c not in header]
+            raise KeyError('%s has no column %r' % (filename, missing[0]))
+
+        # Like :class:`csv.DictReader`, skip blank lines and fill missing
+        # fields with ``None``.
+        width = len(header)
+        padding = [None] * width
+        if len(indices) == 1:
+            i = indices[0]
+            getter = lambda row: (row[i],)
+        else:
+            getter = operator.itemgetter(*indices)
+        for row in reader:
+            if not row:
+                continue
+            if len(row) < width:
+                row += padding[len(row):]
+            yield getter(row)
+
+
+def read_csv_batches(filename, columns, size=1000):
+    """Like :func:`read_csv_rows`, but yield rows in lists of at most
+    `size` rows. Only one batch is held in memory at a time.
+
+    :param filename: the name of the file
+    :param columns: the names of the columns to read
+    :param size: the maximum number of rows per batch
+    """
+    rows = read_csv_rows(filename, columns)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
 def heading(s, char='-'):
-    """Print `s` as a heading. This is used to update the user during a
-    long-running function."""
-    print
-    print s
-    print char * len(s)
+    """Start a new stage called `s`. This is used to update the user during
+    a long-running function. By default, the stage is printed as a heading.
+
+    :param s: the stage name
+    :param char: ``'~'`` for a top-level stage and ``'-'`` for a substage
+    """
+    level = 0 if char == '~' else 1
+    progress.get_reporter().start(s, level)
 
 
 def tick(s):
-    """Print `s` as a list item. This is used to update the user during a
-    long-running function.
+    """Note `s` as an item of interest. This is used to update the user
+    during a long-running function. By default, `s` is printed as a list
+    item.
     """
-    print ' -', s
+    progress.get_reporter().note(s)
@@ -0,0 +1,299 @@
+"""
+sanskrit.util.progress
+~~~~~~~~~~~~~~~~~~~~~~
+
+Progress reporting for long-running functions, such as building the
+database.
+
+Long-running code reports what it's doing through three functions:
+
+- :func:`~sanskrit.util.functions.heading`, which starts a new stage
+- :func:`~sanskrit.util.functions.tick`, which notes an item of interest
+- :func:`advance`, which counts the rows processed in the current stage
+
+These calls are passed to the current :class:`Reporter`, which decides
+what to do with them. To change the reporter, use :func:`set_reporter` or
+set ``PROGRESS`` in your config to one of the names in :data:`REPORTERS`.
+
+:license: MIT and BSD
+"""
+
+import json
+import logging
+import sys
+import time
+
+
+class Stage(object):
+
+    """A named stage of some long-running function.
+
+    :param name: the stage name
+    :param level: the nesting level. Top-level stages have level 0.
+    :param total: the number of rows expected, if known
+    """
+
+    def __init__(self, name, level=0, total=None):
+        self.name = name
+        self.level = level
+        self.total = total
+        #: The number of rows processed so far.
+        self.rows = 0
+        self.started = time.time()
+        self.ended = None
+
+    @property
+    def elapsed(self):
+        """The time spent in this stage, in seconds."""
+        return (self.ended or time.time()) - self.started
+
+    @property
+    def rate(self):
+        """The number of rows processed per second."""
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed else 0.0
+
+    @property
+    def eta(self):
+        """The estimated number of seconds left, or ``None`` if the
+        total is unknown."""
+        rate = self.rate
+        if self.total is None or not rate:
+            return None
+        return max(self.total - self.rows, 0) / rate
+
+    def as_dict(self):
+        return {
+            'stage': self.name,
+            'level': self.level,
+            'rows': self.rows,
+            'seconds': self.elapsed,
+            'rows_per_second': self.rate,
+            }
+
+
+class Reporter(object):
+
+    """Base class for progress reporters. A plain :class:`Reporter`
+    records stage timings but writes nothing.
+    """
+
+    def __init__(self):
+        #: All stages seen so far, in the order they started.
+        self.stages = []
+        self.open = []
+
+    def start(self, name, level=0, total=None):
+        """Start a new stage. This ends any open stages at the same level
+        or deeper.
+
+        :param name: the stage name
+        :param level: the nesting level
+        :param total: the number of rows expected, if known
+        """
+        while self.open and self.open[-1].level >= level:
+            self.end()
+        stage = Stage(name, level, total)
+        self.stages.append(stage)
+        self.open.append(stage)
+        self.on_start(stage)
+
+    def end(self):
+        """End the innermost open stage."""
+        stage = self.open.pop()
+        stage.ended = time.time()
+        if self.open:
+            self.open[-1].rows += stage.rows
+        self.on_end(stage)
+
+    def finish(self):
+        """End all open stages."""
+        while self.open:
+            self.end()
+        self.on_finish()
+
+    def advance(self, rows=1):
+        """Count `rows` more rows in the current stage."""
+        if self.open:
+            stage = self.open[-1]
+            stage.rows += rows
+            self.on_advance(stage)
+
+    def note(self, s):
+        """Note some item of interest."""
+        self.on_note(s)
+
+    def summary(self):
+        """Return a list of :class:`dict`, one per stage."""
+        return [s.as_dict() for s in self.stages]
+
+    def on_start(self, stage):
+        pass
+
+    def on_end(self, stage):
+        pass
+
+    def on_finish(self):
+        pass
+
+    def on_advance(self, stage):
+        pass
+
+    def on_note(self, s):
+        pass
+
+
+class PrintReporter(Reporter):
+
+    """Prints headings and items to stdout, then a table of stage timings
+    when finished.
+    """
+
+    chars = '~-'
+
+    def on_start(self, stage):
+        char = self.chars[min(stage.level, len(self.chars) - 1)]
+        print
+        print stage.name
+        print char * len(stage.name)
+
+    def on_note(self, s):
+        print ' -', s
+
+    def on_finish(self):
+        print
+        print '%-30s %10s %10s %12s' % ('Stage', 'Seconds', 'Rows', 'Rows/s')
+        for stage in self.stages:
+            name = '  ' * stage.level + stage.name
+            print '%-30s %10.2f %10d %12.1f' % (name[:30], stage.elapsed,
+                                                stage.rows, stage.rate)
+
+
+class LogReporter(Reporter):
+
+    """Writes stage events to a :mod:`logging` logger.
+
+    :param logger: the logger to use. By default, this is the
+                   ``'sanskrit'`` logger.
+    """
+
+    def __init__(self, logger=None):
+        Reporter.__init__(self)
+        self.logger = logger or logging.getLogger('sanskrit')
+
+    def on_start(self, stage):
+        self.logger.info('Starting %s', stage.name)
+
+    def on_end(self, stage):
+        self.logger.info('Finished %s: %d rows in %.2fs (%.1f rows/s)',
+                         stage.name, stage.rows, stage.elapsed, stage.rate)
+
+    def on_note(self, s):
+        self.logger.debug('%s', s)
+
+
+class BarReporter(Reporter):
+
+    """Draws a single status line with the row count, rate, and (if the
+    total is known) the estimated time left.
+
+    :param stream: the stream to write to. By default, this is stderr.
+    :param interval: the minimum number of seconds between redraws
+    """
+
+    width = 30
+
+    def __init__(self, stream=None, interval=0.1):
+        Reporter.__init__(self)
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self.drawn = 0
+
+    def draw(self, stage, done=False):
+        if stage.total:
+            filled = int(self.width * min(stage.rows, stage.total)
+                         / stage.total)
+            bar = '[%s%s] ' % ('=' * filled, ' ' * (self.width - filled))
+        else:
+            bar = ''
+
+        line = '%s%s: %d rows, %.1f rows/s, %.1fs' % (
+            bar, stage.name, stage.rows, stage.rate, stage.elapsed)
+        eta = stage.eta
+        if eta is not None and not done:
+            line += ', ETA %.0fs' % eta
+
+        self.stream.write('\r\033[K' + line + ('\n' if done else ''))
+        self.stream.flush()
+        self.drawn = time.time()
+
+    def on_advance(self, stage):
+        if time.time() - self.drawn >= self.interval:
+            self.draw(stage)
+
+    def on_end(self, stage):
+        self.draw(stage, done=True)
+
+
+class JSONReporter(Reporter):
+
+    """Writes one JSON object per event, one object per line.
+
+    :param stream: the stream to write to. By default, this is stdout.
+    """
+
+    def __init__(self, stream=None):
+        Reporter.__init__(self)
+        self.stream = stream or sys.stdout
+
+    def emit(self, event, **data):
+        data['event'] = event
+        data['time'] = time.time()
+        self.stream.write(json.dumps(data, sort_keys=True) + '\n')
+        self.stream.flush()
+
+    def on_start(self, stage):
+        self.emit('start', stage=stage.name, level=stage.level)
+
+    def on_end(self, stage):
+        self.emit('end', **stage.as_dict())
+
+    def on_note(self, s):
+        self.emit('note', message=s)
+
+    def on_finish(self):
+        self.emit('finish', stages=self.summary())
+
+
+#: Maps a name to a :class:`Reporter` class.
+REPORTERS = {
+    'silent': Reporter,
+    'print': PrintReporter,
+    'log': LogReporter,
+    'bar': BarReporter,
+    'json': JSONReporter,
+    }
+
+_reporter = PrintReporter()
+
+
+def get_reporter():
+    """Return the current :class:`Reporter`."""
+    return _reporter
+
+
+def set_reporter(reporter):
+    """Set the current :class:`Reporter`.
+
+    :param reporter: a :class:`Reporter`, or a key in :data:`REPORTERS`.
+    """
+    global _reporter
+    if isinstance(reporter, basestring):
+        reporter = REPORTERS[reporter]()
+    _reporter = reporter
+    return reporter
+
+
+def advance(rows=1):
+    """Count `rows` more rows in the current stage."""
+    _reporter.advance(rows)
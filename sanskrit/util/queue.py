@@ -1,38 +1,146 @@
 import heapq
+import itertools
+
+# Marks an entry that was popped, removed, or replaced.
+_REMOVED = object()
+
 
 class PriorityQueue(object):
 
-    """A priority queue. Lower values are popped first."""
+    """A priority queue. Lower values are popped first. Items with equal
+    priorities are popped in the order they were pushed, so items never
+    have to be comparable. But since the queue indexes its items, they
+    must be hashable, and each item appears in the queue at most once.
+
+    :param capacity: if set, the maximum number of items to keep. When
+                     the queue grows past this size, the items with the
+                     highest values are dropped.
+    """
 
-    def  __init__(self):
+    def __init__(self, capacity=None):
+        self.capacity = capacity
         self.heap = []
 
+        # Maps an item to its heap entry. An entry is a list
+        # ``[priority, count, item]``, where `count` breaks ties.
+        self.index = {}
+        self.counter = itertools.count()
+
+        # Max-heap of ``(-priority, -count, entry)``, used only to drop
+        # the worst items when the queue has a capacity.
+        self.worst = []
+
     def __copy__(self):
-        p = PriorityQueue()
-        p.heap = list(self.heap)
+        p = PriorityQueue(self.capacity)
+        p.counter = itertools.count(next(self.counter))
+        for priority, count, item in self._entries():
+            entry = [priority, count, item]
+            p.heap.append(entry)
+            p.index[item] = entry
+            if p.capacity is not None:
+                p.worst.append((-priority, -count, entry))
+        heapq.heapify(p.heap)
+        heapq.heapify(p.worst)
+        return p
+
+    copy = __copy__
 
     def __str__(self):
-        return str([(item, priority) for priority, item in self.heap])
+        return str(list(self))
 
     def __len__(self):
-        return len(self.heap)
+        return len(self.index)
+
+    def __contains__(self, item):
+        return item in self.index
 
     def __iter__(self):
-        for priority, item in self.heap:
+        for priority, count, item in self._entries():
             yield (item, priority)
 
+    def _entries(self):
+        return (e for e in self.heap if e[-1] is not _REMOVED)
+
+    def _add(self, item, priority):
+        """Index a new entry and return it without touching the heap."""
+        old = self.index.pop(item, None)
+        if old is not None:
+            old[-1] = _REMOVED
+
+        entry = [priority, next(self.counter), item]
+        self.index[item] = entry
+        if self.capacity is not None:
+            heapq.heappush(self.worst, (-priority, -entry[1], entry))
+        return entry
+
+    def _trim(self):
+        """Drop the worst items until the queue fits its capacity."""
+        if self.capacity is None:
+            return
+        while len(self.index) > self.capacity:
+            entry = heapq.heappop(self.worst)[-1]
+            item = entry[-1]
+            if item is not _REMOVED:
+                del self.index[item]
+                entry[-1] = _REMOVED
+        self._compact()
+
+    def _compact(self):
+        """Rebuild the heaps if most of their entries are dead."""
+        limit = 2 * len(self.index) + 32
+        if len(self.heap) > limit:
+            self.heap = list(self._entries())
+            heapq.heapify(self.heap)
+        if len(self.worst) > limit:
+            self.worst = [x for x in self.worst if x[-1][-1] is not _REMOVED]
+            heapq.heapify(self.worst)
+
     def push(self, item, priority=0):
-        """Add an item to the queue.
+        """Add an item to the queue. If the item is already in the queue,
+        replace its priority.
 
         :param item: the item to add
         :param priority: the priority to use
         """
-        pair = (priority,item)
-        heapq.heappush(self.heap,pair)
+        entry = self._add(item, priority)
+        heapq.heappush(self.heap, entry)
+        self._trim()
+
+    def pushmany(self, pairs):
+        """Add several items to the queue at once. This is faster than
+        calling :meth:`push` for each item.
+
+        :param pairs: an iterable of ``(item, priority)`` tuples
+        """
+        for item, priority in pairs:
+            self.heap.append(self._add(item, priority))
+        heapq.heapify(self.heap)
+        self._trim()
+
+    def update(self, item, priority):
+        """Change the priority of an item in the queue. If the item is not
+        in the queue, throw a :exc:`KeyError`.
+
+        :param item: the item to update
+        :param priority: the new priority
+        """
+        if item not in self.index:
+            raise KeyError(item)
+        self.push(item, priority)
+
+    def remove(self, item):
+        """Remove an item from the queue. If the item is not in the queue,
+        throw a :exc:`KeyError`.
+
+        :param item: the item to remove
+        """
+        entry = self.index.pop(item)
+        entry[-1] = _REMOVED
+        self._compact()
 
     def pop(self):
-        """Pop the highest-priority item from the queue."""        
-        return heapq.heappop(self.heap)[-1]
+        """Pop the highest-priority item from the queue."""
+        return self.pop_with_priority()[0]
 
     def pop_with_priority(self):
         """Pop the highest-priority item and its priority from the queue::
@@ -41,8 +149,16 @@ class PriorityQueue(object):
 
         ::
         """
-        (priority, item) = heapq.heappop(self.heap)
-        return (item, priority)
+        heap = self.heap
+        while heap:
+            priority, count, item = entry = heapq.heappop(heap)
+            if item is not _REMOVED:
+                del self.index[item]
+                entry[-1] = _REMOVED
+                if self.worst:
+                    self._compact()
+                return (item, priority)
+        raise IndexError('pop from empty queue')
 
     def peek(self):
         """Read the highest-priority item and its priority without removing
@@ -53,5 +169,8 @@ class PriorityQueue(object):
 
         If the queue is empty, throw an :exc:`IndexError`.
         """
-        priority, item = self.heap[0]
+        heap = self.heap
+        while heap[0][-1] is _REMOVED:
+            heapq.heappop(heap)
+        priority, count, item = heap[0]
         return (item, priority)
@@ -0,0 +1,246 @@
+"""
+sanskrit.util.timing
+~~~~~~~~~~~~~~~~~~~~
+
+Opt-in timing instrumentation for the package's public entry points.
+
+Instrumentation is off by default. To turn it on, set ``PROFILE`` in your
+config::
+
+    ctx = Context({'DATABASE_URI': ..., 'DATA_PATH': ..., 'PROFILE': True})
+
+Then read the results from the global :data:`profiler`::
+
+    from sanskrit.util import profiler
+    print profiler.as_dict()
+    print profiler.prometheus()
+
+:license: MIT and BSD
+"""
+
+import collections
+import functools
+import inspect
+import threading
+import time
+
+
+class Stat(object):
+
+    """Timing data for a single entry point.
+
+    :param max_samples: the number of recent durations to keep for
+                        computing percentiles.
+    """
+
+    def __init__(self, max_samples=10000):
+        #: The number of completed calls.
+        self.calls = 0
+        #: The total time spent in all calls, in seconds.
+        self.seconds = 0.0
+        #: The number of database queries issued during all calls.
+        self.queries = 0
+        #: The most recent call durations, in seconds.
+        self.samples = collections.deque(maxlen=max_samples)
+
+    def add(self, seconds):
+        self.calls += 1
+        self.seconds += seconds
+        self.samples.append(seconds)
+
+    def percentile(self, p):
+        """Return the `p`-th percentile of the recent call durations.
+
+        :param p: a number between 0 and 100
+        """
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        i = int(round((p / 100.0) * (len(ordered) - 1)))
+        return ordered[i]
+
+
+class Profiler(object):
+
+    """Records call counts, latencies, and query counts for named entry
+    points. A :class:`Profiler` does nothing until :meth:`enable` is
+    called.
+    """
+
+    def __init__(self):
+        #: ``True`` iff calls are being recorded.
+        self.enabled = False
+        #: Maps an entry point name to its :class:`Stat`.
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """Discard all recorded data."""
+        with self._lock:
+            self.stats = {}
+
+    def _active(self):
+        """Return the names of the timers running on this thread."""
+        try:
+            return self._local.active
+        except AttributeError:
+            self._local.active = active = []
+            return active
+
+    def _stat(self, name):
+        try:
+            return self.stats[name]
+        except KeyError:
+            with self._lock:
+                return self.stats.setdefault(name, Stat())
+
+    def start(self, name):
+        self._active().append(name)
+        return time.time()
+
+    def stop(self, name, started):
+        elapsed = time.time() - started
+
+        # Timed generators can be suspended while other timers run, so
+        # remove the most recent timer with this name instead of popping.
+        active = self._active()
+        for i in xrange(len(active) - 1, -1, -1):
+            if active[i] == name:
+                del active[i]
+                break
+
+        stat = self._stat(name)
+        with self._lock:
+            stat.add(elapsed)
+
+    def timer(self, name):
+        """Return a context manager that times its block under `name`::
+
+            with profiler.timer('my_function'):
+                my_function()
+        """
+        return _Timer(self, name)
+
+    def count_query(self, *args):
+        """Count a database query against every running timer. This has
+        the signature of a SQLAlchemy ``before_cursor_execute`` listener.
+        """
+        if not self.enabled:
+            return
+        for name in set(self._active()):
+            stat = self._stat(name)
+            with self._lock:
+                stat.queries += 1
+
+    def watch(self, engine):
+        """Count the queries issued through `engine`.
+
+        :param engine: a :class:`~sqlalchemy.engine.base.Engine`
+        """
+        from sqlalchemy import event
+        event.listen(engine, 'before_cursor_execute', self.count_query)
+
+    def as_dict(self):
+        """Return all recorded data as a :class:`dict` that maps each
+        entry point name to its own :class:`dict` of values.
+        """
+        returned = {}
+        with self._lock:
+            for name, stat in self.stats.iteritems():
+                returned[name] = {
+                    'calls': stat.calls,
+                    'seconds': stat.seconds,
+                    'p99': stat.percentile(99),
+                    'queries': stat.queries,
+                    }
+        return returned
+
+    def prometheus(self, prefix='sanskrit'):
+        """Return all recorded data in the Prometheus text format.
+
+        :param prefix: the prefix to use for each metric name
+        """
+        data = sorted(self.as_dict().items())
+        metrics = [
+            ('calls_total', 'counter', 'calls'),
+            ('seconds_total', 'counter', 'seconds'),
+            ('seconds_p99', 'gauge', 'p99'),
+            ('queries_total', 'counter', 'queries'),
+            ]
+
+        lines = []
+        for suffix, kind, key in metrics:
+            metric = '%s_%s' % (prefix, suffix)
+            lines.append('# TYPE %s %s' % (metric, kind))
+            for name, values in data:
+                lines.append('%s{name="%s"} %r' % (metric, name, values[key]))
+        return '\n'.join(lines) + '\n'
+
+
+class _Timer(object):
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        if self.profiler.enabled:
+            self.started = self.profiler.start(self.name)
+        else:
+            self.started = None
+        return self
+
+    def __exit__(self, *exc):
+        if self.started is not None:
+            self.profiler.stop(self.name, self.started)
+
+
+#: The global :class:`Profiler`. This is enabled by a :class:`~sanskrit.Context`
+#: whose config sets ``PROFILE``.
+profiler = Profiler()
+
+
+def timed(name):
+    """Decorator that records calls to a function under `name`. If the
+    function is a generator, the time spent consuming it is recorded too.
+
+    When :data:`profiler` is disabled, the decorated function is called
+    directly, so the only cost is one attribute lookup.
+
+    :param name: the name to record calls under
+    """
+    def decorator(f):
+        if inspect.isgeneratorfunction(f):
+            @functools.wraps(f)
+            def wrapper(*args, **kw):
+                if not profiler.enabled:
+                    return f(*args, **kw)
+                return _timed_iter(name, f(*args, **kw))
+        else:
+            @functools.wraps(f)
+            def wrapper(*args, **kw):
+                if not profiler.enabled:
+                    return f(*args, **kw)
+                started = profiler.start(name)
+                try:
+                    return f(*args, **kw)
+                finally:
+                    profiler.stop(name, started)
+        return wrapper
+    return decorator
+
+
+def _timed_iter(name, it):
+    started = profiler.start(name)
+    try:
+        for item in it:
+            yield item
+    finally:
+        profiler.stop(name, started)
@@ -1,18 +1,84 @@
-import collections
+class Trie(object):
 
-class HashTrie(object):
+    """A prefix tree that maps each key to a set of values. Lookups find
+    the values for every stored key that is a prefix of the query::
+
+        t = Trie()
+        t['a'] = 1
+        t['ab'] = 2
+        assert t['abc'] == set([1, 2])
+
+    Each node is a plain :class:`dict` from a character to a child node.
+    A node's values are stored in the same :class:`dict` under ``None``.
+    Reads never modify the tree.
+    """
 
-    """A fast trie, for short items."""
-    
     def __init__(self):
-        self.mapper = collections.defaultdict(set)
-        self.len_longest = 0
-        self.lengths = range(1, self.len_longest + 1)
+        self.root = {}
 
     def __getitem__(self, key):
-        return set.union(*[self.mapper[key[:i]] for i in self.lengths])
+        returned = set()
+        for prefix, values in self.iter_prefixes(key):
+            returned.update(values)
+        return returned
 
     def __setitem__(self, key, value):
-        self.mapper[key].add(value)
-        self.len_longest = max(len(key), self.len_longest)
-        self.lengths = range(1, self.len_longest + 1)
+        node = self.root
+        for char in key:
+            try:
+                node = node[char]
+            except KeyError:
+                node[char] = node = {}
+        try:
+            node[None].add(value)
+        except KeyError:
+            node[None] = set([value])
+
+    def __contains__(self, key):
+        node = self.root
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                return False
+        return None in node
+
+    def iter_prefixes(self, key):
+        """Yield a 2-tuple ``(prefix, values)`` for each stored prefix of
+        `key`, from shortest to longest. `values` is the set stored in the
+        tree and should not be modified. The empty prefix is never
+        yielded, even if it's stored.
+
+        :param key: the key to search with
+        """
+        node = self.root
+        for i, char in enumerate(key):
+            node = node.get(char)
+            if node is None:
+                return
+            values = node.get(None)
+            if values:
+                yield (key[:i + 1], values)
+
+    def all_prefixes(self, key):
+        """Return a list of the ``(prefix, values)`` tuples yielded by
+        :meth:`iter_prefixes`.
+
+        :param key: the key to search with
+        """
+        return list(self.iter_prefixes(key))
+
+    def longest_match(self, key, default=None):
+        """Return ``(prefix, values)`` for the longest stored prefix of
+        `key`. If no prefix is stored, return `default`.
+
+        :param key: the key to search with
+        :param default: the value to return if nothing matches
+        """
+        returned = default
+        for item in self.iter_prefixes(key):
+            returned = item
+        return returned
+
+
+#: Alias kept for older code.
+HashTrie = Trie
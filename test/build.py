@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+test.build
+~~~~~~~~~~
+
+Tests the stage scheduler in :mod:`sanskrit.setup`.
+
+:license: MIT and BSD
+"""
+
+import os
+import shutil
+import tempfile
+
+from sqlalchemy import select
+
+from sanskrit import Context
+from sanskrit import setup as S  # ``as S`` avoids problems with nose
+from sanskrit.analyze import Nominal, SimpleAnalyzer
+from sanskrit.schema import FormIndex, Tag
+from sanskrit.util import get_reporter, set_reporter
+
+from . import TestCase, config as cfg
+
+
+def names(stages):
+    return [s.name for s in stages]
+
+
+class StageTestCase(TestCase):
+
+    def setUp(self):
+        self.reporter = set_reporter('silent')
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        set_reporter('print')
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def test_order(self):
+        """Test that stages keep their order unless a requirement moves
+        them."""
+        noop = lambda ctx: None
+        stages = [S.Stage('c', noop, ['b']),
+                  S.Stage('a', noop),
+                  S.Stage('b', noop, ['a', 'elsewhere']),
+                  S.Stage('d', noop)]
+        self.assertEqual(names(S.order_stages(stages)), ['a', 'b', 'c', 'd'])
+
+        cyclic = [S.Stage('a', noop, ['b']), S.Stage('b', noop, ['a'])]
+        self.assertRaises(ValueError, S.order_stages, cyclic)
+
+    def test_default_stages(self):
+        """Test that every requirement of the default build exists."""
+        all_names = set(names(S.STAGES))
+        for stage in S.STAGES:
+            self.assertTrue(stage.requires <= all_names, stage)
+        self.assertEqual(len(S.order_stages(S.STAGES)), len(S.STAGES))
+
+    def run_stages(self, processes):
+        ctx = Context({'DATABASE_URI': cfg.DATABASE_URI,
+                       'DATA_PATH': cfg.DATA_PATH,
+                       'NUMBERS': self.write('numbers.yml', '1\n---\n2\n'),
+                       'LETTERS': self.write('letters.yml', '[a, b]\n')},
+                      connect=False)
+
+        def total(ctx):
+            return sum(S.load_yaml_all(ctx, 'NUMBERS'))
+
+        def letters(ctx, total=None):
+            return S.load_yaml(ctx, 'LETTERS') * total
+
+        stages = [S.Stage('letters', letters, inputs={'total': 'total'},
+                          files=['LETTERS']),
+                  S.Stage('total', total, files=['NUMBERS'])]
+        results = S.run_stages(ctx, stages, processes=processes)
+
+        self.assertEqual(results['total'], 3)
+        self.assertEqual(results['letters'], ['a', 'b'] * 3)
+        self.assertEqual(S._documents, {})
+        self.assertEqual(names(self.reporter.stages), ['total', 'letters'])
+
+    def test_run_stages(self):
+        """Test running stages with files parsed in the calling process."""
+        self.run_stages(1)
+
+    def test_run_stages_pool(self):
+        """Test running stages with files parsed by worker processes."""
+        self.run_stages(2)
+
+
+class IncrementalBuildTestCase(TestCase):
+
+    def setUp(self):
+        self.reporter = set_reporter('silent')
+        self.dir = tempfile.mkdtemp()
+        self.pronouns = os.path.join(self.dir, 'pronouns.yml')
+        shutil.copy(os.path.join(cfg.DATA_PATH, 'lang', 'pronouns.yml'),
+                    self.pronouns)
+        uri = 'sqlite:///' + os.path.join(self.dir, 'test.db')
+        self.ctx = Context({'DATABASE_URI': uri, 'DATA_PATH': cfg.DATA_PATH,
+                            'PRONOUNS': self.pronouns, 'BUILD_PROCESSES': 1,
+                            'PROGRESS': 'silent'})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        set_reporter('print')
+
+    def build(self, **kw):
+        reporter = S.run(self.ctx, **kw)
+        all_names = set(names(S.STAGES))
+        return [s.name for s in reporter.stages if s.name in all_names]
+
+    def test_restores_reporter(self):
+        """Test that the caller's reporter is current after a build."""
+        reporter = S.run(self.ctx)
+        self.assertIsNot(reporter, self.reporter)
+        self.assertIs(get_reporter(), self.reporter)
+
+    def count_forms(self):
+        return self.ctx.engine.execute('SELECT COUNT(*) FROM form').scalar()
+
+    def test_rebuild(self):
+        """Test that only stages with changed files run again."""
+        default = [s for s in S.STAGES if s.name != 'Generated forms']
+        self.assertEqual(self.build(), names(S.order_stages(default)))
+        forms = self.count_forms()
+        version = self.ctx.data_version
+
+        self.assertEqual(self.build(), [])
+        self.assertEqual(self.ctx.data_version, version)
+
+        with open(self.pronouns, 'a') as f:
+            f.write('\n# edited\n')
+        self.assertEqual(self.build(), ['Pronouns', 'Form index'])
+        self.assertEqual(self.count_forms(), forms)
+        self.assertNotEqual(self.ctx.data_version, version)
+
+        self.assertEqual(len(self.build(force=True)), len(default))
+        self.assertEqual(self.count_forms(), forms)
+
+    def test_downstream(self):
+        """Test that a changed file reruns every stage that depends on it."""
+        stored = dict((k, 'x') for s in S.STAGES for k in s.files)
+        built = names(S.STAGES)
+        checksums = dict(stored, ROOTS='y')
+        stale = S.stale_stages(S.STAGES, checksums, stored, built)
+        self.assertEqual(names(stale),
+                         ['Roots and paradigms', 'Verbs', 'Participle stems',
+                          'Verbal indeclinables', 'Form index',
+                          'Generated forms'])
+
+        stale = S.stale_stages(S.STAGES, stored, stored,
+                               [n for n in built if n != 'Form index'])
+        self.assertEqual(names(stale), ['Form index', 'Generated forms'])
+
+
+class YAMLTestCase(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.dir, 'cache')
+        self.path = os.path.join(self.dir, 'data.yml')
+        with open(self.path, 'w') as f:
+            f.write('name: a\n---\nname: b\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_stream(self):
+        """Test that documents are parsed lazily without a cache."""
+        ctx = Context({'DATA_PATH': cfg.DATA_PATH, 'DATA': self.path},
+                      connect=False)
+        documents = S.load_yaml_all(ctx, 'DATA')
+        self.assertFalse(isinstance(documents, list))
+        self.assertEqual(list(documents), [{'name': 'a'}, {'name': 'b'}])
+        self.assertEqual(S.load_yaml(ctx, 'DATA'), {'name': 'a'})
+
+    def test_cache(self):
+        """Test that cached documents are reused until the file changes."""
+        expected = [{'name': 'a'}, {'name': 'b'}]
+        self.assertEqual(S.parse_yaml(self.path, self.cache_dir), expected)
+        cache_path = S.yaml_cache_path(self.path, self.cache_dir)
+        self.assertTrue(os.path.exists(cache_path))
+
+        # Fake a cache entry to show that it's read instead of the file.
+        S.write_yaml_cache(self.path, self.cache_dir, os.stat(self.path),
+                           ['cached'])
+        self.assertEqual(S.parse_yaml(self.path, self.cache_dir), ['cached'])
+
+        stat = os.stat(self.path)
+        os.utime(self.path, (stat.st_atime, stat.st_mtime + 10))
+        self.assertEqual(S.parse_yaml(self.path, self.cache_dir), expected)
+
+        with open(cache_path, 'wb') as f:
+            f.write('garbage')
+        self.assertEqual(S.read_yaml_cache(self.path, self.cache_dir), None)
+
+
+class GeneratedFormsTestCase(TestCase):
+
+    def setUp(self):
+        self.reporter = set_reporter('silent')
+        self.dir = tempfile.mkdtemp()
+        uri = 'sqlite:///' + os.path.join(self.dir, 'test.db')
+        self.config = {'DATABASE_URI': uri, 'DATA_PATH': cfg.DATA_PATH,
+                       'PROGRESS': 'silent', 'GENERATED_FORMS': True}
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        set_reporter('print')
+
+    def forms(self, ctx, name):
+        t = FormIndex.__table__
+        q = select([t.c.pos_id, t.c.gender_id, t.c.case_id, t.c.number_id])\
+            .where(t.c.name == name)
+        return ctx.engine.execute(q).fetchall()
+
+    def test_generated_forms(self):
+        """Test adding regular nominal forms to the form index."""
+        ctx = Context(self.config)
+        S.run(ctx)
+        self.assertTrue(ctx.has_generated_forms)
+
+        enum_id = ctx.enum_id
+        expected = (Tag.NOUN, enum_id['gender']['m'], enum_id['case']['4'],
+                    enum_id['number']['s'])
+        self.assertEqual(self.forms(ctx, 'gajAya'), [expected])
+        self.assertEqual(len(self.forms(ctx, 'sundarAya')), 2)
+
+        # Stored irregular forms aren't duplicated.
+        self.assertEqual(len(self.forms(ctx, 'pumAn')), 1)
+
+        # Generated forms are found without reconstructing stems.
+        words = SimpleAnalyzer(ctx).analyze('gajAya')
+        self.assertEqual([(w.pos_id, w.case_id) for w in words],
+                         [(Tag.NOUN, enum_id['case']['4'])])
+
+        # Turning the option off removes them again.
+        ctx = Context(dict(self.config, GENERATED_FORMS=False))
+        S.run(ctx)
+        self.assertFalse(ctx.has_generated_forms)
+        self.assertEqual(self.forms(ctx, 'gajAya'), [])
+        self.assertEqual(len(self.forms(ctx, 'pumAn')), 1)
+
+    def analyses(self, ctx, word):
+        returned = []
+        for w in SimpleAnalyzer(ctx).analyze(word):
+            if isinstance(w, Nominal):
+                w = w._replace(stem=w.stem.name)
+            returned.append((type(w).__name__,) + tuple(w))
+        return sorted(returned)
+
+    def test_analyze(self):
+        """Test that generated forms don't change analyses."""
+        ctx = Context(self.config)
+        S.run(ctx)
+        plain = Context(dict(self.config, GENERATED_FORMS=False,
+                             DATABASE_URI='sqlite://'))
+        S.run(plain)
+        for word in ['gaja', 'gajAya', 'sundarAya', 'pumAn']:
+            self.assertEqual(self.analyses(ctx, word),
+                             self.analyses(plain, word))
+        self.assertTrue(any(a[-1] for a in self.analyses(ctx, 'gaja')))
+
+    def test_pool(self):
+        """Test generating forms in worker processes."""
+        ctx = Context(dict(self.config, BUILD_PROCESSES=2))
+        S.run(ctx)
+        single = Context(dict(self.config, BUILD_PROCESSES=1,
+                              DATABASE_URI='sqlite://'))
+        S.run(single)
+        t = FormIndex.__table__
+        q = select([t.c.name, t.c.stem_id, t.c.gender_id, t.c.case_id,
+                    t.c.number_id]).order_by(t.c.id)
+        self.assertEqual(ctx.engine.execute(q).fetchall(),
+                         single.engine.execute(q).fetchall())
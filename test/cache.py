@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+test.cache
+~~~~~~~~~~
+
+Tests the caches in :mod:`sanskrit.util.cache`.
+
+:license: MIT and BSD
+"""
+
+import threading
+import time
+
+from sanskrit.util import Cache, DictBackend, LRUCache
+from . import TestCase
+
+
+class LRUCacheTestCase(TestCase):
+
+    def test_eviction(self):
+        """Test that the least recently used entry is dropped first."""
+        c = LRUCache(2)
+        c.set('a', 1)
+        c.set('b', 2)
+        self.assertEqual(c.get('a'), 1)
+        c.set('c', 3)
+        self.assertEqual(c.get('b'), None)
+        self.assertEqual(c.get('a'), 1)
+        self.assertEqual(c.get('c'), 3)
+        self.assertEqual(len(c), 2)
+
+    def test_ttl(self):
+        """Test that entries expire after their time to live."""
+        c = LRUCache(ttl=60)
+        c.set('a', 1)
+        c.set('b', 2, ttl=-1)
+        self.assertEqual(c.get('a'), 1)
+        self.assertEqual(c.get('b', 'missing'), 'missing')
+
+
+class CacheTestCase(TestCase):
+
+    def setUp(self):
+        self.version = 'v1'
+        self.shared = DictBackend()
+        self.cache = Cache(LRUCache(10), self.shared,
+                           version=lambda: self.version, check_interval=0)
+
+    def test_layers(self):
+        """Test that shared entries fill the local layer."""
+        self.cache.set(('noun', 'deva', 'm'), {'x': 1})
+        self.cache.local.clear()
+        self.assertEqual(self.cache.get(('noun', 'deva', 'm')), {'x': 1})
+        self.assertEqual(self.cache.get(('noun', 'deva', 'm')), {'x': 1})
+        self.assertEqual(self.cache.get(('noun', 'vana', 'n')), None)
+
+        stats = self.cache.stats()
+        self.assertEqual(stats['shared_hits'], 1)
+        self.assertEqual(stats['local_hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertAlmostEqual(stats['hit_rate'], 2 / 3.0)
+
+    def test_version(self):
+        """Test that a new data version hides old entries."""
+        self.cache.set(('noun', 'deva', 'm'), {'x': 1})
+        self.version = 'v2'
+        self.assertEqual(self.cache.get(('noun', 'deva', 'm')), None)
+        self.assertEqual(len(self.cache.local), 0)
+
+    def test_check_interval(self):
+        """Test that the version is checked at most once per interval."""
+        calls = []
+
+        def version():
+            calls.append(time.time())
+            return 'v1'
+
+        cache = Cache(version=version, check_interval=60)
+        cache.get(('a',))
+        cache.get(('b',))
+        self.assertEqual(len(calls), 1)
+        cache.clear()
+        cache.get(('c',))
+        self.assertEqual(len(calls), 2)
+
+    def test_version_unlocked(self):
+        """Test that the version is read without holding the cache lock."""
+        locked = []
+
+        def version():
+            acquired = cache._lock.acquire(False)
+            if acquired:
+                cache._lock.release()
+            locked.append(not acquired)
+            return 'v1'
+
+        cache = Cache(version=version, check_interval=0)
+        cache.get(('a',))
+        self.assertEqual(locked, [False])
+
+    def test_threads(self):
+        """Test that counters are exact when many threads share a cache."""
+        cache = Cache(version=lambda: 'v1', check_interval=0)
+        cache.set(('a',), 1)
+
+        def lookup():
+            for i in range(500):
+                cache.get(('a',))
+                cache.get(('b',))
+
+        threads = [threading.Thread(target=lookup) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 2000)
+        self.assertEqual(stats['misses'], 2000)
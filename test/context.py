@@ -45,3 +45,62 @@ class ContextTestCase(TestCase):
                       MONIER_XML_PATH='foo')
         ctx = Context(config)
         self.assertEqual(ctx.config['MONIER_XML_PATH'], 'foo')
+
+    def testEngineOptions(self):
+        """Test applying SQLite pragmas and recording pool activity."""
+        config = dict(DATABASE_URI=cfg.DATABASE_URI, DATA_PATH=cfg.DATA_PATH,
+                      SQLITE_CACHE_SIZE=-4000, SQLITE_SYNCHRONOUS='OFF',
+                      STATEMENT_CACHE_SIZE=50)
+        ctx = Context(config)
+        conn = ctx.engine.connect()
+        self.assertEqual(conn.execute('PRAGMA cache_size').scalar(), -4000)
+        self.assertEqual(conn.execute('PRAGMA synchronous').scalar(), 0)
+        conn.close()
+
+        stats = ctx.pool_stats.as_dict()
+        self.assertEqual(stats['checkouts'], 1)
+        self.assertEqual(stats['checkins'], 1)
+        self.assertEqual(stats['checked_out'], 0)
+
+    def testPoolStatsAfterDispose(self):
+        """Test that waits are still timed after the pool is replaced."""
+        config = dict(DATABASE_URI=cfg.DATABASE_URI, DATA_PATH=cfg.DATA_PATH)
+        ctx = Context(config)
+        ctx.engine.dispose()
+        ctx.engine.connect().close()
+
+        stats = ctx.pool_stats.as_dict()
+        self.assertEqual(stats['checkouts'], 1)
+        self.assertTrue(stats['wait_seconds'] > 0)
+
+    def testReadOnly(self):
+        """Test preloading data and reconnecting after a fork."""
+        import tempfile
+        from sanskrit import setup as S
+
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        uri = 'sqlite:///' + path
+        try:
+            ctx = Context(dict(DATABASE_URI=uri, DATA_PATH=cfg.DATA_PATH))
+            ctx.create_all()
+            S.add_enums(ctx)
+
+            config = dict(DATABASE_URI=uri, DATA_PATH=cfg.DATA_PATH,
+                          READ_ONLY=True)
+            ctx = Context(config)
+            self.assertIn('m', ctx.enum_id['gender'])
+            self.assertEqual(ctx.irregular_stems, frozenset())
+            self.assertRaises(Exception, ctx.engine.execute,
+                              "INSERT INTO tag (id, name) VALUES (1, 'x')")
+
+            parent_engine = ctx.engine
+            pid = os.fork()
+            if pid == 0:
+                ok = (ctx.engine is not parent_engine and
+                      ctx.engine.execute('SELECT 1').scalar() == 1)
+                os._exit(0 if ok else 1)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(status, 0)
+        finally:
+            os.remove(path)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+test.functions
+~~~~~~~~~~~~~~
+
+Tests the helper functions in :mod:`sanskrit.util.functions`.
+
+:license: MIT and BSD
+"""
+
+import os
+import tempfile
+
+from sanskrit import util
+from . import TestCase
+
+
+class CSVTestCase(TestCase):
+
+    """Tests reading CSV files."""
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w') as f:
+            f.write('name,root,hom\n')
+            for i in range(7):
+                f.write('name%d,root%d,\n' % (i, i))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_rows(self):
+        """Test reading selected columns as tuples."""
+        rows = list(util.read_csv_rows(self.path, ['hom', 'name']))
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[2], ('', 'name2'))
+
+        rows = list(util.read_csv_rows(self.path, ['root']))
+        self.assertEqual(rows[0], ('root0',))
+        self.assertRaises(KeyError, list,
+                          util.read_csv_rows(self.path, ['foo']))
+
+    def test_rows_blank_and_short(self):
+        """Test that blank lines are skipped and short rows are padded."""
+        with open(self.path, 'a') as f:
+            f.write('\nname7\n\n')
+        rows = list(util.read_csv_rows(self.path, ['name', 'root']))
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(rows[-1], ('name7', None))
+
+        rows = list(util.read_csv_rows(self.path, ['hom']))
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(rows[-1], (None,))
+
+    def test_batches(self):
+        """Test reading rows in batches."""
+        batches = list(util.read_csv_batches(self.path, ['name'], 3))
+        self.assertEqual([len(b) for b in batches], [3, 3, 1])
+        self.assertEqual(batches[-1], [('name6',)])
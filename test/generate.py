@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+test.generate
+~~~~~~~~~~~~~
+
+Tests the :class:`~sanskrit.generate.NominalGenerator`.
+
+:license: MIT and BSD
+"""
+
+from sanskrit import Context
+from sanskrit import setup as S  # ``as S`` avoids problems with nose
+from sanskrit.generate import CELLS, NominalGenerator
+
+from . import TestCase, config as cfg
+
+ctx = Context(cfg)
+db_built = False
+
+
+class NominalGeneratorTestCase(TestCase):
+
+    def setUp(self):
+        """Initialize the database if it doesn't exist."""
+        global db_built
+
+        if not db_built:
+            ctx.drop_all()
+            ctx.create_all()
+            S.run(ctx)
+            db_built = True
+        self.generator = NominalGenerator(ctx)
+
+    def test_paradigm(self):
+        paradigm = self.generator.paradigm('gaja', 'm')
+        self.assertEqual(len(paradigm), len(CELLS))
+        self.assertEqual(paradigm[('1', 's')], 'gajas')
+        self.assertEqual(paradigm[('6', 'p')], 'gajAnAm')
+
+        self.assertRaises(ValueError, self.generator.paradigm, 'xyz', 'm')
+
+    def test_paradigms(self):
+        """Test that batches match single paradigms."""
+        for gender, names in [('m', ['gaja', 'rAma', 'sundara']),
+                              ('n', ['sundara'])]:
+            rows = self.generator.paradigms(names, gender)
+            self.assertEqual(len(rows), len(names))
+            for name, row in zip(names, rows):
+                self.assertEqual(len(row), len(CELLS))
+                expected = self.generator.paradigm(name, gender)
+                self.assertEqual(dict(zip(CELLS, row)), expected)
+
+    def test_paradigms_unknown(self):
+        rows = self.generator.paradigms(['gaja', 'xyz', 'rAma'], 'm')
+        self.assertIsNone(rows[1])
+        self.assertEqual(rows[0][0], 'gajas')
+        self.assertEqual(rows[2][0], 'rAmas')
+        self.assertEqual(self.generator.paradigms([], 'm'), [])
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+test.lexicon
+~~~~~~~~~~~~
+
+Tests writing and reading a :class:`~sanskrit.lexicon.Lexicon`.
+
+:license: MIT and BSD
+"""
+
+import os
+import shutil
+import tempfile
+
+from sqlalchemy import select
+
+from sanskrit import Context, lexicon
+from sanskrit import setup as S  # ``as S`` avoids problems with nose
+from sanskrit.analyze import SimpleAnalyzer
+from sanskrit.schema import *
+from sanskrit.util import set_reporter
+
+from . import TestCase, config as cfg
+
+
+class LexiconTestCase(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.dir, 'lexicon.bin')
+        uri = 'sqlite:///' + os.path.join(cls.dir, 'test.db')
+        cls.db_ctx = Context({'DATABASE_URI': uri, 'DATA_PATH': cfg.DATA_PATH,
+                              'LEXICON': cls.path, 'PROGRESS': 'silent'})
+        S.run(cls.db_ctx)
+        set_reporter('print')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def setUp(self):
+        self.ctx = Context({'DATA_PATH': cfg.DATA_PATH, 'LEXICON': self.path})
+
+    def test_context(self):
+        """Test that a context without a database reads the lexicon."""
+        ctx = self.ctx
+        db_ctx = Context(dict(self.db_ctx.config, LEXICON=None))
+        self.assertEqual(ctx.engine, None)
+        self.assertNotEqual(ctx.lexicon, None)
+
+        self.assertEqual(ctx.enums.as_dict(), db_ctx.enums.as_dict())
+        self.assertEqual(ctx.enum_id['case']['1'],
+                         db_ctx.enum_id['case']['1'])
+        self.assertEqual(ctx.nominal_endings, db_ctx.nominal_endings)
+        self.assertEqual(ctx.sandhi_rules, db_ctx.sandhi_rules)
+        self.assertEqual(ctx.irregular_stems, db_ctx.irregular_stems)
+        self.assertTrue(ctx.irregular_stems)
+        self.assertEqual(ctx.data_version, db_ctx.data_version)
+        self.assertTrue(ctx.has_form_index)
+        self.assertEqual(ctx.has_generated_forms,
+                         db_ctx.has_generated_forms)
+
+    def test_tables(self):
+        """Test that lexicon tables match the database."""
+        engine = self.db_ctx.engine
+        lex = self.ctx.lexicon
+        for name, stmt in lexicon.table_selects():
+            table = lex.tables[name]
+            rows = [tuple(r) for r in engine.execute(stmt)]
+            self.assertEqual(list(table), rows)
+            self.assertEqual(len(table), len(rows))
+
+        strings = list(lex.strings)
+        self.assertEqual(strings, sorted(set(strings)))
+
+        forms = lex.tables['form']
+        self.assertEqual(forms.columns, FormIndex.COLUMNS)
+        i = forms.column('name')[0]
+        self.assertEqual(lex.strings[i], forms.row(0)[1])
+
+    def test_stale(self):
+        """Test that a lexicon from another build is ignored."""
+        ctx = Context(self.db_ctx.config)
+        self.assertNotEqual(ctx.lexicon, None)
+
+        engine = self.db_ctx.engine
+        t = BuildInfo.__table__
+        version = self.db_ctx.data_version
+        where = t.c.key == 'data_version'
+        engine.execute(t.update().where(where).values(value='other'))
+        try:
+            ctx = Context(self.db_ctx.config)
+            self.assertEqual(ctx.lexicon, None)
+            self.assertEqual(ctx.enum_id['case']['1'],
+                             self.ctx.enum_id['case']['1'])
+        finally:
+            engine.execute(t.update().where(where).values(value=version))
+
+    def test_invalid(self):
+        """Test that other files are rejected."""
+        path = os.path.join(self.dir, 'other.bin')
+        with open(path, 'wb') as f:
+            f.write('not a lexicon, but long enough to have a prefix')
+        self.assertRaises(ValueError, lexicon.Lexicon, path)
+
+    def test_forms(self):
+        """Test finding forms by name."""
+        lex = self.ctx.lexicon
+        engine = self.db_ctx.engine
+        t = FormIndex.__table__
+        names = [row[0] for row in engine.execute(select([t.c.name])
+                                                  .distinct())]
+        self.assertTrue(names)
+        for name in names:
+            rows = engine.execute(select([t.c[c] for c in FormIndex.COLUMNS])
+                                  .where(t.c.name == name))
+            self.assertEqual(sorted(lex.forms(name)),
+                             sorted(tuple(r) for r in rows))
+
+        self.assertEqual(lex.forms('nosuchword'), [])
+        self.assertEqual(lex.forms(''), [])
+        self.assertEqual(lex.strings.index(lex.strings[0]), 0)
+
+    def test_analyzer(self):
+        """Test that the analyzer finds words in the lexicon."""
+        db_analyzer = SimpleAnalyzer(Context(dict(self.db_ctx.config,
+                                                  LEXICON=None)))
+        analyzer = SimpleAnalyzer(self.ctx)
+        for word in ['tasmE', 'pumAn', 'gantum', 'gatvA', 'ca']:
+            expected = sorted(db_analyzer.analyze_word(word))
+            self.assertTrue(expected, word)
+            self.assertEqual(sorted(analyzer.analyze_word(word)), expected)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+test.progress
+~~~~~~~~~~~~~
+
+Tests the progress reporters in :mod:`sanskrit.util.progress`.
+
+:license: MIT and BSD
+"""
+
+import json
+from StringIO import StringIO
+
+from sanskrit import util
+from sanskrit.util import progress
+from . import TestCase
+
+
+class ProgressTestCase(TestCase):
+
+    """Tests reporting stages and rows."""
+
+    def setUp(self):
+        self.old = util.get_reporter()
+
+    def tearDown(self):
+        util.set_reporter(self.old)
+
+    def run_stages(self):
+        util.heading('Outer', '~')
+        util.heading('First')
+        util.advance(10)
+        util.tick('item')
+        util.heading('Second')
+        util.advance(5)
+        util.get_reporter().finish()
+
+    def test_stages(self):
+        """Test nesting stages and counting rows."""
+        reporter = util.set_reporter('silent')
+        self.run_stages()
+
+        summary = reporter.summary()
+        self.assertEqual([s['stage'] for s in summary],
+                         ['Outer', 'First', 'Second'])
+        self.assertEqual([s['rows'] for s in summary], [15, 10, 5])
+        self.assertEqual([s['level'] for s in summary], [0, 1, 1])
+
+    def test_json(self):
+        """Test writing JSON events."""
+        stream = StringIO()
+        util.set_reporter(progress.JSONReporter(stream))
+        self.run_stages()
+
+        events = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(events[0]['event'], 'start')
+        self.assertEqual(events[-1]['event'], 'finish')
+        notes = [e['message'] for e in events if e['event'] == 'note']
+        self.assertEqual(notes, ['item'])
@@ -10,7 +10,9 @@ Tests something.
 
 from sanskrit import Context
 from sanskrit import setup as S  # ``as S`` avoids problems with nose
+from sanskrit.analyze import SimpleAnalyzer
 from sanskrit.query import SimpleQuery
+from sanskrit.util import Cache
 from sanskrit.schema import *
 
 from . import TestCase, config as cfg
@@ -82,3 +84,98 @@ class QueryTestCase(TestCase):
         abbr_actual = Q.verb('gam', 'pres', 'P')
         self.verify(name_actual, expected)
         self.verify(abbr_actual, expected)
+
+    def test_releases_connections(self):
+        """Test that each query returns its connection to the pool."""
+        Q = SimpleQuery(ctx)
+        Q.noun('gaja', 'm')
+        Q.pronoun('tad', 'm')
+        Q.verb('gam', 'pres', 'P')
+        Q.verb_summary('gam')
+        self.assertEqual(ctx.pool_stats.checked_out, 0)
+
+        A = SimpleAnalyzer(ctx)
+        results = A.analyze('gajAya')
+        self.assertTrue(results)
+        self.assertEqual(ctx.pool_stats.checked_out, 0)
+
+    def test_nouns(self):
+        """Test querying many nouns at once."""
+        Q = SimpleQuery(ctx)
+        items = [('gaja', 'm'), ('gaja', 'masculine'), ('nonexistent', 'm')]
+        actual = Q.nouns(items)
+        self.assertEqual(set(actual), set(items))
+        self.assertEqual(actual[('gaja', 'm')], Q.noun('gaja', 'm'))
+        self.assertEqual(actual[('nonexistent', 'm')], {})
+
+    def test_nouns_without_endings(self):
+        """Test that a stem without endings doesn't spoil the batch."""
+        Q = SimpleQuery(ctx)
+        items = [('gaja', 'm'), ('gaja', 'f')]
+        actual = Q.nouns(items)
+        self.assertEqual(actual[('gaja', 'm')], Q.noun('gaja', 'm'))
+        self.assertTrue(actual[('gaja', 'm')])
+        self.assertEqual(actual[('gaja', 'f')], {})
+
+    def test_verbs(self):
+        """Test querying many verbs at once."""
+        Q = SimpleQuery(ctx)
+        items = [('gam', 'pres', 'P'), ('gam', 'present', 'parasmaipada'),
+                 ('nonexistent', 'pres', 'P')]
+        actual = Q.verbs(items)
+        self.assertEqual(set(actual), set(items))
+        self.assertEqual(actual[items[0]], actual[items[1]])
+        self.assertEqual(len(actual[items[0]]), 9)
+        self.assertEqual(actual[('nonexistent', 'pres', 'P')], {})
+
+    def test_verb_summaries(self):
+        """Test querying many verb summaries at once."""
+        Q = SimpleQuery(ctx)
+        actual = Q.verb_summaries(['gam', 'nonexistent'])
+        summary = Q.verb_summary('gam')
+        self.assertEqual(actual['gam'], summary)
+        self.assertEqual(actual['nonexistent'], {})
+        self.assertIn('gacCati', summary['verbs'][('pres', 'P')])
+        self.assertEqual(summary['participles'][('pres', 'P')], ['gacCat'])
+
+    def test_cache(self):
+        """Test that cached paradigms are reused and can't be modified."""
+        Q = SimpleQuery(ctx, cache=Cache(version=lambda: ctx.data_version))
+        first = Q.noun('gaja', 'masculine')
+        first[('1', 's')] = 'changed'
+        second = Q.noun('gaja', 'm')
+        self.assertNotEqual(second[('1', 's')], 'changed')
+        Q.verb('gam', 'pres', 'P')
+        Q.verbs([('gam', 'present', 'parasmaipada'), ('BU', 'pres', 'P')])
+        Q.pronoun('tad', 'm')
+        Q.pronoun('tad', 'masculine')
+
+        stats = Q.cache.stats()
+        self.assertEqual(stats['hits'], 3)
+        self.assertEqual(stats['misses'], 4)
+        self.assertTrue(ctx.data_version)
+
+    def test_cache_unknown_enum(self):
+        """Test that unknown enum values don't break cached lookups."""
+        Q = SimpleQuery(ctx, cache=Cache(version=lambda: ctx.data_version))
+        self.assertEqual(Q.noun('nosuchstem', 'x'), {})
+        self.assertEqual(Q.pronoun('nosuchstem', 'x'), {})
+        self.assertEqual(Q.cache.stats()['misses'], 0)
+
+    def test_form_index(self):
+        """Test that the form index matches the joined form tables."""
+        from sanskrit import analyze
+
+        self.assertTrue(ctx.has_form_index)
+        a = SimpleAnalyzer(ctx)
+        for word in ['gacCati', 'pumAn', 'tasmE', 'ca', 'gantum']:
+            words = a.analyze_word(word)
+            joined = ctx.session.execute(analyze._JOINED_FORMS_BY_NAME,
+                                         {'name': word}).fetchall()
+            self.assertTrue(words)
+            self.assertEqual(sorted(words), sorted(tuple(r) for r in joined))
+
+        gacCati = a.analyze_word('gacCati')[0]
+        self.assertEqual(gacCati.pos_id, Tag.VERB)
+        self.assertEqual(gacCati.person_id, ctx.enum_id['person']['3'])
+        self.assertEqual(gacCati.stem_id, None)
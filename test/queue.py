@@ -39,3 +39,51 @@ class QueueTestCase(TestCase):
         self.assertNotEqual((item, priority), q.peek())
         q.pop()
         self.assertRaises(IndexError, q.pop)
+
+    def test_ties(self):
+        """Test that equal priorities pop in insertion order."""
+        q = PriorityQueue()
+        for i in range(3):
+            q.push(i, 0)
+        self.assertEqual([0, 1, 2], [q.pop() for i in range(3)])
+
+        # Unorderable items must not be compared.
+        q.push(frozenset('ab'), 0)
+        q.push(frozenset('bc'), 0)
+        self.assertEqual(frozenset('ab'), q.pop())
+
+    def test_update_and_remove(self):
+        """Test changing and removing items."""
+        q = PriorityQueue()
+        q.pushmany([('a', 3), ('b', 2), ('c', 1)])
+        q.update('a', 0)
+        self.assertEqual(('a', 0), q.peek())
+        q.remove('a')
+        self.assertNotIn('a', q)
+        self.assertEqual(len(q), 2)
+        self.assertEqual(('c', 1), q.pop_with_priority())
+        self.assertRaises(KeyError, q.update, 'x', 1)
+        self.assertRaises(KeyError, q.remove, 'x')
+
+    def test_capacity(self):
+        """Test keeping only the best items."""
+        q = PriorityQueue(capacity=3)
+        q.pushmany((i, i) for i in range(10, 5, -1))
+        q.push(0, 0)
+        q.push(20, 20)
+        self.assertEqual(len(q), 3)
+        self.assertEqual([0, 6, 7], [q.pop() for i in range(3)])
+
+    def test_copy(self):
+        """Test copying a queue."""
+        import copy
+        q = PriorityQueue()
+        for i in range(5):
+            q.push(i, -i)
+        p = copy.copy(q)
+        p.push('x', -10)
+        self.assertEqual(len(q), 5)
+        self.assertEqual(len(p), 6)
+        self.assertEqual('x', p.pop())
+        self.assertEqual(4, p.pop())
+        self.assertEqual(4, q.pop())
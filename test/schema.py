@@ -64,6 +64,137 @@ class EnumTestCase(SchemaTestCase):
         self.assertEqual(dative.abbr, '4')
 
 
+    def test_enum_tables(self):
+        """Test the context's immutable enum tables."""
+        ctx = self.ctx
+        enum = self.enum
+        self.assertEqual(ctx.enum_id['case']['4'], enum['case']['4'])
+        self.assertEqual(ctx.enum_id['case']['dative'], enum['case']['4'])
+        self.assertEqual(ctx.enum_abbr['voice'][enum['voice']['P']], 'P')
+
+        case = ctx.enums.tables['case']
+        self.assertEqual(case.abbrs[enum['case']['4']], '4')
+        self.assertRaises(TypeError, ctx.enum_id['case'].__setitem__, 'x', 1)
+
+        mfn = ctx.gender_set[enum['gender_group']['mfn']]
+        self.assertIn(enum['gender']['f'], mfn)
+
+    def test_empty_gender_group(self):
+        """Test that a gender group without members has an empty set."""
+        group = GenderGroup(name='none', abbr='0')
+        self.session.add(group)
+        self.session.commit()
+        self.ctx.clear_cache()
+        self.assertEqual(self.ctx.gender_set[group.id], frozenset())
+
+    def test_enum_snapshot(self):
+        """Test writing and reading an enum snapshot."""
+        import os
+        import tempfile
+        from sanskrit.enums import Enums
+
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            self.ctx.enums.dump(path)
+            enums = Enums.from_snapshot(path)
+        finally:
+            os.remove(path)
+
+        self.assertEqual(enums.enum_id, self.ctx.enum_id)
+        self.assertEqual(enums.enum_abbr, self.ctx.enum_abbr)
+        self.assertEqual(enums.gender_set, self.ctx.gender_set)
+
+    def test_enum_snapshot_version(self):
+        """Test that only a snapshot of the current build is used."""
+        import os
+        import tempfile
+
+        self.session.add(BuildInfo(key='data_version', value='v1'))
+        self.session.commit()
+        enums = self.ctx.enums
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.ctx.config['ENUM_SNAPSHOT'] = path
+        try:
+            enums.dump(path, 'v1')
+            self.ctx.clear_cache()
+            self.assertEqual(self.ctx.enums.data_version, 'v1')
+
+            enums.dump(path, 'v0')
+            self.ctx.clear_cache()
+            self.assertEqual(self.ctx.enums.data_version, None)
+            self.assertEqual(self.ctx.enum_id['gender']['m'],
+                             self.enum['gender']['m'])
+        finally:
+            os.remove(path)
+
+
+class IndexTestCase(SchemaTestCase):
+
+    """Tests that common lookups use indexes."""
+
+    def plan(self, stmt, params=None):
+        """Return SQLite's query plan for `stmt` as a single string."""
+        engine = self.ctx.engine
+        compiled = stmt.compile(dialect=engine.dialect)
+        values = compiled.construct_params(params or {})
+        args = [values[key] for key in compiled.positiontup]
+
+        conn = engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('EXPLAIN QUERY PLAN ' + str(compiled), args)
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+        finally:
+            conn.close()
+
+    def assertUsesIndex(self, index, stmt, params=None):
+        plan = self.plan(stmt, params)
+        if not index.startswith('COVERING'):
+            index = 'INDEX ' + index
+        self.assertIn(index, plan)
+
+    def test_query_plans(self):
+        """Test that query and analyzer lookups use indexes."""
+        from sqlalchemy import select
+        from sanskrit import analyze, query
+
+        r = Root.__table__
+        v = Verb.__table__
+        ps = ParticipleStem.__table__
+
+        self.assertUsesIndex('ix_form_name', analyze._JOINED_FORMS_BY_NAME,
+                             {'name': 'gacCati'})
+        self.assertUsesIndex('COVERING INDEX ix_form_index_name',
+                             analyze._FORMS_BY_NAME, {'name': 'gacCati'})
+        self.assertUsesIndex('ix_stem_name_pos_id', query._STEM_ID,
+                             {'name': 'tad', 'pos_id': Tag.PRONOUN})
+        self.assertUsesIndex('ix_nominal_stem_id_gender_id',
+                             query._NOMINAL_PARADIGM,
+                             {'stem_id': 1, 'gender_id': 1})
+        self.assertUsesIndex('ix_root_name',
+                             select([r.c.id]).where(r.c.name.in_(['gam'])))
+        self.assertUsesIndex('ix_verb_root_id_mode_id_voice_id',
+                             select([v.c.id]).where(v.c.root_id == 1)
+                                             .where(v.c.mode_id == 1)
+                                             .where(v.c.voice_id == 1))
+        self.assertUsesIndex('ix_participlestem_root_id',
+                             select([ps.c.id]).where(ps.c.root_id == 1))
+
+    def test_create_indexes(self):
+        """Test adding missing indexes to an existing database."""
+        engine = self.ctx.engine
+        engine.execute('DROP INDEX ix_form_name')
+        self.assertNotIn('INDEX ix_form_name',
+                         self.plan(Form.__table__.select()
+                                   .where(Form.__table__.c.name == 'ca')))
+
+        self.ctx.create_indexes()
+        self.assertUsesIndex('ix_form_name', Form.__table__.select()
+                             .where(Form.__table__.c.name == 'ca'))
+
+
 class FormTestCase(SchemaTestCase):
 
     """Tests a variety of linguistic forms."""
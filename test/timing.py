@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+test.timing
+~~~~~~~~~~~
+
+Tests the :class:`~sanskrit.util.timing.Profiler` class.
+
+:license: MIT and BSD
+"""
+
+from sanskrit.util import timing
+from . import TestCase
+
+
+@timing.timed('test.double')
+def double(x):
+    return 2 * x
+
+
+@timing.timed('test.count')
+def count(n):
+    for i in range(n):
+        yield i
+
+
+class TimingTestCase(TestCase):
+
+    """Tests recording and exporting timing data."""
+
+    def setUp(self):
+        self.profiler = timing.profiler
+        self.profiler.reset()
+
+    def tearDown(self):
+        self.profiler.disable()
+        self.profiler.reset()
+
+    def test_disabled(self):
+        """Test that nothing is recorded by default."""
+        self.assertEqual(double(2), 4)
+        self.assertEqual(list(count(3)), [0, 1, 2])
+        self.assertEqual(self.profiler.as_dict(), {})
+
+    def test_enabled(self):
+        """Test recording calls to functions and generators."""
+        self.profiler.enable()
+        for i in range(5):
+            double(i)
+        self.assertEqual(list(count(3)), [0, 1, 2])
+
+        data = self.profiler.as_dict()
+        self.assertEqual(data['test.double']['calls'], 5)
+        self.assertEqual(data['test.count']['calls'], 1)
+        self.assertTrue(data['test.double']['p99'] <= data['test.double']['seconds'])
+
+    def test_queries(self):
+        """Test counting queries against running timers."""
+        self.profiler.enable()
+        with self.profiler.timer('outer'):
+            self.profiler.count_query()
+            with self.profiler.timer('inner'):
+                self.profiler.count_query()
+
+        data = self.profiler.as_dict()
+        self.assertEqual(data['outer']['queries'], 2)
+        self.assertEqual(data['inner']['queries'], 1)
+
+    def test_prometheus(self):
+        """Test the Prometheus text format."""
+        self.profiler.enable()
+        double(1)
+        text = self.profiler.prometheus()
+        self.assertIn('# TYPE sanskrit_calls_total counter', text)
+        self.assertIn('sanskrit_calls_total{name="test.double"} 1', text)
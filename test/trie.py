@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+test.trie
+~~~~~~~~~
+
+Tests the :class:`~sanskrit.util.trie.Trie` class.
+
+:license: MIT and BSD
+"""
+
+from sanskrit.util import Trie
+from . import TestCase
+
+
+class TrieTestCase(TestCase):
+
+    """Tests various trie functions."""
+
+    def setUp(self):
+        self.trie = Trie()
+        self.trie['a'] = 1
+        self.trie['ab'] = 2
+        self.trie['ab'] = 3
+        self.trie['abcd'] = 4
+
+    def test_getitem(self):
+        """Test finding the values of all prefixes."""
+        t = self.trie
+        self.assertEqual(t['abc'], set([1, 2, 3]))
+        self.assertEqual(t['abcde'], set([1, 2, 3, 4]))
+        self.assertEqual(t['b'], set())
+
+    def test_no_mutation(self):
+        """Test that lookups don't change the trie."""
+        t = self.trie
+        before = repr(t.root)
+        for key in ['x', 'abx', 'abcdefg', '']:
+            t[key]
+            t.longest_match(key)
+        self.assertEqual(before, repr(t.root))
+        self.assertNotIn('x', t)
+
+    def test_prefixes(self):
+        """Test iterating over prefixes."""
+        t = self.trie
+        prefixes = [p for p, values in t.iter_prefixes('abcde')]
+        self.assertEqual(prefixes, ['a', 'ab', 'abcd'])
+        self.assertEqual(t.all_prefixes('abc'),
+                         [('a', set([1])), ('ab', set([2, 3]))])
+
+    def test_empty_prefix(self):
+        """Test that a stored empty key is never a prefix."""
+        t = self.trie
+        t[''] = 0
+        self.assertIn('', t)
+        self.assertEqual(t['abc'], set([1, 2, 3]))
+        self.assertEqual(t.all_prefixes('a'), [('a', set([1]))])
+        self.assertEqual(t.longest_match('x'), None)
+
+    def test_longest_match(self):
+        """Test finding the longest prefix."""
+        t = self.trie
+        self.assertEqual(t.longest_match('abc'), ('ab', set([2, 3])))
+        self.assertEqual(t.longest_match('abcd'), ('abcd', set([4])))
+        self.assertEqual(t.longest_match('xyz'), None)